@@ -0,0 +1,240 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Union
+
+import sapien.core as sapien
+
+from collision_cache import cook_convex
+from prefetch import layout_assets, prefetch_layout
+from profiling import scope
+from scene_loader import SceneLayout, SceneSwitcher, build_layout, load_layout
+
+
+@dataclass
+class BuildMetrics:
+    """
+    Where the time of one asynchronous build went. prepare is the
+    background work: parsing, reading ahead, cooking collision meshes and
+    hulls and creating LOD files. wait is the part of it swap() still had
+    to block for, and build the engine-side construction at swap time.
+
+    hidden is the background time that overlapped with the caller's work
+    instead of being waited for. Given baseline_seconds, the time a plain
+    build_layout of the same layout takes, saved is what the caller no
+    longer waits for compared with it.
+    """
+    prepare_seconds: float = 0.0
+    wait_seconds: float = 0.0
+    build_seconds: float = 0.0
+    baseline_seconds: float = 0.0
+
+    @property
+    def hidden_seconds(self) -> float:
+        return max(self.prepare_seconds - self.wait_seconds, 0.0)
+
+    @property
+    def hidden_fraction(self) -> float:
+        """
+        Share of the whole build that overlapped with the caller's work.
+        """
+        total = self.prepare_seconds + self.build_seconds
+        return self.hidden_seconds / total if total > 0 else 0.0
+
+    @property
+    def saved_seconds(self) -> float:
+        if self.baseline_seconds <= 0:
+            return 0.0
+        return max(self.baseline_seconds - self.wait_seconds - self.build_seconds, 0.0)
+
+    @property
+    def saved_fraction(self) -> float:
+        """
+        Share of the baseline build the caller no longer waits for, 0
+        without a baseline.
+        """
+        return self.saved_seconds / self.baseline_seconds if self.baseline_seconds > 0 else 0.0
+
+
+class BuildHandle:
+    """
+    Future-like handle of a scene being prepared in the background.
+    """
+
+    def __init__(self, name: str, future: Future, metrics: BuildMetrics):
+        self.name = name
+        self.metrics = metrics
+        self._future = future
+
+    def done(self) -> bool:
+        return self._future.done()
+
+    def cancel(self) -> bool:
+        return self._future.cancel()
+
+    def result(self, timeout: Optional[float] = None) -> SceneLayout:
+        """
+        The prepared layout, waiting up to timeout seconds for it.
+        """
+        return self._future.result(timeout)
+
+    def add_done_callback(self, fn: Callable[['BuildHandle'], None]):
+        self._future.add_done_callback(lambda _: fn(self))
+
+
+class AsyncSceneBuilder:
+    """
+    Builds the next layout while the current scene keeps stepping.
+
+    prepare() does everything but the engine-side construction on a
+    background thread: it parses the layout, reads its assets into the page
+    cache, converts nonconvex collision meshes, has SAPIEN cook the hulls of
+    convex ones in a separate process and creates the LOD files of the
+    visuals at render_lod. swap() then finds every input ready and only
+    builds, which must run on the thread that steps the scene. With
+    processes, the read-ahead and mesh conversion also run in worker
+    processes so they do not compete with the caller for the GIL.
+
+    With a SceneSwitcher, swap() moves its scene to the new layout and
+    rebuilds only what differs, at the switcher's render_lod; otherwise it
+    builds a new scene.
+    """
+
+    def __init__(self, engine: sapien.Engine, switcher: Optional[SceneSwitcher] = None,
+                 prefetch_workers: Optional[int] = None, processes: bool = False,
+                 render_lod: int = 0):
+        self.engine = engine
+        self.switcher = switcher
+        self.prefetch_workers = prefetch_workers
+        self.processes = processes
+        self.render_lod = switcher.render_lod if switcher is not None else render_lod
+        self.visual = engine.get_renderer() is not None
+        self._pool = ThreadPoolExecutor(1, thread_name_prefix='async_build')
+
+    def _prepare(self, layout: Union[str, SceneLayout], metrics: BuildMetrics) -> SceneLayout:
+        start = time.perf_counter()
+        with scope('async_build/prepare'):
+            if isinstance(layout, str):
+                layout = load_layout(layout)
+            if self.prefetch_workers != 0:
+                prefetch_layout(layout, workers=self.prefetch_workers, processes=self.processes,
+                                visual=self.visual)
+            with scope('async_build/cook'):
+                cook_convex([obj.collision_asset for obj in layout.objects
+                             if not obj.static and not obj.use_bounding_box
+                             and os.path.exists(obj.collision_asset)])
+            if self.visual and self.render_lod > 0:
+                # Imported here since render_lod needs OpenCV, which only LODs use
+                from render_lod import lod_path, lod_urdf
+
+                with scope('async_build/lod'):
+                    for path in layout_assets(layout)["visual"]:
+                        lod_path(path, self.render_lod)
+                    for art in layout.articulations:
+                        lod_urdf(art.urdf, self.render_lod)
+        metrics.prepare_seconds = time.perf_counter() - start
+        return layout
+
+    def prepare(self, layout: Union[str, SceneLayout]) -> BuildHandle:
+        """
+        Start preparing a layout, given by name or already loaded, and
+        return at once.
+        """
+        metrics = BuildMetrics()
+        name = layout if isinstance(layout, str) else layout.name
+        return BuildHandle(name, self._pool.submit(self._prepare, layout, metrics), metrics)
+
+    def swap(self, handle: BuildHandle) -> sapien.Scene:
+        """
+        Finish a prepared build and return its scene. Blocks until the
+        preparation is done if it is not yet.
+        """
+        start = time.perf_counter()
+        with scope('async_build/wait'):
+            layout = handle.result()
+        handle.metrics.wait_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with scope('async_build/swap'):
+            if self.switcher is not None:
+                self.switcher.switch(layout, prefetch_workers=0)
+                scene = self.switcher.scene
+            else:
+                scene = build_layout(self.engine, layout, prefetch_workers=0, render_lod=self.render_lod)
+        handle.metrics.build_seconds = time.perf_counter() - start
+        return scene
+
+    def close(self):
+        self._pool.shutdown()
+
+    def __enter__(self) -> 'AsyncSceneBuilder':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _run_baseline(names: List[str]) -> List[BuildMetrics]:
+    engine = sapien.Engine()
+    metrics = []
+    for name in names:
+        start = time.perf_counter()
+        build_layout(engine, load_layout(name))
+        metrics.append(BuildMetrics(baseline_seconds=time.perf_counter() - start))
+    return metrics
+
+
+def _run_async(names: List[str], steps: int) -> List[BuildMetrics]:
+    engine = sapien.Engine()
+    metrics = []
+    with AsyncSceneBuilder(engine) as builder:
+        handle = builder.prepare(names[0])
+        for i in range(len(names)):
+            scene = builder.swap(handle)
+            metrics.append(handle.metrics)
+            if i + 1 < len(names):
+                handle = builder.prepare(names[i + 1])
+            for _ in range(steps):
+                scene.step()
+    return metrics
+
+
+if __name__ == '__main__':
+    # Usage: python async_build.py [steps] [layout ...]
+    # Runs one episode of steps physics steps per layout while the next
+    # layout is prepared in the background, then builds the same layouts
+    # one after the other with plain build_layout, and reports how much of
+    # each build was hidden and how much time it saved. Both runs start
+    # from an empty cache in a fresh process; the plain one runs second, so
+    # it gets the warm page cache. Physics only, no renderer is needed.
+    if len(sys.argv) > 2 and sys.argv[1] == '--child':
+        mode, steps, names = sys.argv[2], int(sys.argv[3]), sys.argv[4:]
+        runs = _run_async(names, steps) if mode == 'async' else _run_baseline(names)
+        print(json.dumps([vars(metrics) for metrics in runs]))
+        sys.exit(0)
+
+    from scene_loader import list_layouts
+
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    names = sys.argv[2:] or [name for name in list_layouts() if name.startswith('v3_sc')][:8]
+
+    results = {}
+    for mode in ('async', 'baseline'):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--child', mode, str(steps)] + names,
+                env=dict(os.environ, REPLICA_CAD_CACHE_DIR=cache_dir),
+                check=True, stdout=subprocess.PIPE, text=True).stdout
+            results[mode] = [BuildMetrics(**fields) for fields in json.loads(output.splitlines()[-1])]
+
+    for name, metrics, baseline in zip(names, results['async'], results['baseline']):
+        metrics.baseline_seconds = baseline.baseline_seconds
+        print("{}: prepare {:.3f} s, waited {:.3f} s, build {:.3f} s, {:.0%} hidden; "
+              "plain build {:.3f} s, {:.0%} saved".format(
+                  name, metrics.prepare_seconds, metrics.wait_seconds, metrics.build_seconds,
+                  metrics.hidden_fraction, metrics.baseline_seconds, metrics.saved_fraction))
@@ -0,0 +1,145 @@
+import sys
+import time
+from typing import Callable, Iterator, List, Optional, Sequence, Union
+
+import sapien.core as sapien
+from sapien.utils import Viewer
+
+import numpy as np
+
+from frl_apt_0 import build_scene
+from mesh_cache import get_mesh_cache
+from snapshot import EntitySnapshot, SceneSnapshot
+
+
+def _entity_id(entity) -> int:
+    if isinstance(entity, sapien.ArticulationBase):
+        return entity.get_links()[0].get_id()
+    return entity.get_id()
+
+
+def _entities(scene: sapien.Scene) -> List:
+    return scene.get_all_actors() + scene.get_all_articulations()
+
+
+class SceneBatch:
+    """
+    N independent copies of an apartment built with one engine.
+
+    By default every copy is its own scene. With spacing set, all copies are
+    sub-worlds of a single scene, copy i shifted by i * spacing metres along x,
+    so one step advances all of them.
+
+    The copies share the engine's resources. SAPIEN keeps render meshes and
+    cooked collision meshes in per-engine registries keyed by file path, and
+    the builders pass the same canonical paths for every copy, so only the
+    first copy loads assets; later copies only create actors that reference
+    them.
+    """
+
+    def __init__(self, engine: sapien.Engine, num_envs: int,
+                 build: Callable[..., sapien.Scene] = build_scene,
+                 spacing: Optional[float] = None):
+        self.engine = engine
+        self.num_envs = num_envs
+        self.spacing = spacing
+        self.scenes: List[sapien.Scene] = []
+        self.entities: List[List] = []
+        self.build_times: List[float] = []
+
+        scene = None
+        for i in range(num_envs):
+            start = time.perf_counter()
+            if spacing is None:
+                scene = build(engine)
+                self.scenes.append(scene)
+                self.entities.append(_entities(scene))
+            else:
+                known = set() if scene is None else {_entity_id(e) for e in _entities(scene)}
+                scene = build(engine, scene=scene)
+                added = [e for e in _entities(scene) if _entity_id(e) not in known]
+                self._shift(added, sapien.Pose([i * spacing, 0, 0]))
+                self.entities.append(added)
+            self.build_times.append(time.perf_counter() - start)
+        if spacing is not None:
+            self.scenes.append(scene)
+
+        self.initial_states = [self.snapshot(i) for i in range(num_envs)]
+
+    @staticmethod
+    def _shift(entities: List, offset: sapien.Pose):
+        for entity in entities:
+            if isinstance(entity, sapien.ArticulationBase):
+                entity.set_root_pose(offset * entity.get_root_pose())
+            else:
+                entity.set_pose(offset * entity.get_pose())
+
+    def __len__(self) -> int:
+        return self.num_envs
+
+    def __getitem__(self, index: int) -> sapien.Scene:
+        """
+        Scene of copy index. Sub-worlds all return the shared scene; use
+        entities[index] for the actors and articulations of one copy.
+        """
+        return self.scenes[index] if self.spacing is None else self.scenes[0]
+
+    def __iter__(self) -> Iterator[sapien.Scene]:
+        return (self[i] for i in range(self.num_envs))
+
+    def origin(self, index: int) -> np.ndarray:
+        if self.spacing is None:
+            return np.zeros(3)
+        return np.array([index * self.spacing, 0, 0])
+
+    def snapshot(self, index: int) -> Union[SceneSnapshot, EntitySnapshot]:
+        if self.spacing is None:
+            return SceneSnapshot(self.scenes[index])
+        return EntitySnapshot(self.entities[index])
+
+    def reset(self, indices: Optional[Sequence[int]] = None):
+        """
+        Restore the given copies, or all of them, to their state right after
+        the batch was built.
+        """
+        if indices is None:
+            indices = range(self.num_envs)
+        for i in indices:
+            self.initial_states[i].restore()
+
+    def step(self, num_steps: int = 1):
+        for scene in self.scenes:
+            for _ in range(num_steps):
+                scene.step()
+
+    def update_render(self):
+        for scene in self.scenes:
+            scene.update_render()
+
+
+if __name__ == '__main__':
+    # Usage: python batch.py [num_envs] [spacing]
+    num_envs = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    spacing = float(sys.argv[2]) if len(sys.argv) > 2 else 20.0
+
+    # Set up engine and renderer
+    engine = sapien.Engine()
+    renderer = sapien.SapienRenderer()
+    engine.set_renderer(renderer)
+
+    batch = SceneBatch(engine, num_envs, spacing=spacing)
+    print("build times: " + ", ".join("{:.3f} s".format(t) for t in batch.build_times))
+    print("mesh cache: {}".format(get_mesh_cache().stats()))
+
+    # Viewer
+    viewer = Viewer(renderer, resolutions=(1920, 1080))
+    viewer.set_scene(batch[0])
+    viewer.set_camera_xyz(x=-2.0, y=0, z=1.5)
+
+    while not viewer.closed:
+        if viewer.window.key_press('n'):
+            batch.reset()
+
+        batch.step()
+        batch.update_render()
+        viewer.render()
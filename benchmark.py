@@ -0,0 +1,249 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import time
+from typing import Callable, Dict, List, Optional
+
+import sapien.core as sapien
+
+from frl_apt_0 import build_scene
+from scene_loader import build_layout, load_layout
+from scene_wrapper import ActorBuilderWrapper, SceneWrapper, URDFLoaderWrapper
+from snapshot import SceneSnapshot
+
+ROBOT_URDF = "maniskill_robot/mobile_panda_single_arm.urdf"
+ROBOT_POSE = sapien.Pose([3.5, 1, 0], [-0.7, 0, 0, 0.7])
+ROBOT_QPOS = [0.0, 0.0, 0.0, 0.0, 1.6, 1.7, -0.1, 0.0, -2.9, 2.2, 0.6, 0.04, 0.04]
+
+
+class _BuildTimer:
+    """
+    Attributes build time to the stage, each object and each articulation.
+    A segment starts when a builder or loader is created and ends when it
+    produces its actor or articulation, so file loading is counted for the
+    entity that triggers it.
+    """
+
+    def __init__(self):
+        self.start = 0.0
+        self.segments: List[Dict] = []
+
+    def begin(self):
+        self.start = time.perf_counter()
+
+    def end(self, kind: str, name: str):
+        self.segments.append(
+            {"kind": kind, "name": name, "seconds": time.perf_counter() - self.start})
+
+
+class _TimedActorBuilder(ActorBuilderWrapper):
+    def __init__(self, builder: sapien.ActorBuilder, timer: _BuildTimer):
+        super().__init__(builder, timer)
+        timer.begin()
+
+    def build_actor(self, method: str, args: tuple, kwargs: dict) -> sapien.ActorBase:
+        actor = super().build_actor(method, args, kwargs)
+        name = actor.get_name()
+        self._owner.end("stage" if name == 'stage' else "object", name)
+        return actor
+
+
+class _TimedURDFLoader(URDFLoaderWrapper):
+    def __init__(self, loader: sapien.URDFLoader, timer: _BuildTimer):
+        super().__init__(loader, timer)
+        timer.begin()
+
+    def load_articulation(self, filename: str, args: tuple, kwargs: dict) -> sapien.Articulation:
+        articulation = super().load_articulation(filename, args, kwargs)
+        self._owner.end("articulation", os.path.splitext(os.path.basename(filename))[0])
+        return articulation
+
+
+class _TimedScene(SceneWrapper):
+    """
+    Scene wrapper handed to a scene builder in place of the real scene.
+    """
+    actor_builder_class = _TimedActorBuilder
+    urdf_loader_class = _TimedURDFLoader
+
+
+def _builder(target: str) -> Callable[..., sapien.Scene]:
+    if target == 'frl_apt_0':
+        return build_scene
+    layout = load_layout(target)
+    return lambda engine, scene: build_layout(engine, layout, scene=scene)
+
+
+def benchmark_build(engine: sapien.Engine, target: str) -> Dict:
+    build = _builder(target)
+    scene = engine.create_scene()
+    scene.set_timestep(1 / 100.0)
+    timer = _BuildTimer()
+    start = time.perf_counter()
+    build(engine, scene=_TimedScene(scene, timer))
+    total = time.perf_counter() - start
+
+    # Lists of (name, seconds) in build order, since many objects share a name
+    result = {"total": total, "objects": [], "articulations": []}
+    for segment in timer.segments:
+        if segment["kind"] == "stage":
+            result["stage"] = segment["seconds"]
+        else:
+            result[segment["kind"] + "s"].append((segment["name"], segment["seconds"]))
+    result["objects_total"] = sum(seconds for _, seconds in result["objects"])
+    result["articulations_total"] = sum(seconds for _, seconds in result["articulations"])
+    result["other"] = total - sum(s["seconds"] for s in timer.segments)
+    return result
+
+
+def load_robot(scene: sapien.Scene) -> sapien.Articulation:
+    loader = scene.create_urdf_loader()
+    loader.fix_root_link = True
+    robot = loader.load(ROBOT_URDF)
+    robot.set_root_pose(ROBOT_POSE)
+    robot.set_qpos(ROBOT_QPOS)
+    for joint in robot.get_active_joints():
+        joint.set_drive_property(stiffness=1000, damping=200)
+    robot.set_drive_target(ROBOT_QPOS)
+    return robot
+
+
+def _median_rate(run: Callable[[], float], count: int, repeats: int) -> float:
+    """
+    Median of count / seconds over repeated runs.
+    """
+    return statistics.median(count / run() for _ in range(repeats))
+
+
+def benchmark_step(scene: sapien.Scene, steps: int, repeats: int,
+                   robot: Optional[sapien.Articulation] = None,
+                   passive_force: bool = True) -> float:
+    initial_state = SceneSnapshot(scene)
+
+    def run() -> float:
+        initial_state.restore()
+        start = time.perf_counter()
+        for _ in range(steps):
+            if robot is not None and passive_force:
+                robot.set_qf(robot.compute_passive_force(
+                    gravity=True, coriolis_and_centrifugal=True))
+            scene.step()
+        return time.perf_counter() - start
+
+    rate = _median_rate(run, steps, repeats)
+    initial_state.restore()
+    return rate
+
+
+def benchmark_passive_force(robot: sapien.Articulation, calls: int, repeats: int) -> float:
+    def run() -> float:
+        start = time.perf_counter()
+        for _ in range(calls):
+            robot.set_qf(robot.compute_passive_force(
+                gravity=True, coriolis_and_centrifugal=True))
+        return time.perf_counter() - start
+
+    return 1.0 / _median_rate(run, calls, repeats)
+
+
+def benchmark_update_render(scene: sapien.Scene, calls: int, repeats: int) -> float:
+    def run() -> float:
+        start = time.perf_counter()
+        for _ in range(calls):
+            scene.step()
+            scene.update_render()
+        return time.perf_counter() - start
+
+    def run_physics() -> float:
+        start = time.perf_counter()
+        for _ in range(calls):
+            scene.step()
+        return time.perf_counter() - start
+
+    initial_state = SceneSnapshot(scene)
+    initial_state.restore()
+    with_render = 1.0 / _median_rate(run, calls, repeats)
+    initial_state.restore()
+    physics_only = 1.0 / _median_rate(run_physics, calls, repeats)
+    initial_state.restore()
+    return max(with_render - physics_only, 0.0)
+
+
+def benchmark_reset(scene: sapien.Scene, calls: int, repeats: int) -> float:
+    initial_state = SceneSnapshot(scene)
+
+    def run() -> float:
+        start = time.perf_counter()
+        for _ in range(calls):
+            initial_state.restore()
+        return time.perf_counter() - start
+
+    return 1.0 / _median_rate(run, calls, repeats)
+
+
+def run_benchmarks(target: str = 'frl_apt_0', steps: int = 1000, repeats: int = 5,
+                   render: bool = True) -> Dict:
+    renderer = None
+    engine = sapien.Engine()
+    if render:
+        renderer = sapien.SapienRenderer(offscreen_only=True)
+        engine.set_renderer(renderer)
+
+    results = {
+        "meta": {
+            "target": target,
+            "steps": steps,
+            "repeats": repeats,
+            "render": render,
+            "sapien": getattr(sapien, "__version__", None),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+    }
+
+    results["build"] = benchmark_build(engine, target)
+    scene = _builder(target)(engine, scene=None)
+
+    results["reset_seconds"] = benchmark_reset(scene, steps, repeats)
+    results["steps_per_second"] = {"without_robot": benchmark_step(scene, steps, repeats)}
+    robot = load_robot(scene)
+    results["steps_per_second"]["with_robot"] = benchmark_step(scene, steps, repeats, robot)
+    results["steps_per_second"]["with_robot_no_passive_force"] = benchmark_step(
+        scene, steps, repeats, robot, passive_force=False)
+    results["passive_force_seconds"] = benchmark_passive_force(robot, steps, repeats)
+    results["update_render_seconds"] = \
+        benchmark_update_render(scene, steps, repeats) if renderer is not None else None
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Headless benchmark of scene build, reset and step throughput.")
+    parser.add_argument('target', nargs='?', default='frl_apt_0',
+                        help="frl_apt_0 or a scene_instance layout name")
+    parser.add_argument('--steps', type=int, default=1000)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--no-render', action='store_true',
+                        help="run without a renderer and skip update_render")
+    parser.add_argument('--output', default='benchmark.json')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.target, args.steps, args.repeats, not args.no_render)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    build = results["build"]
+    print("build: {:.3f} s (stage {:.3f}, objects {:.3f}, articulations {:.3f})".format(
+        build["total"], build.get("stage", 0.0), build["objects_total"],
+        build["articulations_total"]))
+    for label, rate in results["steps_per_second"].items():
+        print("steps/s {}: {:.1f}".format(label, rate))
+    print("compute_passive_force: {:.1f} us".format(results["passive_force_seconds"] * 1e6))
+    if results["update_render_seconds"] is not None:
+        print("update_render: {:.1f} us".format(results["update_render_seconds"] * 1e6))
+    print("results written to {}".format(args.output))
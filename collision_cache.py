@@ -0,0 +1,171 @@
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+from mesh_cache import CACHE_DIR, file_digest, get_mesh_cache, resolve
+from mesh_io import temporary_path, write_stl
+from profiling import scope
+
+
+def _link(source: str, target: str):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp = temporary_path(target)
+    try:
+        os.link(source, tmp)
+    except OSError:
+        shutil.copyfile(source, tmp)
+    os.replace(tmp, target)
+
+
+class CollisionCache:
+    """
+    Persistent cache of collision geometry keyed by the SHA-1 of the source
+    file, so entries are invalidated whenever an asset changes.
+
+    Convex sources are linked into the cache under their hash. SAPIEN writes
+    the hull it computes next to them as "<hash>.glb.convex.stl" on first use
+    and loads that file instead of recomputing the hull on every later start.
+    Nonconvex sources are stored as position-only binary STL triangle meshes,
+    which skips decoding the render data of large glb files.
+    """
+
+    def __init__(self, cache_dir: str = os.path.join(CACHE_DIR, "collision"),
+                 enabled: bool = True):
+        self.cache_dir = cache_dir
+        self.enabled = enabled
+        self._sources: Dict[str, str] = {}
+
+    def convex(self, filename: str) -> str:
+        """
+        Path to pass to ActorBuilder.add_collision_from_file.
+        """
+        if not self.enabled:
+            return filename
+        source = resolve(filename)
+        ext = os.path.splitext(source)[1]
+        target = os.path.join(self.cache_dir, "convex", file_digest(source) + ext)
+        self._sources[target] = source
+        if not os.path.exists(target):
+            _link(source, target)
+        return target
+
+    def nonconvex(self, filename: str) -> str:
+        """
+        Path to pass to ActorBuilder.add_nonconvex_collision_from_file.
+        """
+        if not self.enabled:
+            return filename
+        source = resolve(filename)
+        target = os.path.join(self.cache_dir, "trimesh", file_digest(source) + ".stl")
+        self._sources[target] = source
+        if not os.path.exists(target):
+            with scope('collision/trimesh', {'file': os.path.basename(source)}):
+                mesh = get_mesh_cache().load(source)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                write_stl(target, mesh.vertices, mesh.global_triangles())
+        return target
+
+    def source(self, filename: str) -> str:
+        """
+        The asset a path returned by convex() or nonconvex() in this process
+        was made from. Other paths are returned as they are.
+        """
+        return self._sources.get(filename, filename)
+
+    def is_cooked(self, filename: str) -> bool:
+        source = resolve(filename)
+        ext = os.path.splitext(source)[1]
+        target = os.path.join(self.cache_dir, "convex", file_digest(source) + ext)
+        return os.path.exists(target + ".convex.stl")
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        self._sources.clear()
+
+
+_collision_cache = CollisionCache(
+    enabled=os.environ.get("REPLICA_CAD_COLLISION_CACHE", "1") != "0")
+
+
+def get_collision_cache() -> CollisionCache:
+    return _collision_cache
+
+
+def convex_collision(filename: str) -> str:
+    return _collision_cache.convex(filename)
+
+
+def nonconvex_collision(filename: str) -> str:
+    return _collision_cache.nonconvex(filename)
+
+
+def _cook(targets: List[str]) -> int:
+    import sapien.core as sapien
+
+    engine = sapien.Engine()
+    scene = engine.create_scene()
+    for target in targets:
+        builder = scene.create_actor_builder()
+        builder.add_collision_from_file(filename=target)
+        scene.remove_actor(builder.build())
+    return len(targets)
+
+
+def cook_convex(filenames: List[str], workers: int = 1) -> int:
+    """
+    Have SAPIEN compute and save the hulls of convex collision sources that
+    are not cooked yet, so the build that adds them only loads the saved
+    hull. The hulls are built in separate processes with their own engine,
+    leaving the caller's engine and the thread that steps it alone. Returns
+    the number of files cooked.
+    """
+    cache = get_collision_cache()
+    if not cache.enabled:
+        return 0
+    targets = [cache.convex(filename) for filename in dict.fromkeys(filenames)
+               if not cache.is_cooked(filename)]
+    if not targets:
+        return 0
+    workers = min(workers, len(targets))
+    # Spawned, since forking a process that has loaded sapien is not safe
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return sum(pool.map(_cook, [targets[i::workers] for i in range(workers)]))
+
+
+def _time_build(target: str) -> float:
+    import sapien.core as sapien
+
+    engine = sapien.Engine()
+    start = time.perf_counter()
+    if target == 'frl_apt_0':
+        from frl_apt_0 import build_scene
+        build_scene(engine)
+    else:
+        from scene_loader import build_scene_instance
+        build_scene_instance(engine, target)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    # Usage: python collision_cache.py [frl_apt_0 | <layout name>]
+    # Builds the scene in fresh processes: without the cache, with an empty
+    # cache (cold) and with the cache filled by the previous run (warm).
+    if len(sys.argv) > 2 and sys.argv[1] == '--child':
+        print(_time_build(sys.argv[2]))
+        sys.exit(0)
+
+    target = sys.argv[1] if len(sys.argv) > 1 else 'frl_apt_0'
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for label, enabled in [("uncached", "0"), ("cold", "1"), ("warm", "1")]:
+            env = dict(os.environ, REPLICA_CAD_CACHE_DIR=cache_dir,
+                       REPLICA_CAD_COLLISION_CACHE=enabled)
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--child', target],
+                env=env, check=True, stdout=subprocess.PIPE, text=True).stdout
+            print("{:>8s} build: {:.3f} s".format(label, float(output.split()[-1])))
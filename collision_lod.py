@@ -0,0 +1,303 @@
+import json
+import os
+import re
+import sys
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import sapien.core as sapien
+from sapien.utils import Viewer
+
+import numpy as np
+
+from collision_cache import convex_collision, get_collision_cache, nonconvex_collision
+from frl_apt_0 import build_scene
+from mesh_cache import CACHE_DIR, file_digest, get_mesh_cache
+from scene_wrapper import ActorBuilderWrapper, SceneWrapper, name_argument
+
+FIDELITIES = ('full', 'convex', 'primitive')
+
+# Furniture that navigation does not need mesh-accurate contacts for
+NAVIGATION_FIDELITY = {
+    name: 'primitive' for name in [
+        'sofa', 'table', 'chair', 'stool', 'beanbag', 'wall_cabinet', 'tv_stand',
+        'rack', 'rug', 'mat', 'cushion', 'lamp', 'indoor_plant', 'monitor', 'tv_screen',
+        'picture', 'cloth', 'towel', 'bike',
+    ]
+}
+
+_VERSION = 2
+_MIN_HALF_SIZE = 1e-3
+
+
+@dataclass
+class Proxy:
+    """
+    A box or capsule collision shape in the mesh's frame. Capsules are
+    along their local x axis, as in SAPIEN.
+    """
+    type: str
+    position: List[float]
+    quaternion: List[float]
+    half_size: Optional[List[float]] = None
+    radius: float = 0.0
+    half_length: float = 0.0
+
+    @property
+    def pose(self) -> sapien.Pose:
+        return sapien.Pose(self.position, self.quaternion)
+
+    @property
+    def volume(self) -> float:
+        if self.type == 'box':
+            return 8 * float(np.prod(self.half_size))
+        return np.pi * self.radius ** 2 * (2 * self.half_length + 4 / 3 * self.radius)
+
+    def contains(self, points: np.ndarray, tolerance: float = 1e-6) -> np.ndarray:
+        """
+        Whether each point, in the mesh's frame, is inside the proxy.
+        """
+        rotation = self.pose.to_transformation_matrix()[:3, :3]
+        local = (np.asarray(points, dtype=np.float64) - self.position) @ rotation
+        if self.type == 'box':
+            return np.all(np.abs(local) <= np.asarray(self.half_size) + tolerance, axis=1)
+        axial = np.clip(local[:, 0], -self.half_length, self.half_length)
+        distance = np.linalg.norm(local - np.outer(axial, [1, 0, 0]), axis=1)
+        return distance <= self.radius + tolerance
+
+
+def _matrix_to_quat(mat33: np.ndarray) -> np.ndarray:
+    """
+    (w, x, y, z) quaternion of a rotation matrix.
+    """
+    m = mat33
+    trace = np.trace(m)
+    if trace > 0:
+        s = 2 * np.sqrt(trace + 1)
+        q = [s / 4, (m[2, 1] - m[1, 2]) / s, (m[0, 2] - m[2, 0]) / s, (m[1, 0] - m[0, 1]) / s]
+    elif m[0, 0] > m[1, 1] and m[0, 0] > m[2, 2]:
+        s = 2 * np.sqrt(1 + m[0, 0] - m[1, 1] - m[2, 2])
+        q = [(m[2, 1] - m[1, 2]) / s, s / 4, (m[0, 1] + m[1, 0]) / s, (m[0, 2] + m[2, 0]) / s]
+    elif m[1, 1] > m[2, 2]:
+        s = 2 * np.sqrt(1 + m[1, 1] - m[0, 0] - m[2, 2])
+        q = [(m[0, 2] - m[2, 0]) / s, (m[0, 1] + m[1, 0]) / s, s / 4, (m[1, 2] + m[2, 1]) / s]
+    else:
+        s = 2 * np.sqrt(1 + m[2, 2] - m[0, 0] - m[1, 1])
+        q = [(m[1, 0] - m[0, 1]) / s, (m[0, 2] + m[2, 0]) / s, (m[1, 2] + m[2, 1]) / s, s / 4]
+    q = np.array(q)
+    return q / np.linalg.norm(q)
+
+
+def fit_proxy(vertices: np.ndarray) -> Proxy:
+    """
+    Fit a box or a capsule, whichever is tighter, to a point set. Both are
+    aligned with the principal axes of the points, longest axis first.
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    center = vertices.mean(0)
+    if len(vertices) >= 3:
+        _, _, axes = np.linalg.svd(vertices - center, full_matrices=False)
+    else:
+        axes = np.eye(3)
+    rotation = axes.T
+    if np.linalg.det(rotation) < 0:
+        rotation[:, 2] = -rotation[:, 2]
+
+    local = (vertices - center) @ rotation
+    lower, upper = local.min(0), local.max(0)
+    half_size = np.maximum((upper - lower) / 2, _MIN_HALF_SIZE)
+    box_center = center + rotation @ ((lower + upper) / 2)
+    quaternion = _matrix_to_quat(rotation)
+    box = Proxy('box', box_center.tolist(), quaternion.tolist(), half_size=half_size.tolist())
+
+    # Capsule along the longest axis, enclosing every point: a point at
+    # distance rho from the axis is inside while its axial offset from the
+    # middle is at most half_length + sqrt(radius^2 - rho^2)
+    mid = (lower[0] + upper[0]) / 2
+    rho = np.sqrt(local[:, 1] ** 2 + local[:, 2] ** 2)
+    radius = max(float(rho.max()), _MIN_HALF_SIZE)
+    cap = np.sqrt(np.maximum(radius ** 2 - rho ** 2, 0))
+    half_length = max(float((np.abs(local[:, 0] - mid) - cap).max()), 0.0)
+    capsule_center = center + rotation[:, 0] * mid
+    capsule = Proxy('capsule', capsule_center.tolist(), quaternion.tolist(),
+                    radius=radius, half_length=half_length)
+    if capsule.volume < box.volume and capsule.contains(vertices).all():
+        return capsule
+    return box
+
+
+def fit_proxies(filename: str) -> List[Proxy]:
+    """
+    One proxy per mesh part, so convex decompositions get one proxy per piece.
+    """
+    mesh = get_mesh_cache().load(filename)
+    return [fit_proxy(mesh.part(i)[0]) for i in range(mesh.num_parts)
+            if len(mesh.part(i)[0]) > 0]
+
+
+class CollisionLOD:
+    """
+    Primitive proxies of collision assets, stored on disk under the SHA-1 of
+    the asset so they are fitted once per asset version.
+    """
+
+    def __init__(self, cache_dir: str = os.path.join(CACHE_DIR, "collision_lod")):
+        self.cache_dir = cache_dir
+        self._proxies: Dict[str, List[Proxy]] = {}
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.cache_dir, "{}.v{}.json".format(file_digest(filename), _VERSION))
+
+    def proxies(self, filename: str) -> List[Proxy]:
+        path = self._path(filename)
+        proxies = self._proxies.get(path)
+        if proxies is not None:
+            return proxies
+        if os.path.exists(path):
+            with open(path) as f:
+                proxies = [Proxy(**proxy) for proxy in json.load(f)]
+        else:
+            proxies = fit_proxies(filename)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = "{}.tmp{}".format(path, os.getpid())
+            with open(tmp, 'w') as f:
+                json.dump([asdict(proxy) for proxy in proxies], f)
+            os.replace(tmp, path)
+        self._proxies[path] = proxies
+        return proxies
+
+
+_collision_lod = CollisionLOD()
+
+
+def get_collision_lod() -> CollisionLOD:
+    return _collision_lod
+
+
+def category(name: str) -> str:
+    """
+    Object category of an actor name, e.g. frl_apartment_table_02 -> table.
+    """
+    name = re.sub(r'^frl_apartment_', '', name)
+    return re.sub(r'([_:]\d+)+$', '', name)
+
+
+def add_collision(builder: sapien.ActorBuilder, filename: str, fidelity: str,
+                  nonconvex: bool = False, pose: sapien.Pose = sapien.Pose(),
+                  material: Optional[sapien.PhysicalMaterial] = None, **kwargs):
+    """
+    Add the collision shapes of a mesh file at the given fidelity:
+        full: the shapes the file is authored for, nonconvex meshes stay nonconvex
+        convex: a single convex hull
+        primitive: fitted box and capsule proxies
+    """
+    if fidelity == 'full' and nonconvex:
+        builder.add_nonconvex_collision_from_file(
+            filename=nonconvex_collision(filename), pose=pose, material=material)
+    elif fidelity in ('full', 'convex'):
+        builder.add_collision_from_file(
+            filename=convex_collision(filename), pose=pose, material=material, **kwargs)
+    elif fidelity == 'primitive':
+        for proxy in _collision_lod.proxies(filename):
+            if proxy.type == 'box':
+                builder.add_box_collision(
+                    pose=pose * proxy.pose, half_size=proxy.half_size, material=material, **kwargs)
+            else:
+                builder.add_capsule_collision(
+                    pose=pose * proxy.pose, radius=proxy.radius, half_length=proxy.half_length,
+                    material=material, **kwargs)
+    else:
+        raise ValueError("Unknown collision fidelity {!r}, expected one of {}".format(
+            fidelity, FIDELITIES))
+
+
+class _LODActorBuilder(ActorBuilderWrapper):
+    """
+    Defers mesh collisions until the actor's name, and so its category, is
+    known. The owner is the function that picks the fidelity of a name.
+    """
+
+    def __init__(self, builder: sapien.ActorBuilder, fidelity: Callable[[str], str]):
+        super().__init__(builder, fidelity)
+        self._collisions: List[Tuple[bool, tuple, dict]] = []
+
+    def add(self, method: str, args: tuple, kwargs: dict):
+        if method in ('add_collision_from_file', 'add_nonconvex_collision_from_file'):
+            self._collisions.append((method == 'add_nonconvex_collision_from_file', args, kwargs))
+        else:
+            super().add(method, args, kwargs)
+
+    def _add_collisions(self, name: str):
+        fidelity = self._owner(name)
+        for nonconvex, args, kwargs in self._collisions:
+            if fidelity == 'full':
+                # Filenames already point into the collision cache
+                if nonconvex:
+                    self._builder.add_nonconvex_collision_from_file(*args, **kwargs)
+                else:
+                    self._builder.add_collision_from_file(*args, **kwargs)
+                continue
+            kwargs = dict(kwargs)
+            filename = kwargs.pop('filename', args[0] if args else None)
+            # Fit the parts of the source asset, not the merged cache entry
+            filename = get_collision_cache().source(filename)
+            add_collision(self._builder, filename, fidelity, nonconvex, **kwargs)
+
+    def build_actor(self, method: str, args: tuple, kwargs: dict) -> sapien.ActorBase:
+        self._add_collisions(name_argument(args, kwargs))
+        return super().build_actor(method, args, kwargs)
+
+
+class _LODScene(SceneWrapper):
+    actor_builder_class = _LODActorBuilder
+
+
+def build_with_collision_lod(engine: sapien.Engine,
+                             build: Callable[..., sapien.Scene] = build_scene,
+                             fidelity: Dict[str, str] = NAVIGATION_FIDELITY,
+                             default: str = 'full') -> sapien.Scene:
+    """
+    Build a scene with the collision fidelity of each actor picked by its
+    category, e.g. {'sofa': 'primitive', 'table': 'convex'}. The stage and
+    categories not listed use default. build is called as
+    build(engine, scene=...), like build_scene and build_layout.
+    """
+    def fidelity_of(name: str) -> str:
+        if name == 'stage':
+            return 'full'
+        return fidelity.get(category(name), default)
+
+    scene = engine.create_scene()
+    scene.set_timestep(1 / 100.0)
+    build(engine, scene=_LODScene(scene, fidelity_of))
+    return scene
+
+
+if __name__ == '__main__':
+    # Usage: python collision_lod.py [full | convex | primitive]
+    # Builds FRL apartment 0 with every object at the given fidelity, or
+    # with the navigation preset, and shows the collision shapes.
+    if len(sys.argv) > 1:
+        fidelity, default = {}, sys.argv[1]
+    else:
+        fidelity, default = NAVIGATION_FIDELITY, 'full'
+
+    # Set up engine and renderer
+    engine = sapien.Engine()
+    renderer = sapien.SapienRenderer()
+    engine.set_renderer(renderer)
+
+    scene = build_with_collision_lod(engine, fidelity=fidelity, default=default)
+    for actor in scene.get_all_actors():
+        actor.render_collision()
+        actor.hide_visual()
+
+    # Viewer
+    viewer = Viewer(renderer, resolutions=(1920, 1080))
+    viewer.set_scene(scene)
+    viewer.set_camera_xyz(x=-2.0, y=0, z=1.5)
+
+    while not viewer.closed:
+        scene.step()
+        scene.update_render()
+        viewer.render()
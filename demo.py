@@ -1,12 +1,26 @@
+import sys
+
 import sapien.core as sapien
 from sapien.utils import Viewer
 
 from frl_apt_0 import build_scene
+from profiling import scope
+from recorder import TrajectoryRecorder
+from runner import SimulationRunner
+from snapshot import SceneSnapshot
+
+# Physics-only mode: python demo.py --headless
+# Without a renderer no visual meshes are loaded, for the scene or the robot
+headless = '--headless' in sys.argv
+# Record every physics step: python demo.py --record trajectory.bin
+# and play it back with python recorder.py trajectory.bin
+record = sys.argv[sys.argv.index('--record') + 1] if '--record' in sys.argv else None
 
 # Set up engine and renderer
 engine = sapien.Engine()
-renderer = sapien.SapienRenderer()
-engine.set_renderer(renderer)
+if not headless:
+    renderer = sapien.SapienRenderer()
+    engine.set_renderer(renderer)
 
 # Enable ray tracing
 # sapien.render_config.camera_shader_dir = 'rt'
@@ -15,7 +29,8 @@ engine.set_renderer(renderer)
 # sapien.render_config.rt_max_path_depth = 8
 # sapien.render_config.rt_use_denoiser = True
 
-scene = build_scene(engine)
+# Dynamic objects start at rest, see settle.py
+scene = build_scene(engine, settled=True)
 
 # Robot
 loader = scene.create_urdf_loader()
@@ -33,20 +48,50 @@ for joint_idx, joint in enumerate(active_joints):
     joint.set_drive_property(stiffness=1000, damping=200)
     joint.set_drive_target(target_qpos[joint_idx])
 
+# Initial state of the apartment and the robot, restored by pressing "n"
+initial_state = SceneSnapshot(scene)
+
+recorder = TrajectoryRecorder(record, scene, robot) if record else None
+
+
+def apply_passive_force(runner):
+    with scope('demo/compute_passive_force'):
+        qf = robot.compute_passive_force(
+            gravity=True,
+            coriolis_and_centrifugal=True,
+        )
+    robot.set_qf(qf)
+
+
+def on_substep(runner):
+    apply_passive_force(runner)
+    if recorder is not None:
+        recorder.record()
+
+
+if headless:
+    runner = SimulationRunner(scene, render_interval=0, on_substep=on_substep)
+    print(runner.run(duration=60.0, report_interval=5.0))
+    if recorder is not None:
+        recorder.close()
+    sys.exit(0)
+
 # Viewer
 viewer = Viewer(renderer, resolutions=(1920, 1080))
 viewer.set_scene(scene)
 viewer.set_camera_xyz(x=-2.0, y=0, z=1.5)
 
-# viewer.paused = True
-while not viewer.closed:
-    qf = robot.compute_passive_force(
-        gravity=True,
-        coriolis_and_centrifugal=True,
-    )
-    robot.set_qf(qf)
-    
-    scene.step()
-    scene.update_render()
-    viewer.render()
 
+def handle_keys(runner):
+    if viewer.window.key_press('n'):
+        initial_state.restore()
+
+
+# Physics runs at 100 Hz and the viewer is redrawn every other step (50 Hz)
+runner = SimulationRunner(scene, substeps=1, render_interval=2, viewer=viewer,
+                          on_substep=on_substep, on_control=handle_keys)
+
+# viewer.paused = True
+print(runner.run(report_interval=5.0))
+if recorder is not None:
+    recorder.close()
@@ -1,34 +1,122 @@
+from typing import Dict, List, Optional
+
 import sapien.core as sapien
 from sapien.utils import Viewer
 
 import numpy as np
 
+from collision_cache import convex_collision, nonconvex_collision
+from prefetch import prefetch_assets, record_assets
+from profiling import profiled_scene, scope, unwrap_scene
+
+
+# Rotation from ReplicaCAD's Y-up frame into SAPIEN's Z-up world frame
+R2S_ROTATION = np.array([
+    [0, -1, 0],
+    [0, 0, 1],
+    [-1, 0, 0]
+]).T
+# The same rotation as a (w, x, y, z) quaternion
+R2S_QUATERNION = np.array([0.5, 0.5, -0.5, -0.5])
+_R2S_POSE = sapien.Pose(q=R2S_QUATERNION)
+_S2R_POSE = _R2S_POSE.inv()
+
 
 def r2s(pose: sapien.Pose) -> sapien.Pose:
     """
     Transform pose in ReplicaCAD's original frame into SAPIEN's world frame.
     """
-    mat44 = np.eye(4)
-    mat44[:3, :3] = np.array([
-        [0, -1, 0],
-        [0, 0, 1],
-        [-1, 0, 0]
-    ]).T
-    relative_pose = sapien.Pose.from_transformation_matrix(mat44)
-    return relative_pose * pose
+    return _R2S_POSE * pose
+
+
+def s2r(pose: sapien.Pose) -> sapien.Pose:
+    """
+    Transform pose in SAPIEN's world frame into ReplicaCAD's original frame.
+    """
+    return _S2R_POSE * pose
+
+
+def _quat_multiply(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    aw, ax, ay, az = np.moveaxis(a, -1, 0)
+    bw, bx, by, bz = np.moveaxis(b, -1, 0)
+    return np.stack([
+        aw * bw - ax * bx - ay * by - az * bz,
+        aw * bx + ax * bw + ay * bz - az * by,
+        aw * by - ax * bz + ay * bw + az * bx,
+        aw * bz + ax * by - ay * bx + az * bw,
+    ], axis=-1)
+
+
+def r2s_batch(positions: np.ndarray, quaternions: Optional[np.ndarray] = None):
+    """
+    Vectorized r2s for (N, 3) positions and (N, 4) quaternions in (w, x, y, z)
+    order. Returns the transformed positions, and quaternions if given.
+    """
+    positions = np.asarray(positions, dtype=np.float64) @ R2S_ROTATION.T
+    if quaternions is None:
+        return positions
+    return positions, _quat_multiply(R2S_QUATERNION, np.asarray(quaternions, dtype=np.float64))
+
+
+def s2r_batch(positions: np.ndarray, quaternions: Optional[np.ndarray] = None):
+    """
+    Vectorized s2r, the inverse of r2s_batch.
+    """
+    positions = np.asarray(positions, dtype=np.float64) @ R2S_ROTATION
+    if quaternions is None:
+        return positions
+    inverse = R2S_QUATERNION * np.array([1, -1, -1, -1])
+    return positions, _quat_multiply(inverse, np.asarray(quaternions, dtype=np.float64))
+
+
+_assets: Dict[bool, Dict[str, List[str]]] = {}
+
+
+def scene_assets(visual: bool = True) -> Dict[str, List[str]]:
+    """
+    Every file build_scene opens, grouped as by prefetch.layout_assets.
+    Recorded on first use and kept for the process.
+    """
+    if visual not in _assets:
+        _assets[visual] = record_assets(
+            lambda engine, scene: build_scene(engine, scene, prefetch_workers=0), visual)
+    return _assets[visual]
 
 
-def build_scene(engine: sapien.Engine):
+def build_scene(engine: sapien.Engine, scene: sapien.Scene = None, settled: bool = False,
+                prefetch_workers: Optional[int] = None):
+    """
+    Build FRL apartment 0. Pass scene to add the apartment to an existing
+    scene instead of creating a new one.
+
+    With settled, dynamic objects start at the rest poses stored by
+    settle.py, which are computed and cached on first use.
+
+    Assets are first prefetched in parallel with prefetch_workers threads,
+    as in scene_loader.build_layout (one per core by default, 0 to skip).
+    """
+    if prefetch_workers != 0:
+        with scope('build_scene/prefetch'):
+            prefetch_assets(scene_assets(engine.get_renderer() is not None), workers=prefetch_workers)
+
     # Set up scene
-    scene = engine.create_scene()
-    scene.set_timestep(1 / 100.0)
+    if scene is None:
+        scene = engine.create_scene()
+        scene.set_timestep(1 / 100.0)
+    recorder = None
+    if settled:
+        # settle imports this module for its default scene
+        from settle import SettleRecorder
+        recorder = SettleRecorder(scene)
+        scene = recorder.wrap()
+    scene = profiled_scene(scene, 'build_scene')
 
     # Stage
     builder = scene.create_actor_builder()
     builder.add_visual_from_file(
         filename="replica_cad/stages/frl_apartment_stage.glb")
     builder.add_nonconvex_collision_from_file(
-        filename="replica_cad/stages/frl_apartment_stage.glb")
+        filename=nonconvex_collision("replica_cad/stages/frl_apartment_stage.glb"))
     stage = builder.build_static(name='stage')
     stage.set_pose(r2s(sapien.Pose()))
 
@@ -40,29 +128,32 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_bike_01.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_bike_01_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_bike_01_cv_decomp.glb"))
     bike_01 = builder.build(name='bike')
-    # bike_01.set_pose(r2s(sapien.Pose(
-    #     p=np.array([
-    #         4.107420409715755,
-    #         0.4545634772665478,
-    #         -0.9759617637063622
-    #     ]),
-    #     q=np.array([
-    #         0.1531376838684082,
-    #         0.07608834654092789,
-    #         0.985193133354187,
-    #         0.012405824847519398
-    #     ])
-    # )))
-    bike_01.set_pose(sapien.Pose([0.483688, -3.78923, 0.444299],
-                     [0.593394, 0.646121, 0.286293, 0.38529]))
+    if settled:
+        # Settling brings the bike to rest from its authored pose
+        bike_01.set_pose(r2s(sapien.Pose(
+            p=np.array([
+                4.107420409715755,
+                0.4545634772665478,
+                -0.9759617637063622
+            ]),
+            q=np.array([
+                0.1531376838684082,
+                0.07608834654092789,
+                0.985193133354187,
+                0.012405824847519398
+            ])
+        )))
+    else:
+        bike_01.set_pose(sapien.Pose([0.483688, -3.78923, 0.444299],
+                         [0.593394, 0.646121, 0.286293, 0.38529]))
 
     builder = scene.create_actor_builder()
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_bin_01.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_bin_01_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_bin_01_cv_decomp.glb"))
     bin_01 = builder.build(name='bin')
     bin_01.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -82,7 +173,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_bin_02.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_bin_02_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_bin_02_cv_decomp.glb"))
     bin_02 = builder.build(name='bin')
     bin_02.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -102,7 +193,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_bin_03.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_bin_03_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_bin_03_cv_decomp.glb"))
     bin_03 = builder.build(name='bin')
     bin_03.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -122,7 +213,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_wall_cabinet_01.glb")
     builder.add_nonconvex_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_wall_cabinet_01_cv_decomp.glb")
+        filename=nonconvex_collision("replica_cad/objects/convex/frl_apartment_wall_cabinet_01_cv_decomp.glb"))
     wall_cabinet_01 = builder.build_static(name='wall_cabinet')
     wall_cabinet_01.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -142,7 +233,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_clock.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_clock_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_clock_cv_decomp.glb"))
     clock = builder.build(name='clock')
     clock.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -162,7 +253,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_stool_02.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_stool_02_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_stool_02_cv_decomp.glb"))
     stool_02 = builder.build(name='stool')
     stool_02.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -182,7 +273,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_chair_05.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_chair_05_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_chair_05_cv_decomp.glb"))
     chair_05 = builder.build(name='chair')
     chair_05.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -202,7 +293,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_chair_05.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_chair_05_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_chair_05_cv_decomp.glb"))
     chair_05 = builder.build(name='chair')
     chair_05.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -222,7 +313,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_cushion_03.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_cushion_03_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_cushion_03_cv_decomp.glb"))
     cushion_03 = builder.build(name='cushion')
     cushion_03.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -242,7 +333,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_sofa.glb")
     builder.add_nonconvex_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_sofa_cv_decomp.glb")
+        filename=nonconvex_collision("replica_cad/objects/convex/frl_apartment_sofa_cv_decomp.glb"))
     sofa = builder.build_static(name='sofa')
     sofa.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -262,7 +353,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_cushion_03.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_cushion_03_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_cushion_03_cv_decomp.glb"))
     cushion_03 = builder.build(name='cushion')
     cushion_03.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -282,7 +373,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_cushion_03.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_cushion_03_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_cushion_03_cv_decomp.glb"))
     cushion_03 = builder.build(name='cushion')
     cushion_03.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -302,7 +393,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_table_04.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_table_04_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_table_04_cv_decomp.glb"))
     table_04 = builder.build(name='table')
     table_04.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -342,7 +433,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_indoor_plant_02.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_indoor_plant_02_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_indoor_plant_02_cv_decomp.glb"))
     indoor_plant_02 = builder.build(name='indoor_plant')
     indoor_plant_02.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -362,7 +453,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_rug_01.glb")
     builder.add_nonconvex_collision_from_file(
-        filename="replica_cad/objects/frl_apartment_rug_01.glb")
+        filename=nonconvex_collision("replica_cad/objects/frl_apartment_rug_01.glb"))
     rug_01 = builder.build_static(name='rug')
     rug_01.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -382,7 +473,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_rug_02.glb")
     builder.add_nonconvex_collision_from_file(
-        filename="replica_cad/objects/frl_apartment_rug_02.glb")
+        filename=nonconvex_collision("replica_cad/objects/frl_apartment_rug_02.glb"))
     rug_02 = builder.build_static(name='rug')
     rug_02.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -402,7 +493,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_table_03.glb")
     builder.add_nonconvex_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_table_03_cv_decomp.glb")
+        filename=nonconvex_collision("replica_cad/objects/convex/frl_apartment_table_03_cv_decomp.glb"))
     table_03 = builder.build_static(name='table')
     table_03.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -422,7 +513,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_cushion_01.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_cushion_01_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_cushion_01_cv_decomp.glb"))
     cushion_01 = builder.build(name='cushion')
     cushion_01.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -442,7 +533,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_chair_01.glb")
     builder.add_nonconvex_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_chair_01_cv_decomp.glb")
+        filename=nonconvex_collision("replica_cad/objects/convex/frl_apartment_chair_01_cv_decomp.glb"))
     chair_01 = builder.build_static(name='chair')
     chair_01.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -462,7 +553,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_chair_01.glb")
     builder.add_nonconvex_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_chair_01_cv_decomp.glb")
+        filename=nonconvex_collision("replica_cad/objects/convex/frl_apartment_chair_01_cv_decomp.glb"))
     chair_01 = builder.build_static(name='chair')
     chair_01.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -482,7 +573,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_towel.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_towel_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_towel_cv_decomp.glb"))
     towel = builder.build(name='towel')
     towel.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -502,7 +593,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_lamp_01.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_lamp_01_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_lamp_01_cv_decomp.glb"))
     lamp_01 = builder.build(name='lamp')
     lamp_01.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -522,7 +613,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_stool_02.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_stool_02_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_stool_02_cv_decomp.glb"))
     stool_02 = builder.build(name='stool')
     stool_02.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -542,7 +633,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_remote-control_01.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_remote-control_01_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_remote-control_01_cv_decomp.glb"))
     remote_control_01 = builder.build(name='remote_control')
     remote_control_01.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -562,7 +653,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_remote-control_01.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_remote-control_01_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_remote-control_01_cv_decomp.glb"))
     remote_control_01 = builder.build(name='remote_control')
     remote_control_01.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -582,7 +673,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_tv_object.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_tv_object_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_tv_object_cv_decomp.glb"))
     tv_object = builder.build(name='tablet')
     tv_object.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -602,7 +693,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_tv_screen.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_tv_screen_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_tv_screen_cv_decomp.glb"))
     tv_screen = builder.build_static(name='tv_screen')
     tv_screen.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -622,7 +713,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_wall_cabinet_02.glb")
     builder.add_nonconvex_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_wall_cabinet_02_cv_decomp.glb")
+        filename=nonconvex_collision("replica_cad/objects/convex/frl_apartment_wall_cabinet_02_cv_decomp.glb"))
     wall_cabinet_02 = builder.build_static(name='wall_cabinet')
     wall_cabinet_02.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -642,7 +733,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_picture_04.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/frl_apartment_picture_04.glb")
+        filename=convex_collision("replica_cad/objects/frl_apartment_picture_04.glb"))
     picture_04 = builder.build(name='picture')
     picture_04.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -662,7 +753,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_book_02.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/frl_apartment_book_02.glb")
+        filename=convex_collision("replica_cad/objects/frl_apartment_book_02.glb"))
     book_02 = builder.build(name='book')
     book_02.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -682,7 +773,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_book_03.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/frl_apartment_book_03.glb")
+        filename=convex_collision("replica_cad/objects/frl_apartment_book_03.glb"))
     book_03 = builder.build(name='book')
     book_03.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -702,7 +793,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_book_04.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/frl_apartment_book_04.glb")
+        filename=convex_collision("replica_cad/objects/frl_apartment_book_04.glb"))
     book_04 = builder.build(name='book')
     book_04.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -722,7 +813,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_book_06.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/frl_apartment_book_06.glb")
+        filename=convex_collision("replica_cad/objects/frl_apartment_book_06.glb"))
     book_06 = builder.build(name='book')
     book_06.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -742,7 +833,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_book_05.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/frl_apartment_book_05.glb")
+        filename=convex_collision("replica_cad/objects/frl_apartment_book_05.glb"))
     book_05 = builder.build(name='book')
     book_05.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -762,7 +853,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_book_01.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/frl_apartment_book_01.glb")
+        filename=convex_collision("replica_cad/objects/frl_apartment_book_01.glb"))
     book_01 = builder.build(name='book')
     book_01.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -782,7 +873,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_book_05.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/frl_apartment_book_05.glb")
+        filename=convex_collision("replica_cad/objects/frl_apartment_book_05.glb"))
     book_05 = builder.build(name='book')
     book_05.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -802,7 +893,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_book_01.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/frl_apartment_book_01.glb")
+        filename=convex_collision("replica_cad/objects/frl_apartment_book_01.glb"))
     book_01 = builder.build(name='book')
     book_01.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -822,7 +913,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_book_01.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/frl_apartment_book_01.glb")
+        filename=convex_collision("replica_cad/objects/frl_apartment_book_01.glb"))
     book_01 = builder.build(name='book')
     book_01.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -842,7 +933,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_book_01.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/frl_apartment_book_01.glb")
+        filename=convex_collision("replica_cad/objects/frl_apartment_book_01.glb"))
     book_01 = builder.build(name='book')
     book_01.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -862,7 +953,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_book_05.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/frl_apartment_book_05.glb")
+        filename=convex_collision("replica_cad/objects/frl_apartment_book_05.glb"))
     book_05 = builder.build(name='book')
     book_05.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -882,7 +973,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_book_02.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/frl_apartment_book_02.glb")
+        filename=convex_collision("replica_cad/objects/frl_apartment_book_02.glb"))
     book_02 = builder.build(name='book')
     book_02.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -902,7 +993,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_book_06.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/frl_apartment_book_06.glb")
+        filename=convex_collision("replica_cad/objects/frl_apartment_book_06.glb"))
     book_06 = builder.build(name='book')
     book_06.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -922,7 +1013,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_book_04.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/frl_apartment_book_04.glb")
+        filename=convex_collision("replica_cad/objects/frl_apartment_book_04.glb"))
     book_04 = builder.build(name='book')
     book_04.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -942,7 +1033,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_book_03.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/frl_apartment_book_03.glb")
+        filename=convex_collision("replica_cad/objects/frl_apartment_book_03.glb"))
     book_03 = builder.build(name='book')
     book_03.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -962,7 +1053,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_book_03.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/frl_apartment_book_03.glb")
+        filename=convex_collision("replica_cad/objects/frl_apartment_book_03.glb"))
     book_03 = builder.build(name='book')
     book_03.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -982,7 +1073,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_table_02.glb")
     builder.add_nonconvex_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_table_02_cv_decomp.glb")
+        filename=nonconvex_collision("replica_cad/objects/convex/frl_apartment_table_02_cv_decomp.glb"))
     table_02 = builder.build_static(name='table')
     table_02.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1002,7 +1093,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_bowl_07.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_bowl_07_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_bowl_07_cv_decomp.glb"))
     bowl_07 = builder.build(name='bowl')
     bowl_07.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1022,7 +1113,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_kitchen_utensil_05.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_kitchen_utensil_05_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_kitchen_utensil_05_cv_decomp.glb"))
     kitchen_utensil_05 = builder.build(name='kitchen_utensil')
     kitchen_utensil_05.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1042,7 +1133,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_pan_01.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_pan_01_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_pan_01_cv_decomp.glb"))
     pan_01 = builder.build(name='pan')
     pan_01.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1062,7 +1153,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_kitchen_utensil_01.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_kitchen_utensil_01_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_kitchen_utensil_01_cv_decomp.glb"))
     kitchen_utensil_01 = builder.build(name='kitchen_utensil')
     kitchen_utensil_01.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1082,7 +1173,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_choppingboard_02.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/frl_apartment_choppingboard_02.glb")
+        filename=convex_collision("replica_cad/objects/frl_apartment_choppingboard_02.glb"))
     choppingboard_02 = builder.build(name='chopping_board')
     choppingboard_02.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1102,7 +1193,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_chair_04.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_chair_04_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_chair_04_cv_decomp.glb"))
     chair_04 = builder.build(name='chair')
     chair_04.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1122,7 +1213,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_chair_04.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_chair_04_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_chair_04_cv_decomp.glb"))
     # chair_04 = builder.build(name='chair')
     chair_04 = builder.build_static(name='chair')
     chair_04.set_pose(r2s(sapien.Pose(
@@ -1143,7 +1234,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_mat.glb")
     builder.add_nonconvex_collision_from_file(
-        filename="replica_cad/objects/frl_apartment_mat.glb")
+        filename=nonconvex_collision("replica_cad/objects/frl_apartment_mat.glb"))
     mat = builder.build_static(name='mat')
     mat.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1163,7 +1254,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_indoor_plant_01.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_indoor_plant_01_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_indoor_plant_01_cv_decomp.glb"))
     indoor_plant_01 = builder.build(name='indoor_plant')
     # indoor_plant_01.set_pose(r2s(sapien.Pose(
     #     p=np.array([
@@ -1185,7 +1276,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_table_01.glb")
     builder.add_nonconvex_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_table_01_cv_decomp.glb")
+        filename=nonconvex_collision("replica_cad/objects/convex/frl_apartment_table_01_cv_decomp.glb"))
     table_01 = builder.build_static(name='table')
     table_01.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1205,7 +1296,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_monitor.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_monitor_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_monitor_cv_decomp.glb"))
     monitor = builder.build_static(name='monitor')
     monitor.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1225,7 +1316,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_camera_02.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_camera_02_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_camera_02_cv_decomp.glb"))
     camera_02 = builder.build(name='camera')
     # camera_02.set_pose(r2s(sapien.Pose(
     #     p=np.array([
@@ -1247,7 +1338,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_plate_01.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_plate_01_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_plate_01_cv_decomp.glb"))
     plate_01 = builder.build(name='plate')
     plate_01.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1267,7 +1358,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_cup_03.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_cup_03_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_cup_03_cv_decomp.glb"))
     cup_03 = builder.build(name='cup')
     cup_03.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1287,7 +1378,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_cup_01.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_cup_01_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_cup_01_cv_decomp.glb"))
     cup_01 = builder.build(name='cup')
     cup_01.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1307,7 +1398,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_plate_02.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_plate_02_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_plate_02_cv_decomp.glb"))
     plate_02 = builder.build(name='plate')
     plate_02.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1327,7 +1418,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_bowl_06.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_bowl_06_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_bowl_06_cv_decomp.glb"))
     bowl_06 = builder.build(name='bowl')
     bowl_06.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1347,7 +1438,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_cup_02.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_cup_02_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_cup_02_cv_decomp.glb"))
     cup_02 = builder.build(name='cup')
     cup_02.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1367,7 +1458,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_sponge_dish.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_sponge_dish_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_sponge_dish_cv_decomp.glb"))
     sponge_dish = builder.build(name='kitchen_utensil')
     sponge_dish.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1387,7 +1478,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_kitchen_utensil_02.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_kitchen_utensil_02_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_kitchen_utensil_02_cv_decomp.glb"))
     kitchen_utensil_02 = builder.build(name='kitchen_utensil')
     kitchen_utensil_02.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1407,7 +1498,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_small_appliance_01.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_small_appliance_01_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_small_appliance_01_cv_decomp.glb"))
     small_appliance_01 = builder.build(name='small_appliance')
     small_appliance_01.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1427,7 +1518,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_kitchen_utensil_04.glb")
     builder.add_nonconvex_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_kitchen_utensil_04_cv_decomp.glb")
+        filename=nonconvex_collision("replica_cad/objects/convex/frl_apartment_kitchen_utensil_04_cv_decomp.glb"))
     kitchen_utensil_04 = builder.build_static(name='kitchen_utensil')
     # kitchen_utensil_04.set_pose(r2s(sapien.Pose(
     #     p=np.array([
@@ -1449,7 +1540,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_kitchen_utensil_03.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_kitchen_utensil_03_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_kitchen_utensil_03_cv_decomp.glb"))
     kitchen_utensil_03 = builder.build(name='kitchen_utensil')
     kitchen_utensil_03.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1469,7 +1560,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_kitchen_utensil_03.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_kitchen_utensil_03_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_kitchen_utensil_03_cv_decomp.glb"))
     kitchen_utensil_03 = builder.build(name='kitchen_utensil')
     kitchen_utensil_03.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1489,7 +1580,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_kitchen_utensil_03.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_kitchen_utensil_03_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_kitchen_utensil_03_cv_decomp.glb"))
     kitchen_utensil_03 = builder.build(name='kitchen_utensil')
     kitchen_utensil_03.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1509,7 +1600,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_kitchen_utensil_03.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_kitchen_utensil_03_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_kitchen_utensil_03_cv_decomp.glb"))
     kitchen_utensil_03 = builder.build(name='kitchen_utensil')
     kitchen_utensil_03.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1529,7 +1620,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_kitchen_utensil_03.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_kitchen_utensil_03_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_kitchen_utensil_03_cv_decomp.glb"))
     kitchen_utensil_03 = builder.build(name='kitchen_utensil')
     kitchen_utensil_03.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1549,7 +1640,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_kitchen_utensil_03.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_kitchen_utensil_03_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_kitchen_utensil_03_cv_decomp.glb"))
     kitchen_utensil_03 = builder.build(name='kitchen_utensil')
     kitchen_utensil_03.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1569,7 +1660,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_kitchen_utensil_03.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_kitchen_utensil_03_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_kitchen_utensil_03_cv_decomp.glb"))
     kitchen_utensil_03 = builder.build(name='kitchen_utensil')
     kitchen_utensil_03.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1589,7 +1680,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_kitchen_utensil_03.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_kitchen_utensil_03_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_kitchen_utensil_03_cv_decomp.glb"))
     kitchen_utensil_03 = builder.build(name='kitchen_utensil')
     kitchen_utensil_03.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1609,7 +1700,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_kitchen_utensil_06.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_kitchen_utensil_06_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_kitchen_utensil_06_cv_decomp.glb"))
     kitchen_utensil_06 = builder.build(name='kitchen_utensil')
     kitchen_utensil_06.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1629,7 +1720,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_choppingboard_02.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/frl_apartment_choppingboard_02.glb")
+        filename=convex_collision("replica_cad/objects/frl_apartment_choppingboard_02.glb"))
     choppingboard_02 = builder.build(name='chopping_board')
     choppingboard_02.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1669,7 +1760,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_knifeblock.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/frl_apartment_knifeblock.glb")
+        filename=convex_collision("replica_cad/objects/frl_apartment_knifeblock.glb"))
     knifeblock = builder.build(name='knife_block')
     knifeblock.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1689,7 +1780,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_kitchen_utensil_08.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_kitchen_utensil_08_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_kitchen_utensil_08_cv_decomp.glb"))
     kitchen_utensil_08 = builder.build(name='kitchen_utensil')
     kitchen_utensil_08.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1709,7 +1800,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_kitchen_utensil_09.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_kitchen_utensil_09_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_kitchen_utensil_09_cv_decomp.glb"))
     kitchen_utensil_09 = builder.build(name='kitchen_utensil')
     kitchen_utensil_09.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1729,7 +1820,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_small_appliance_02.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_small_appliance_02_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_small_appliance_02_cv_decomp.glb"))
     small_appliance_02 = builder.build(name='small_appliance')
     small_appliance_02.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1749,7 +1840,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_setupbox.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_setupbox_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_setupbox_cv_decomp.glb"))
     setupbox = builder.build_static(name='tablet')
     setupbox.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1769,7 +1860,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_picture_02.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/frl_apartment_picture_02.glb")
+        filename=convex_collision("replica_cad/objects/frl_apartment_picture_02.glb"))
     picture_02 = builder.build(name='picture')
     picture_02.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1789,7 +1880,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_handbag.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_handbag_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_handbag_cv_decomp.glb"))
     handbag = builder.build(name='handbag')
     handbag.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1809,7 +1900,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_rack_01.glb")
     builder.add_nonconvex_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_rack_01_cv_decomp.glb")
+        filename=nonconvex_collision("replica_cad/objects/convex/frl_apartment_rack_01_cv_decomp.glb"))
     rack_01 = builder.build_static(name='rack')
     rack_01.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1829,7 +1920,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_umbrella.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_umbrella_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_umbrella_cv_decomp.glb"))
     umbrella = builder.build(name='umbrella')
     umbrella.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1849,7 +1940,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_shoe_01.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_shoe_01_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_shoe_01_cv_decomp.glb"))
     shoe_01 = builder.build(name='shoe')
     shoe_01.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1869,7 +1960,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_shoe_02.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_shoe_02_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_shoe_02_cv_decomp.glb"))
     shoe_02 = builder.build(name='shoe')
     shoe_02.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1889,7 +1980,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_shoe_03.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_shoe_03_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_shoe_03_cv_decomp.glb"))
     shoe_03 = builder.build(name='shoe')
     shoe_03.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1909,7 +2000,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_shoe_04.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_shoe_04_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_shoe_04_cv_decomp.glb"))
     shoe_04 = builder.build(name='shoe')
     shoe_04.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1929,7 +2020,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_cloth_02.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_cloth_02_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_cloth_02_cv_decomp.glb"))
     cloth_02 = builder.build_static(name='cloth')
     cloth_02.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1949,7 +2040,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_picture_01.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/frl_apartment_picture_01.glb")
+        filename=convex_collision("replica_cad/objects/frl_apartment_picture_01.glb"))
     picture_01 = builder.build_static(name='picture')
     picture_01.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1969,7 +2060,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_beanbag.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_beanbag_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_beanbag_cv_decomp.glb"))
     beanbag = builder.build(name='beanbag')
     beanbag.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -1989,7 +2080,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_beanbag.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_beanbag_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_beanbag_cv_decomp.glb"))
     beanbag = builder.build(name='beanbag')
     beanbag.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -2029,7 +2120,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_lamp_02.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_lamp_02_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_lamp_02_cv_decomp.glb"))
     lamp_02 = builder.build(name='lamp')
     lamp_02.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -2049,7 +2140,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_lamp_02.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_lamp_02_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_lamp_02_cv_decomp.glb"))
     lamp_02 = builder.build(name='lamp')
     lamp_02.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -2069,7 +2160,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_cloth_01.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_cloth_01_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_cloth_01_cv_decomp.glb"))
     cloth_01 = builder.build_static(name='cloth')
     cloth_01.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -2089,7 +2180,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_cloth_03.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_cloth_03_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_cloth_03_cv_decomp.glb"))
     cloth_03 = builder.build_static(name='cloth')
     cloth_03.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -2109,7 +2200,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_shoebox_01.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_shoebox_01_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_shoebox_01_cv_decomp.glb"))
     shoebox_01 = builder.build(name='box')
     shoebox_01.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -2129,7 +2220,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_monitor_stand.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_monitor_stand_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_monitor_stand_cv_decomp.glb"))
     monitor_stand = builder.build_static(name='monitor')
     monitor_stand.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -2149,7 +2240,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_box.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_box_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_box_cv_decomp.glb"))
     box = builder.build(name='box')
     box.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -2169,7 +2260,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_box.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_box_cv_decomp.glb")
+        filename=convex_collision("replica_cad/objects/convex/frl_apartment_box_cv_decomp.glb"))
     box = builder.build(name='box')
     box.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -2189,7 +2280,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_book_01.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/frl_apartment_book_01.glb")
+        filename=convex_collision("replica_cad/objects/frl_apartment_book_01.glb"))
     book_01 = builder.build(name='book')
     book_01.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -2209,7 +2300,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_book_01.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/frl_apartment_book_01.glb")
+        filename=convex_collision("replica_cad/objects/frl_apartment_book_01.glb"))
     book_01 = builder.build(name='book')
     book_01.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -2229,7 +2320,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_book_01.glb")
     builder.add_collision_from_file(
-        filename="replica_cad/objects/frl_apartment_book_01.glb")
+        filename=convex_collision("replica_cad/objects/frl_apartment_book_01.glb"))
     book_01 = builder.build(name='book')
     book_01.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -2249,7 +2340,7 @@ def build_scene(engine: sapien.Engine):
     builder.add_visual_from_file(
         filename="replica_cad/objects/frl_apartment_tvstand.glb")
     builder.add_nonconvex_collision_from_file(
-        filename="replica_cad/objects/convex/frl_apartment_tvstand_cv_decomp.glb")
+        filename=nonconvex_collision("replica_cad/objects/convex/frl_apartment_tvstand_cv_decomp.glb"))
     tvstand = builder.build_static(name='tv_stand')
     tvstand.set_pose(r2s(sapien.Pose(
         p=np.array([
@@ -2374,7 +2465,11 @@ def build_scene(engine: sapien.Engine):
         ])
     )))
 
-    return scene
+    if recorder is not None:
+        with scope('build_scene/settle'):
+            recorder.finish()
+        return recorder.scene
+    return unwrap_scene(scene)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,555 @@
+import base64
+import copy
+import hashlib
+import json
+import os
+import sys
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import unquote
+
+import sapien.core as sapien
+from sapien.utils import Viewer
+
+import numpy as np
+
+from frl_apt_0 import build_scene
+from mesh_cache import CACHE_DIR, file_digest, get_mesh_cache, resolve
+from mesh_io import (ARRAY_BUFFER, ELEMENT_ARRAY_BUFFER, GlbWriter, iter_mesh_instances, read_accessor,
+                     read_glb, read_glb_json, write_glb, write_stl)
+from scene_wrapper import ActorBuilderWrapper, SceneWrapper, file_argument, name_argument
+
+MERGED_DIR = os.path.join(CACHE_DIR, "merged")
+
+# Parameters of the file shapes that are merged, in positional order
+_PARAMETERS = {
+    'add_collision_from_file': ('filename', 'pose', 'scale', 'material', 'density',
+                                'patch_radius', 'min_patch_radius', 'is_trigger'),
+    'add_multiple_collisions_from_file': ('filename', 'pose', 'scale', 'material', 'density',
+                                          'patch_radius', 'min_patch_radius', 'is_trigger'),
+    'add_nonconvex_collision_from_file': ('filename', 'pose', 'scale', 'material',
+                                          'patch_radius', 'min_patch_radius', 'is_trigger'),
+    'add_visual_from_file': ('filename', 'pose', 'scale', 'material', 'name'),
+}
+
+
+def _pose_index(method: str) -> int:
+    # File and mesh shapes take the pose after the filename or mesh
+    return 1 if method.endswith(('_from_file', '_from_mesh')) else 0
+
+
+def _arguments(method: str, args: tuple, kwargs: dict) -> dict:
+    return dict(zip(_PARAMETERS[method], args), **kwargs)
+
+
+def _transform(pose: sapien.Pose, arguments: dict) -> np.ndarray:
+    """
+    4x4 matrix from the mesh file to the world: the actor pose, the shape
+    pose and the shape scale.
+    """
+    matrix = pose.to_transformation_matrix()
+    if 'pose' in arguments:
+        matrix = matrix @ arguments['pose'].to_transformation_matrix()
+    return matrix @ np.diag(list(arguments.get('scale', (1, 1, 1))) + [1])
+
+
+def _digest(sources: List[Tuple[str, np.ndarray]]) -> str:
+    sha1 = hashlib.sha1()
+    for filename, matrix in sources:
+        sha1.update(file_digest(filename).encode())
+        sha1.update(np.asarray(matrix, dtype=np.float64).tobytes())
+    return sha1.hexdigest()
+
+
+def _draw_calls(filename: str) -> int:
+    """
+    Primitives of a glb file, each of which the renderer draws separately.
+    """
+    gltf = read_glb_json(filename)
+    return sum(len(gltf["meshes"][mesh]["primitives"]) for mesh, _ in iter_mesh_instances(gltf))
+
+
+def _texture_infos(value) -> Iterator[dict]:
+    # Texture references of a material, e.g. its baseColorTexture
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key.endswith('Texture') and isinstance(item, dict) and 'index' in item:
+                yield item
+            else:
+                yield from _texture_infos(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _texture_infos(item)
+
+
+class _VisualMerger:
+    """
+    Collects the triangles of glb visuals, moved into the world, into one
+    primitive per distinct material. Materials that only differ in name, or
+    whose textures hold the same image, count as the same material.
+    """
+
+    def __init__(self):
+        self.primitives: 'OrderedDict[str, list]' = OrderedDict()
+        self.materials: Dict[str, Optional[dict]] = {}
+        self.images: Dict[str, Tuple[bytes, str, Optional[dict]]] = {}
+
+    def _image(self, gltf: dict, binary: bytes, directory: str, index: int) -> str:
+        texture = gltf["textures"][index]
+        image = gltf["images"][texture["source"]]
+        if "bufferView" in image:
+            view = gltf["bufferViews"][image["bufferView"]]
+            offset = view.get("byteOffset", 0)
+            data = binary[offset:offset + view["byteLength"]]
+        elif image["uri"].startswith("data:"):
+            data = base64.b64decode(image["uri"].split(",", 1)[1])
+        else:
+            with open(os.path.join(directory, unquote(image["uri"])), 'rb') as f:
+                data = f.read()
+        mime_type = image.get("mimeType") or ("image/png" if data[:4] == b'\x89PNG' else "image/jpeg")
+        sampler = gltf["samplers"][texture["sampler"]] if "sampler" in texture else None
+        key = hashlib.sha1(data + json.dumps(sampler, sort_keys=True).encode()).hexdigest()
+        self.images.setdefault(key, (data, mime_type, sampler))
+        return key
+
+    def _material(self, gltf: dict, binary: bytes, directory: str, index: Optional[int]) -> str:
+        if index is None:
+            self.materials.setdefault('', None)
+            return ''
+        material = copy.deepcopy(gltf["materials"][index])
+        material.pop("name", None)
+        for info in _texture_infos(material):
+            info["index"] = self._image(gltf, binary, directory, info["index"])
+        key = json.dumps(material, sort_keys=True)
+        self.materials.setdefault(key, material)
+        return key
+
+    def add(self, filename: str, matrix: np.ndarray):
+        """
+        Add every triangle primitive of a glb file, moved by matrix.
+        """
+        gltf, binary = read_glb(filename)
+        directory = os.path.dirname(filename)
+        parts = []
+        for mesh_index, world in iter_mesh_instances(gltf):
+            transform = matrix @ world
+            linear = transform[:3, :3]
+            normal_matrix = np.linalg.inv(linear).T
+            mirrored = np.linalg.det(linear) < 0
+            for primitive in gltf["meshes"][mesh_index]["primitives"]:
+                if primitive.get("mode", 4) != 4:
+                    continue
+                attributes = primitive["attributes"]
+                positions = read_accessor(gltf, binary, attributes["POSITION"]).astype(np.float64)
+                if "indices" in primitive:
+                    triangles = read_accessor(gltf, binary, primitive["indices"]).reshape(-1, 3)
+                else:
+                    triangles = np.arange(len(positions)).reshape(-1, 3)
+                if mirrored:
+                    triangles = triangles[:, ::-1]
+                normals = uvs = None
+                if "NORMAL" in attributes:
+                    normals = read_accessor(gltf, binary, attributes["NORMAL"]) @ normal_matrix.T
+                    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+                    normals = (normals / np.where(lengths > 0, lengths, 1)).astype(np.float32)
+                if "TEXCOORD_0" in attributes:
+                    uvs = read_accessor(gltf, binary, attributes["TEXCOORD_0"]).astype(np.float32)
+                positions = (positions @ linear.T + transform[:3, 3]).astype(np.float32)
+                key = self._material(gltf, binary, directory, primitive.get("material"))
+                parts.append((key, (positions, normals, uvs, triangles.astype(np.uint32))))
+        # Only keep the file once all of it could be read
+        for key, part in parts:
+            self.primitives.setdefault(key, []).append(part)
+
+    def write(self, filename: str, extras: Optional[dict] = None) -> int:
+        """
+        Write the merged primitives as one glb mesh and return their count.
+        """
+        gltf = {"asset": {"version": "2.0", "extras": extras or {}}, "scene": 0, "scenes": [{"nodes": [0]}],
+                "nodes": [{"mesh": 0}], "meshes": [{"primitives": []}]}
+        writer = GlbWriter(gltf)
+        textures: Dict[str, int] = {}
+        for key, parts in self.primitives.items():
+            positions, normals, uvs, triangles = zip(*parts)
+            offsets = np.cumsum([0] + [len(p) for p in positions[:-1]])
+            triangles = np.concatenate([t + np.uint32(o) for t, o in zip(triangles, offsets)])
+            attributes = {"POSITION": writer.accessor(np.concatenate(positions), ARRAY_BUFFER, bounds=True)}
+            # An attribute only some of the parts have is dropped
+            if all(n is not None for n in normals):
+                attributes["NORMAL"] = writer.accessor(np.concatenate(normals), ARRAY_BUFFER)
+            if all(uv is not None for uv in uvs):
+                attributes["TEXCOORD_0"] = writer.accessor(np.concatenate(uvs), ARRAY_BUFFER)
+            primitive = {"attributes": attributes, "mode": 4,
+                         "indices": writer.accessor(triangles.reshape(-1), ELEMENT_ARRAY_BUFFER)}
+
+            material = copy.deepcopy(self.materials[key])
+            if material is not None:
+                for info in _texture_infos(material):
+                    if info["index"] not in textures:
+                        textures[info["index"]] = self._texture(gltf, writer, info["index"])
+                    info["index"] = textures[info["index"]]
+                gltf.setdefault("materials", []).append(material)
+                primitive["material"] = len(gltf["materials"]) - 1
+            gltf["meshes"][0]["primitives"].append(primitive)
+        data = writer.binary()
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        write_glb(filename, gltf, data)
+        return len(self.primitives)
+
+    def _texture(self, gltf: dict, writer: GlbWriter, key: str) -> int:
+        data, mime_type, sampler = self.images[key]
+        gltf.setdefault("images", []).append({"bufferView": writer.view(data), "mimeType": mime_type})
+        texture = {"source": len(gltf["images"]) - 1}
+        if sampler is not None:
+            gltf.setdefault("samplers", []).append(sampler)
+            texture["sampler"] = len(gltf["samplers"]) - 1
+        gltf.setdefault("textures", []).append(texture)
+        return len(gltf["textures"]) - 1
+
+
+class _StaticRecord:
+    """
+    Stand-in returned by build_static while merging. It records the pose the
+    scene builder sets, and the shapes are added to a merged body later.
+    """
+
+    def __init__(self, name: str, calls: List[Tuple[str, tuple, dict]]):
+        self.name = name
+        self.calls = calls
+        self.pose = sapien.Pose()
+
+    def get_name(self) -> str:
+        return self.name
+
+    def set_name(self, name: str):
+        self.name = name
+
+    def get_pose(self) -> sapien.Pose:
+        return self.pose
+
+    def set_pose(self, pose: sapien.Pose):
+        self.pose = pose
+
+
+class _RecordingActorBuilder(ActorBuilderWrapper):
+    """
+    Records every call of the scene builder without creating an engine-side
+    builder. Statics become _StaticRecords; any other actor is built by
+    replaying the calls on a real builder.
+    """
+
+    def __init__(self, merger: 'StaticMerger'):
+        super().__init__(None, merger)
+        self._calls: List[Tuple[str, tuple, dict]] = []
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            self.add(name, args, kwargs)
+            return self
+        return call
+
+    def add(self, method: str, args: tuple, kwargs: dict):
+        self._calls.append((method, args, kwargs))
+
+    def build_actor(self, method: str, args: tuple, kwargs: dict) -> sapien.ActorBase:
+        if method == 'build_static':
+            record = _StaticRecord(name_argument(args, kwargs), self._calls)
+            self._owner.records.append(record)
+            return record
+        builder = self._owner.scene.create_actor_builder()
+        for name, call_args, call_kwargs in self._calls:
+            getattr(builder, name)(*call_args, **call_kwargs)
+        return getattr(builder, method)(*args, **kwargs)
+
+
+class _MergingScene(SceneWrapper):
+    def create_actor_builder(self) -> _RecordingActorBuilder:
+        return _RecordingActorBuilder(self._owner)
+
+
+@dataclass
+class MergeStats:
+    """
+    Collision shapes and draw calls of the static actors before and after
+    merging. Each glb primitive and each primitive visual is one draw call.
+    """
+    shapes_before: int = 0
+    shapes_after: int = 0
+    draw_calls_before: int = 0
+    draw_calls_after: int = 0
+
+
+@dataclass
+class MergedStatics:
+    """
+    Merged static bodies and the lookup from their collision shapes and
+    visual bodies back to the names of the actors they replaced.
+    """
+    actors: List[sapien.ActorStatic] = field(default_factory=list)
+    # Collision shapes of the merged actors, kept alive so the shapes
+    # reported by contacts are these same objects
+    shapes: Dict[sapien.CollisionShape, str] = field(default_factory=dict)
+    visual_names: Dict[int, str] = field(default_factory=dict)
+    groups: Dict[str, List[str]] = field(default_factory=dict)
+    stats: MergeStats = field(default_factory=MergeStats)
+
+    def name_of(self, shape: sapien.CollisionShape) -> Optional[str]:
+        """
+        Original actor name of a collision shape, e.g. from
+        Contact.collision_shape0.
+        """
+        return self.shapes.get(shape)
+
+    def contact_names(self, contact: sapien.Contact) -> Tuple[str, str]:
+        """
+        Names of the two bodies in a contact, with merged shapes resolved to
+        their original actors.
+        """
+        return (self.name_of(contact.collision_shape0) or contact.actor0.get_name(),
+                self.name_of(contact.collision_shape1) or contact.actor1.get_name())
+
+    def visual_name(self, visual_id: int) -> Optional[str]:
+        """
+        Original actor name of a visual id from a segmentation image.
+        """
+        return self.visual_names.get(visual_id)
+
+
+class StaticMerger:
+    """
+    Merges the static actors of a scene builder into a few static bodies.
+
+    The builder is given a wrapped scene whose actor builders only record
+    their calls, and whose build_static returns a stand-in instead of an
+    actor. finish() then builds one static body per group of statics, all
+    of them or, with cell_size, those whose origin is in the same floor
+    cell, roughly one per room, so the broadphase sees one entry per
+    group. Within a group, every original actor keeps its own shapes,
+    named after it, so contacts and segmentation ids map back to it
+    exactly:
+
+    - an actor's mesh collision shapes, moved by its pose, are concatenated
+      into one nonconvex triangle mesh per physical material. Convex shapes
+      contribute the hull SAPIEN cooked for them if there is one, otherwise
+      their source triangles. An actor with a single mesh shape keeps it as
+      it is;
+    - an actor's glb visuals are concatenated into one visual body with one
+      primitive per material;
+    - primitive shapes, trigger shapes and visuals with a material override
+      are added one by one, as before.
+
+    Merged meshes are written to MERGED_DIR keyed by their sources and
+    poses, so later builds of the same layout reuse them.
+    """
+
+    def __init__(self, scene: sapien.Scene, cell_size: Optional[float] = None,
+                 merged_dir: str = MERGED_DIR):
+        self.scene = scene
+        self.cell_size = cell_size
+        self.merged_dir = merged_dir
+        self.records: List[_StaticRecord] = []
+
+    def wrap(self) -> _MergingScene:
+        return _MergingScene(self.scene, self)
+
+    def _group_key(self, record: _StaticRecord) -> tuple:
+        if self.cell_size is None:
+            return ()
+        return tuple(np.floor(record.pose.p[:2] / self.cell_size).astype(int))
+
+    @staticmethod
+    def _shape_count(method: str, args: tuple, kwargs: dict) -> int:
+        if method != 'add_multiple_collisions_from_file':
+            return 1
+        return get_mesh_cache().get(file_argument(args, kwargs)).num_parts
+
+    @staticmethod
+    def _collision_source(method: str, filename: str) -> str:
+        hull = filename + ".convex.stl"
+        if method == 'add_collision_from_file' and os.path.exists(hull):
+            return hull
+        return resolve(filename)
+
+    def _add(self, builder: sapien.ActorBuilder, record: _StaticRecord, method: str,
+             args: tuple, kwargs: dict):
+        args, kwargs = list(args), dict(kwargs)
+        index = _pose_index(method)
+        if 'pose' in kwargs:
+            kwargs['pose'] = record.pose * kwargs['pose']
+        elif len(args) > index:
+            args[index] = record.pose * args[index]
+        else:
+            kwargs['pose'] = record.pose
+        if 'visual' in method and not kwargs.get('name') and len(args) <= index + 3:
+            kwargs['name'] = record.name
+        getattr(builder, method)(*args, **kwargs)
+
+    def _merge_collisions(self, builder: sapien.ActorBuilder, sources: List[Tuple[str, np.ndarray]], material):
+        target = os.path.join(self.merged_dir, _digest(sources) + ".stl")
+        if not os.path.exists(target):
+            vertices, triangles, count = [], [], 0
+            for filename, matrix in sources:
+                mesh = get_mesh_cache().load(filename)
+                vertices.append(mesh.vertices @ matrix[:3, :3].T + matrix[:3, 3])
+                triangles.append(mesh.global_triangles() + np.uint32(count))
+                count += len(mesh.vertices)
+            os.makedirs(self.merged_dir, exist_ok=True)
+            write_stl(target, np.concatenate(vertices), np.concatenate(triangles))
+        builder.add_nonconvex_collision_from_file(target, material=material)
+
+    def _merge_visuals(self, builder: sapien.ActorBuilder, sources: List[Tuple[str, np.ndarray]],
+                       name: str) -> Tuple[int, List[int]]:
+        """
+        Add the merged visual of sources and return its draw calls and the
+        indices of the sources that could not be merged, which the merged
+        glb keeps in its asset extras.
+        """
+        target = os.path.join(self.merged_dir, _digest(sources) + ".glb")
+        if not os.path.exists(target):
+            merger = _VisualMerger()
+            unmerged = []
+            for index, (filename, matrix) in enumerate(sources):
+                try:
+                    merger.add(filename, matrix)
+                except (KeyError, ValueError, OSError, NotImplementedError):
+                    unmerged.append(index)
+            if not merger.primitives:
+                return 0, unmerged
+            merger.write(target, {"unmerged": unmerged})
+        builder.add_visual_from_file(target, name=name)
+        gltf = read_glb_json(target)
+        return len(gltf["meshes"][0]["primitives"]), gltf["asset"]["extras"]["unmerged"]
+
+    @staticmethod
+    def _draw_calls(method: str, args: tuple, kwargs: dict) -> int:
+        filename = file_argument(args, kwargs) if method == 'add_visual_from_file' else ''
+        return _draw_calls(filename) if filename.lower().endswith('.glb') else 1
+
+    def _build_record(self, builder: sapien.ActorBuilder, record: _StaticRecord, stats: MergeStats,
+                      shape_names: List[str], visual_names: List[str]):
+        """
+        Add the shapes of one original actor, appending its name once for
+        every collision shape and visual body added.
+        """
+        meshes: 'OrderedDict[int, tuple]' = OrderedDict()
+        visuals: List[Tuple[str, np.ndarray, tuple]] = []
+
+        def add(method: str, args: tuple, kwargs: dict):
+            self._add(builder, record, method, args, kwargs)
+            if 'collision' in method:
+                shape_names.extend([record.name] * self._shape_count(method, args, kwargs))
+            elif 'visual' in method:
+                visual_names.append(record.name)
+                stats.draw_calls_after += self._draw_calls(method, args, kwargs)
+
+        for method, args, kwargs in record.calls:
+            if 'collision' in method:
+                stats.shapes_before += self._shape_count(method, args, kwargs)
+            elif 'visual' in method:
+                stats.draw_calls_before += self._draw_calls(method, args, kwargs)
+
+            arguments = _arguments(method, args, kwargs) if method in _PARAMETERS else {}
+            if 'collision' in method and arguments and not arguments.get('is_trigger', False):
+                material = arguments.get('material')
+                meshes.setdefault(id(material), (material, []))[1].append((
+                    self._collision_source(method, arguments['filename']),
+                    _transform(record.pose, arguments), (method, args, kwargs)))
+            elif method == 'add_visual_from_file' and arguments.get('material') is None \
+                    and arguments['filename'].lower().endswith('.glb'):
+                visuals.append((resolve(arguments['filename']), _transform(record.pose, arguments),
+                                (method, args, kwargs)))
+            else:
+                add(method, args, kwargs)
+
+        for material, sources in meshes.values():
+            if len(sources) == 1:
+                add(*sources[0][2])
+            else:
+                self._merge_collisions(builder, [(filename, matrix) for filename, matrix, _ in sources], material)
+                shape_names.append(record.name)
+
+        if len(visuals) == 1:
+            add(*visuals[0][2])
+        elif visuals:
+            draw_calls, unmerged = self._merge_visuals(
+                builder, [(filename, matrix) for filename, matrix, _ in visuals], record.name)
+            if draw_calls:
+                visual_names.append(record.name)
+                stats.draw_calls_after += draw_calls
+            for index in unmerged:
+                add(*visuals[index][2])
+
+    def _build_group(self, name: str, records: List[_StaticRecord], merged: MergedStatics) -> sapien.ActorStatic:
+        builder = self.scene.create_actor_builder()
+        shape_names: List[str] = []
+        visual_names: List[str] = []
+        for record in records:
+            self._build_record(builder, record, merged.stats, shape_names, visual_names)
+
+        actor = builder.build_static(name=name)
+        shapes = actor.get_collision_shapes()
+        merged.stats.shapes_after += len(shapes)
+        if len(shapes) == len(shape_names):
+            merged.shapes.update(zip(shapes, shape_names))
+        bodies = actor.get_visual_bodies()
+        if len(bodies) == len(visual_names):
+            merged.visual_names.update((body.get_visual_id(), actor_name) for body, actor_name in zip(bodies, visual_names))
+        return actor
+
+    def finish(self) -> MergedStatics:
+        groups: 'OrderedDict[tuple, List[_StaticRecord]]' = OrderedDict()
+        for record in self.records:
+            groups.setdefault(self._group_key(record), []).append(record)
+
+        merged = MergedStatics()
+        for index, records in enumerate(groups.values()):
+            name = "static_{}".format(index)
+            actor = self._build_group(name, records, merged)
+            merged.actors.append(actor)
+            merged.groups[name] = [record.name for record in records]
+        self.records = []
+        return merged
+
+
+def build_merged(engine: sapien.Engine, build: Callable[..., sapien.Scene] = build_scene,
+                 cell_size: Optional[float] = None) -> Tuple[sapien.Scene, MergedStatics]:
+    """
+    Build a scene with its static actors merged. build is called as
+    build(engine, scene=...), like build_scene and build_layout.
+    """
+    scene = engine.create_scene()
+    scene.set_timestep(1 / 100.0)
+    merger = StaticMerger(scene, cell_size)
+    build(engine, scene=merger.wrap())
+    return scene, merger.finish()
+
+
+if __name__ == '__main__':
+    # Usage: python merge_static.py [cell_size]
+    cell_size = float(sys.argv[1]) if len(sys.argv) > 1 else None
+
+    # Set up engine and renderer
+    engine = sapien.Engine()
+    renderer = sapien.SapienRenderer()
+    engine.set_renderer(renderer)
+
+    scene, merged = build_merged(engine, cell_size=cell_size)
+    for name, members in merged.groups.items():
+        print("{}: {}".format(name, ", ".join(members)))
+    stats = merged.stats
+    print("Collision shapes: {} -> {}, draw calls: {} -> {}".format(
+        stats.shapes_before, stats.shapes_after, stats.draw_calls_before, stats.draw_calls_after))
+
+    # Viewer
+    viewer = Viewer(renderer, resolutions=(1920, 1080))
+    viewer.set_scene(scene)
+    viewer.set_camera_xyz(x=-2.0, y=0, z=1.5)
+
+    while not viewer.closed:
+        scene.step()
+        scene.update_render()
+        viewer.render()
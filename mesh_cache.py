@@ -0,0 +1,276 @@
+import hashlib
+import os
+import struct
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from mesh_io import load_mesh_parts
+from profiling import scope
+
+DEFAULT_BUDGET = int(os.environ.get("REPLICA_CAD_MESH_CACHE_MB", 1024)) << 20
+CACHE_DIR = os.environ.get(
+    "REPLICA_CAD_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "replica_cad"))
+# Written by mesh_store.py and mapped by every process that finds it
+MESH_STORE_PATH = os.environ.get("REPLICA_CAD_MESH_STORE", os.path.join(CACHE_DIR, "meshes.store"))
+
+
+@dataclass
+class MeshData:
+    """
+    Decoded triangle geometry of one mesh file. Parts are stored back to back;
+    part i owns vertices[part_offsets[i]:part_offsets[i + 1]].
+    """
+    filename: str
+    vertices: np.ndarray
+    triangles: np.ndarray
+    part_offsets: np.ndarray
+    triangle_offsets: np.ndarray
+
+    @classmethod
+    def from_parts(cls, filename: str, parts: List[Tuple[np.ndarray, np.ndarray]]) -> 'MeshData':
+        vertex_counts = [len(v) for v, _ in parts]
+        part_offsets = np.concatenate([[0], np.cumsum(vertex_counts)]).astype(np.int64)
+        triangle_offsets = np.concatenate(
+            [[0], np.cumsum([len(t) for _, t in parts])]).astype(np.int64)
+        if parts:
+            vertices = np.concatenate([v for v, _ in parts]).astype(np.float32)
+            # Triangles keep part-local vertex indices
+            triangles = np.concatenate([t for _, t in parts]).astype(np.uint32)
+        else:
+            vertices = np.zeros((0, 3), dtype=np.float32)
+            triangles = np.zeros((0, 3), dtype=np.uint32)
+        return cls(filename, vertices, triangles, part_offsets, triangle_offsets)
+
+    @property
+    def num_parts(self) -> int:
+        return len(self.part_offsets) - 1
+
+    def part(self, index: int) -> Tuple[np.ndarray, np.ndarray]:
+        v0, v1 = self.part_offsets[index], self.part_offsets[index + 1]
+        t0, t1 = self.triangle_offsets[index], self.triangle_offsets[index + 1]
+        return self.vertices[v0:v1], self.triangles[t0:t1]
+
+    def global_triangles(self) -> np.ndarray:
+        """
+        Triangles indexing into the concatenated vertex array.
+        """
+        counts = np.diff(self.triangle_offsets)
+        return self.triangles + np.repeat(self.part_offsets[:-1], counts)[:, None].astype(np.uint32)
+
+    @property
+    def bounds(self) -> np.ndarray:
+        if len(self.vertices) == 0:
+            return np.zeros((2, 3), dtype=np.float32)
+        return np.stack([self.vertices.min(0), self.vertices.max(0)])
+
+    @property
+    def nbytes(self) -> int:
+        return (self.vertices.nbytes + self.triangles.nbytes
+                + self.part_offsets.nbytes + self.triangle_offsets.nbytes)
+
+
+def resolve(filename: str) -> str:
+    """
+    Canonical absolute path of an asset. SAPIEN keeps loaded meshes in
+    per-engine registries keyed by path, so passing the same string to every
+    builder lets all actors and scenes of an engine share one engine-side copy.
+    """
+    return os.path.realpath(filename)
+
+
+_digests: Dict[Tuple[str, int, int], str] = {}
+
+
+def file_digest(filename: str) -> str:
+    """
+    SHA-1 of a file's contents, memoized per process by path, mtime and size.
+    """
+    path = resolve(filename)
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    digest = _digests.get(key)
+    if digest is None:
+        sha1 = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha1.update(block)
+        digest = _digests[key] = sha1.hexdigest()
+    return digest
+
+
+class MeshCache:
+    """
+    Thread-safe LRU cache of decoded meshes bounded by a memory budget in bytes.
+    Entries are keyed by canonical path and revalidated against the file's
+    modification time and size.
+
+    The cache serves Python-side geometry work that reads the same meshes
+    repeatedly: LOD simplification, proxy fitting and static merging.
+    SAPIEN decodes its own copy of every file a builder names, so scene
+    builds do not fill it; they use load() and bounds(), which never add
+    entries.
+
+    With a backing store (see mesh_store.py), meshes it holds are returned
+    as views into its shared memory map and never enter the cache, so they
+    cost this process no private memory.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_BUDGET):
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[str, Tuple[Tuple[int, int], MeshData]]' = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.store = None
+        self.store_hits = 0
+        self._bounds: Dict[Tuple[str, int, int], np.ndarray] = {}
+
+    @staticmethod
+    def _stamp(path: str) -> Tuple[int, int]:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _lookup(self, path: str, stamp: Tuple[int, int]) -> Optional[MeshData]:
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+            if self.store is not None:
+                mesh = self.store.get(path, stamp)
+                if mesh is not None:
+                    self.store_hits += 1
+                    return mesh
+            self.misses += 1
+        return None
+
+    @staticmethod
+    def _decode(path: str) -> MeshData:
+        with scope('mesh/decode', {'file': os.path.basename(path)}):
+            return MeshData.from_parts(path, load_mesh_parts(path))
+
+    def get(self, filename: str) -> MeshData:
+        path = resolve(filename)
+        stamp = self._stamp(path)
+        mesh = self._lookup(path, stamp)
+        if mesh is None:
+            # Decode outside the lock so several threads can load different files
+            mesh = self._decode(path)
+            self.put(path, mesh, stamp)
+        return mesh
+
+    def load(self, filename: str) -> MeshData:
+        """
+        Like get(), but a mesh that is not cached is decoded without being
+        added, for one-off readers such as collision cooking.
+        """
+        path = resolve(filename)
+        mesh = self._lookup(path, self._stamp(path))
+        return self._decode(path) if mesh is None else mesh
+
+    def bounds(self, filename: str) -> np.ndarray:
+        """
+        Axis-aligned (lower, upper) bounds of a mesh, memoized by path,
+        modification time and size, so fitting a box to a mesh does not keep
+        the mesh in memory.
+        """
+        path = resolve(filename)
+        key = (path,) + self._stamp(path)
+        bounds = self._bounds.get(key)
+        if bounds is None:
+            bounds = self._bounds[key] = self.load(path).bounds
+        return bounds
+
+    def put(self, filename: str, mesh: MeshData, stamp: Optional[Tuple[int, int]] = None):
+        path = resolve(filename)
+        if stamp is None:
+            stamp = self._stamp(path)
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self._nbytes -= old[1].nbytes
+            self._entries[path] = (stamp, mesh)
+            self._nbytes += mesh.nbytes
+            self._evict()
+
+    def _evict(self):
+        # The newest entry always stays, even if it alone exceeds the budget
+        while self._nbytes > self.max_bytes and len(self._entries) > 1:
+            _, (_, mesh) = self._entries.popitem(last=False)
+            self._nbytes -= mesh.nbytes
+            self.evictions += 1
+
+    def __contains__(self, filename: str) -> bool:
+        """
+        Whether get() would return filename without decoding it, i.e. it is
+        cached or in the store with its current modification time and size.
+        """
+        path = resolve(filename)
+        try:
+            stamp = self._stamp(path)
+        except OSError:
+            return False
+        if self.store is not None and path in self.store:
+            return True
+        with self._lock:
+            entry = self._entries.get(path)
+            return entry is not None and entry[0] == stamp
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    def set_store(self, store):
+        self.store = store
+
+    def set_budget(self, max_bytes: int):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._nbytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "store_hits": self.store_hits,
+        }
+
+
+_mesh_cache = MeshCache()
+
+
+def get_mesh_cache() -> MeshCache:
+    """
+    The process-wide cache shared by every module of this process.
+    """
+    return _mesh_cache
+
+
+if os.path.exists(MESH_STORE_PATH):
+    # Imported here since mesh_store builds on the classes above
+    from mesh_store import MeshStore
+    try:
+        _mesh_cache.set_store(MeshStore(MESH_STORE_PATH))
+    except (OSError, ValueError, struct.error) as e:
+        # A truncated or foreign store must not break every import of this module
+        print("Not using mesh store {}: {}".format(MESH_STORE_PATH, e), file=sys.stderr)
@@ -0,0 +1,288 @@
+import copy
+import json
+import os
+import struct
+import threading
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+_GLB_MAGIC = b'glTF'
+_CHUNK_JSON = 0x4E4F534A
+_CHUNK_BIN = 0x004E4942
+
+_COMPONENT_TYPES = {
+    5120: np.int8,
+    5121: np.uint8,
+    5122: np.int16,
+    5123: np.uint16,
+    5125: np.uint32,
+    5126: np.float32,
+}
+_COMPONENT_CODES = {np.dtype(dtype): code for code, dtype in _COMPONENT_TYPES.items()}
+_TYPE_SIZES = {"SCALAR": 1, "VEC2": 2, "VEC3": 3, "VEC4": 4, "MAT3": 9, "MAT4": 16}
+_ACCESSOR_TYPES = {1: "SCALAR", 2: "VEC2", 3: "VEC3", 4: "VEC4"}
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+
+
+def read_glb(filename: str) -> Tuple[dict, bytes]:
+    """
+    Split a binary glTF file into its JSON document and BIN chunk.
+    """
+    with open(filename, 'rb') as f:
+        data = f.read()
+    magic, _, length = struct.unpack_from('<4sII', data, 0)
+    if magic != _GLB_MAGIC:
+        raise ValueError("{} is not a binary glTF file".format(filename))
+    gltf, binary = None, b''
+    offset = 12
+    while offset < length:
+        chunk_length, chunk_type = struct.unpack_from('<II', data, offset)
+        chunk = data[offset + 8:offset + 8 + chunk_length]
+        if chunk_type == _CHUNK_JSON:
+            gltf = json.loads(chunk)
+        elif chunk_type == _CHUNK_BIN:
+            binary = chunk
+        offset += 8 + chunk_length
+    return gltf, binary
+
+
+def read_glb_json(filename: str) -> dict:
+    """
+    The JSON document of a binary glTF file, without reading its BIN chunk.
+    """
+    with open(filename, 'rb') as f:
+        magic, _, _, length, chunk_type = struct.unpack('<4sIIII', f.read(20))
+        if magic != _GLB_MAGIC or chunk_type != _CHUNK_JSON:
+            raise ValueError("{} is not a binary glTF file".format(filename))
+        return json.loads(f.read(length))
+
+
+def read_accessor(gltf: dict, binary: bytes, index: int) -> np.ndarray:
+    accessor = gltf["accessors"][index]
+    if "sparse" in accessor:
+        raise NotImplementedError("Sparse glTF accessors are not supported")
+    dtype = np.dtype(_COMPONENT_TYPES[accessor["componentType"]])
+    width = _TYPE_SIZES[accessor["type"]]
+    count = accessor["count"]
+    view = gltf["bufferViews"][accessor["bufferView"]]
+    offset = view.get("byteOffset", 0) + accessor.get("byteOffset", 0)
+    stride = view.get("byteStride", 0)
+    if stride and stride != dtype.itemsize * width:
+        array = np.ndarray((count, width), dtype=dtype, buffer=binary,
+                           offset=offset, strides=(stride, dtype.itemsize)).copy()
+    else:
+        array = np.frombuffer(binary, dtype=dtype, count=count * width,
+                              offset=offset).reshape(count, width)
+    if accessor.get("normalized", False):
+        array = array.astype(np.float32) / np.iinfo(dtype).max
+    return array
+
+
+class GlbWriter:
+    """
+    Builds the BIN chunk of a glTF document. Every view() and accessor()
+    appends a buffer view or accessor to gltf, whose own accessors and
+    buffer views are dropped.
+    """
+
+    def __init__(self, gltf: dict):
+        self.gltf = gltf
+        self.gltf["accessors"] = []
+        self.gltf["bufferViews"] = []
+        self.chunks: List[bytes] = []
+        self.length = 0
+
+    def view(self, data: bytes, target: Optional[int] = None) -> int:
+        padding = -self.length % 4
+        self.chunks.append(b'\0' * padding)
+        self.length += padding
+        view = {"buffer": 0, "byteOffset": self.length, "byteLength": len(data)}
+        if target is not None:
+            view["target"] = target
+        self.gltf["bufferViews"].append(view)
+        self.chunks.append(data)
+        self.length += len(data)
+        return len(self.gltf["bufferViews"]) - 1
+
+    def accessor(self, array: np.ndarray, target: int, bounds: bool = False) -> int:
+        array = np.ascontiguousarray(array)
+        accessor = {
+            "bufferView": self.view(array.tobytes(), target),
+            "componentType": _COMPONENT_CODES[array.dtype],
+            "count": len(array),
+            "type": _ACCESSOR_TYPES[1 if array.ndim == 1 else array.shape[1]],
+        }
+        if bounds:
+            accessor["min"] = array.min(0).tolist()
+            accessor["max"] = array.max(0).tolist()
+        self.gltf["accessors"].append(accessor)
+        return len(self.gltf["accessors"]) - 1
+
+    def copy_accessor(self, gltf: dict, binary: bytes, index: int) -> int:
+        """
+        Copy an accessor of another document, with its data, as it is.
+        """
+        accessor = copy.deepcopy(gltf["accessors"][index])
+        if "sparse" in accessor:
+            raise NotImplementedError("Sparse glTF accessors are not supported")
+        if "bufferView" in accessor:
+            view = gltf["bufferViews"][accessor["bufferView"]]
+            size = np.dtype(_COMPONENT_TYPES[accessor["componentType"]]).itemsize * _TYPE_SIZES[accessor["type"]]
+            offset = view.get("byteOffset", 0) + accessor.pop("byteOffset", 0)
+            stride = view.get("byteStride", 0) or size
+            data = np.ndarray((accessor["count"], size), dtype=np.uint8, buffer=binary,
+                              offset=offset, strides=(stride, 1))
+            accessor["bufferView"] = self.view(data.tobytes(), view.get("target"))
+        self.gltf["accessors"].append(accessor)
+        return len(self.gltf["accessors"]) - 1
+
+    def binary(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.gltf["buffers"] = [{"byteLength": len(data)}]
+        return data
+
+
+def _quat_to_matrix(q) -> np.ndarray:
+    # glTF stores quaternions as (x, y, z, w)
+    x, y, z, w = q
+    return np.array([
+        [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+        [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+        [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)],
+    ])
+
+
+def _node_matrix(node: dict) -> np.ndarray:
+    if "matrix" in node:
+        return np.array(node["matrix"], dtype=float).reshape(4, 4).T
+    mat44 = np.eye(4)
+    mat44[:3, :3] = _quat_to_matrix(node.get("rotation", [0, 0, 0, 1])) * \
+        np.array(node.get("scale", [1, 1, 1]))
+    mat44[:3, 3] = node.get("translation", [0, 0, 0])
+    return mat44
+
+
+def iter_mesh_instances(gltf: dict) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Yield (mesh index, world transform) for every mesh node in the default scene.
+    """
+    nodes = gltf.get("nodes", [])
+    if "scenes" in gltf:
+        roots = gltf["scenes"][gltf.get("scene", 0)]["nodes"]
+    else:
+        children = {c for node in nodes for c in node.get("children", [])}
+        roots = [i for i in range(len(nodes)) if i not in children]
+    stack = [(i, np.eye(4)) for i in roots]
+    while stack:
+        index, parent = stack.pop()
+        node = nodes[index]
+        world = parent @ _node_matrix(node)
+        if "mesh" in node:
+            yield node["mesh"], world
+        stack.extend((c, world) for c in node.get("children", []))
+
+
+def load_glb_parts(filename: str) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Decode the triangle geometry of a glb file, with node transforms applied.
+    Every mesh instance becomes one (vertices, triangles) part, which keeps the
+    pieces of a convex decomposition apart.
+    """
+    gltf, binary = read_glb(filename)
+    parts = []
+    for mesh_index, world in iter_mesh_instances(gltf):
+        vertices, triangles = [], []
+        count = 0
+        for primitive in gltf["meshes"][mesh_index]["primitives"]:
+            if primitive.get("mode", 4) != 4:
+                continue
+            positions = read_accessor(gltf, binary, primitive["attributes"]["POSITION"])
+            if "indices" in primitive:
+                indices = read_accessor(gltf, binary, primitive["indices"]).reshape(-1, 3)
+            else:
+                indices = np.arange(len(positions)).reshape(-1, 3)
+            vertices.append(positions @ world[:3, :3].T + world[:3, 3])
+            triangles.append(indices.astype(np.uint32) + count)
+            count += len(positions)
+        if vertices:
+            parts.append((np.concatenate(vertices).astype(np.float32),
+                          np.concatenate(triangles)))
+    return parts
+
+
+def load_stl(filename: str) -> Tuple[np.ndarray, np.ndarray]:
+    with open(filename, 'rb') as f:
+        data = f.read()
+    if data[:5] == b'solid' and b'facet' in data[:1024]:
+        tokens = data.split()
+        vertices = np.array([
+            [float(tokens[i + 1]), float(tokens[i + 2]), float(tokens[i + 3])]
+            for i, token in enumerate(tokens) if token == b'vertex'
+        ], dtype=np.float32).reshape(-1, 3)
+    else:
+        count = struct.unpack_from('<I', data, 80)[0]
+        records = np.frombuffer(data, dtype=np.dtype([
+            ('normal', '<f4', 3), ('vertices', '<f4', (3, 3)), ('attr', '<u2')
+        ]), count=count, offset=84)
+        vertices = records['vertices'].reshape(-1, 3).astype(np.float32)
+    return vertices, np.arange(len(vertices), dtype=np.uint32).reshape(-1, 3)
+
+
+def temporary_path(path: str) -> str:
+    """
+    Name to write path under before renaming it into place. It is unique per
+    process and thread, since cache entries are written from thread pools.
+    """
+    return "{}.tmp{}-{}".format(path, os.getpid(), threading.get_ident())
+
+
+def write_stl(filename: str, vertices: np.ndarray, triangles: np.ndarray):
+    """
+    Write a binary STL file, the format SAPIEN reads for cooked .convex.stl files.
+    """
+    corners = np.asarray(vertices, dtype=np.float32)[np.asarray(triangles).reshape(-1)]
+    corners = corners.reshape(-1, 3, 3)
+    normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    normals = normals / np.where(lengths > 0, lengths, 1)
+    records = np.zeros(len(corners), dtype=np.dtype([
+        ('normal', '<f4', 3), ('vertices', '<f4', (3, 3)), ('attr', '<u2')
+    ]))
+    records['normal'] = normals
+    records['vertices'] = corners
+    tmp = temporary_path(filename)
+    with open(tmp, 'wb') as f:
+        f.write(b'\0' * 80)
+        f.write(struct.pack('<I', len(records)))
+        f.write(records.tobytes())
+    os.replace(tmp, filename)
+
+
+def load_mesh_parts(filename: str) -> List[Tuple[np.ndarray, np.ndarray]]:
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == '.glb':
+        return load_glb_parts(filename)
+    if ext == '.stl':
+        return [load_stl(filename)]
+    raise ValueError("Unsupported mesh format: {}".format(filename))
+
+
+def write_glb(filename: str, gltf: dict, binary: bytes):
+    """
+    Write a glTF document and its BIN chunk as a binary glTF file.
+    """
+    document = json.dumps(gltf, separators=(',', ':')).encode()
+    document += b' ' * (-len(document) % 4)
+    binary += b'\0' * (-len(binary) % 4)
+    length = 12 + 8 + len(document) + (8 + len(binary) if binary else 0)
+    tmp = temporary_path(filename)
+    with open(tmp, 'wb') as f:
+        f.write(struct.pack('<4sII', _GLB_MAGIC, 2, length))
+        f.write(struct.pack('<II', len(document), _CHUNK_JSON))
+        f.write(document)
+        if binary:
+            f.write(struct.pack('<II', len(binary), _CHUNK_BIN))
+            f.write(binary)
+    os.replace(tmp, filename)
@@ -0,0 +1,167 @@
+import glob
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from mesh_cache import MESH_STORE_PATH, MeshData, get_mesh_cache, resolve
+from mesh_io import load_mesh_parts
+
+_MAGIC = b'SAPMSH01'
+# Offset and size of the JSON index, magic
+_TRAILER = struct.Struct('<QQ8s')
+_ALIGN = 64
+_DECODABLE = ('.glb', '.stl')
+_FIELDS = (('vertices', np.float32, 3), ('triangles', np.uint32, 3),
+           ('part_offsets', np.int64, 0), ('triangle_offsets', np.int64, 0))
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+ASSET_DIRS = [os.path.join(ROOT_DIR, name) for name in ("replica_cad", "sapien_robot", "maniskill_robot")]
+
+
+def asset_meshes(dirs: List[str] = ASSET_DIRS) -> List[str]:
+    """
+    Every mesh file under dirs the Python-side decoder can read.
+    """
+    files = []
+    for directory in dirs:
+        for path in glob.glob(os.path.join(directory, "**", "*"), recursive=True):
+            if path.lower().endswith(_DECODABLE) and os.path.isfile(path):
+                files.append(resolve(path))
+    return sorted(set(files))
+
+
+class MeshStore:
+    """
+    Read-only memory map of decoded meshes. Every process that opens the
+    same store shares its pages through the OS page cache, so the buffers
+    exist once per machine no matter how many workers use them.
+
+    Entries are keyed by canonical path and only returned while the source
+    file still has the modification time and size it had when the store
+    was written.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        index_offset, index_size, magic = _TRAILER.unpack_from(self._map, len(self._map) - _TRAILER.size)
+        if magic != _MAGIC or self._map[:len(_MAGIC)] != _MAGIC:
+            raise ValueError("{} is not a mesh store".format(path))
+        self.index: Dict[str, list] = json.loads(self._map[index_offset:index_offset + index_size].decode())
+        self.hits = 0
+
+    def __contains__(self, filename: str) -> bool:
+        try:
+            return self._entry(resolve(filename)) is not None
+        except OSError:
+            return False
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def _entry(self, path: str, stamp: Optional[Tuple[int, int]] = None) -> Optional[list]:
+        entry = self.index.get(path)
+        if entry is None:
+            return None
+        if stamp is None:
+            stat = os.stat(path)
+            stamp = stat.st_mtime_ns, stat.st_size
+        return entry if tuple(entry[0]) == tuple(stamp) else None
+
+    def get(self, filename: str, stamp: Optional[Tuple[int, int]] = None) -> Optional[MeshData]:
+        """
+        The mesh of filename as views into the map, or None if the store
+        has no current entry for it.
+        """
+        path = resolve(filename)
+        entry = self._entry(path, stamp)
+        if entry is None:
+            return None
+        arrays = []
+        for (_, dtype, width), (offset, count) in zip(_FIELDS, entry[1:]):
+            array = np.frombuffer(self._map, dtype=dtype, count=count, offset=offset)
+            arrays.append(array.reshape(-1, width) if width else array)
+        self.hits += 1
+        return MeshData(path, *arrays)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._map)
+
+    def close(self):
+        self.index = {}
+        self._map.close()
+        self._file.close()
+
+
+def _decode(path: str) -> Tuple[str, Tuple[int, int], MeshData]:
+    stat = os.stat(path)
+    return path, (stat.st_mtime_ns, stat.st_size), MeshData.from_parts(path, load_mesh_parts(path))
+
+
+def write_mesh_store(path: str, files: List[str], workers: Optional[int] = None) -> int:
+    """
+    Decode files in parallel and write them to a store at path, replacing
+    any store already there. Files that fail to decode are skipped. Returns
+    the number of meshes written.
+    """
+    index = {}
+    tmp = "{}.tmp{}".format(path, os.getpid())
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(tmp, 'wb') as f, ProcessPoolExecutor(workers or os.cpu_count() or 1) as pool:
+        f.write(_MAGIC)
+        futures = [pool.submit(_decode, resolve(filename)) for filename in files]
+        for future in futures:
+            try:
+                source, stamp, mesh = future.result()
+            except (OSError, ValueError, KeyError) as e:
+                print("Skipping mesh: {}".format(e), file=sys.stderr)
+                continue
+            entry = [list(stamp)]
+            for name, dtype, _ in _FIELDS:
+                array = np.ascontiguousarray(getattr(mesh, name), dtype=dtype)
+                f.write(b'\0' * (-f.tell() % _ALIGN))
+                entry.append([f.tell(), array.size])
+                f.write(array.tobytes())
+            index[source] = entry
+        data = json.dumps(index).encode()
+        index_offset = f.tell()
+        f.write(data)
+        f.write(_TRAILER.pack(index_offset, len(data), _MAGIC))
+    os.replace(tmp, path)
+    return len(index)
+
+
+def open_mesh_store(path: str = MESH_STORE_PATH) -> MeshStore:
+    """
+    Open a store and make it the backing store of the process-wide mesh
+    cache.
+    """
+    store = MeshStore(path)
+    get_mesh_cache().set_store(store)
+    return store
+
+
+if __name__ == '__main__':
+    # Usage: python mesh_store.py [store path]
+    # Decodes every mesh of the dataset and the robots into the store that
+    # the mesh cache of every process maps on start.
+    path = sys.argv[1] if len(sys.argv) > 1 else MESH_STORE_PATH
+    files = asset_meshes()
+    start = time.perf_counter()
+    count = write_mesh_store(path, files)
+    print("Wrote {} of {} meshes to {} ({:.1f} MB) in {:.1f} s".format(
+        count, len(files), path, os.path.getsize(path) / 1e6, time.perf_counter() - start))
+
+    store = MeshStore(path)
+    start = time.perf_counter()
+    meshes = [store.get(filename) for filename in store.index]
+    print("Mapped {} meshes in {:.1f} ms".format(len(meshes), (time.perf_counter() - start) * 1e3))
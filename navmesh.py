@@ -0,0 +1,433 @@
+import heapq
+import json
+import os
+import struct
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from frl_apt_0 import r2s_batch
+
+DATASET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "replica_cad")
+
+_NAVMESH_SET_MAGIC = b'TESM'   # 'MSET' as a little-endian int
+_NAVMESH_MAGIC = b'VAND'       # 'DNAV' as a little-endian int
+_VERTS_PER_POLYGON = 6
+_EXT_LINK = 0x8000
+_POLYTYPE_GROUND = 0
+
+# Habitat appends its NavMeshSettings to the header from version 2 on
+_SETTINGS_SIZE = {1: 0, 2: 56}
+_MESH_HEADER = struct.Struct('<4s14i10f')
+_POLY = np.dtype([
+    ('first_link', '<u4'), ('verts', '<u2', _VERTS_PER_POLYGON),
+    ('neis', '<u2', _VERTS_PER_POLYGON), ('flags', '<u2'),
+    ('vert_count', 'u1'), ('area_and_type', 'u1'),
+])
+_LINK_SIZE = 12
+_POLY_DETAIL_SIZE = 12
+_BV_NODE_SIZE = 16
+_OFF_MESH_CON_SIZE = 36
+
+
+def _align4(size: int) -> int:
+    return (size + 3) & ~3
+
+
+@dataclass
+class _Tile:
+    vertices: np.ndarray
+    polygons: List[np.ndarray]
+    neighbours: List[np.ndarray]
+
+
+def _read_tile(data: bytes, offset: int) -> _Tile:
+    header = _MESH_HEADER.unpack_from(data, offset)
+    if header[0] != _NAVMESH_MAGIC:
+        raise ValueError("Bad navmesh tile magic {!r}".format(header[0]))
+    poly_count, vert_count, max_link_count = header[6], header[7], header[8]
+    detail_mesh_count, detail_vert_count, detail_tri_count = header[9], header[10], header[11]
+
+    offset += _align4(_MESH_HEADER.size)
+    vertices = np.frombuffer(data, '<f4', vert_count * 3, offset).reshape(-1, 3)
+    offset += _align4(vertices.nbytes)
+    polys = np.frombuffer(data, _POLY, poly_count, offset)
+    # Detail meshes, links and the BV tree follow; the planner does not need them
+    del max_link_count, detail_mesh_count, detail_vert_count, detail_tri_count
+
+    polygons, neighbours = [], []
+    for poly in polys:
+        if poly['area_and_type'] >> 6 != _POLYTYPE_GROUND:
+            continue
+        count = poly['vert_count']
+        polygons.append(poly['verts'][:count].astype(np.int64))
+        neighbours.append(poly['neis'][:count].astype(np.int64))
+    return _Tile(vertices.astype(np.float64), polygons, neighbours)
+
+
+def read_navmesh(filename: str) -> List[_Tile]:
+    """
+    Read the tiles of a Habitat/Recast navmesh set ("MSET") file.
+    """
+    with open(filename, 'rb') as f:
+        data = f.read()
+    magic, version, num_tiles = struct.unpack_from('<4sii', data, 0)
+    if magic != _NAVMESH_SET_MAGIC or version not in _SETTINGS_SIZE:
+        raise ValueError("{} is not a supported navmesh file".format(filename))
+    # dtNavMeshParams: origin, tile width and height, max tiles, max polygons
+    offset = 12 + 28 + _SETTINGS_SIZE[version]
+
+    tiles = []
+    for _ in range(num_tiles):
+        tile_ref, size = struct.unpack_from('<Ii', data, offset)
+        offset += 8
+        if not tile_ref or not size:
+            break
+        tiles.append(_read_tile(data, offset))
+        offset += size
+    return tiles
+
+
+def navmesh_path(name: str, dataset_dir: str = DATASET_DIR) -> str:
+    """
+    Navmesh file of a scene, as listed in the dataset config.
+    """
+    config = os.path.join(dataset_dir, "replicaCAD.scene_dataset_config.json")
+    with open(config) as f:
+        instances = json.load(f).get("navmesh_instances", {})
+    return os.path.join(dataset_dir, instances.get(name, "navmeshes/{}.navmesh".format(name)))
+
+
+def _cross(u: np.ndarray, v: np.ndarray) -> np.ndarray:
+    return u[..., 0] * v[..., 1] - u[..., 1] * v[..., 0]
+
+
+class NavMesh:
+    """
+    Walkable polygons of a navmesh in SAPIEN's world frame (z up), with an
+    A* planner over polygons, funnel path smoothing, an LRU cache of planned
+    paths and vectorized point sampling.
+    """
+
+    def __init__(self, filename: str, cache_size: int = 4096, cache_resolution: float = 0.05):
+        tiles = read_navmesh(filename)
+        vertices, polygons, neighbours = [], [], []
+        vertex_base, poly_base = 0, 0
+        for tile in tiles:
+            vertices.append(tile.vertices)
+            polygons += [poly + vertex_base for poly in tile.polygons]
+            neighbours += [np.where((nei == 0) | (nei & _EXT_LINK != 0), -1,
+                                    (nei & ~_EXT_LINK) - 1 + poly_base)
+                           for nei in tile.neighbours]
+            vertex_base += len(tile.vertices)
+            poly_base += len(tile.polygons)
+        # Navmeshes are baked in ReplicaCAD's Y-up frame
+        self.vertices = r2s_batch(np.concatenate(vertices)) if vertices else np.zeros((0, 3))
+        self.polygons = polygons
+        self.neighbours = neighbours
+        if len(tiles) > 1:
+            self._link_tiles()
+
+        self.centroids = np.array([self.vertices[poly].mean(0) for poly in polygons]).reshape(-1, 3)
+        triangles, owners = [], []
+        for index, poly in enumerate(polygons):
+            for k in range(1, len(poly) - 1):
+                triangles.append([poly[0], poly[k], poly[k + 1]])
+                owners.append(index)
+        self.triangles = np.array(triangles, dtype=np.int64).reshape(-1, 3)
+        self.triangle_polygons = np.array(owners, dtype=np.int64)
+        corners = self.vertices[self.triangles]
+        self.triangle_areas = np.abs(_cross(corners[:, 1] - corners[:, 0],
+                                            corners[:, 2] - corners[:, 0])) / 2
+        self.islands = self._label_islands()
+
+        self.cache_size = cache_size
+        self.cache_resolution = cache_resolution
+        self._paths: 'OrderedDict[tuple, Optional[np.ndarray]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def for_scene(cls, name: str, **kwargs) -> 'NavMesh':
+        return cls(navmesh_path(name), **kwargs)
+
+    def _link_tiles(self):
+        # Polygons of different tiles share border edges; match them by position
+        edges: Dict[tuple, Tuple[int, int]] = {}
+        for index, poly in enumerate(self.polygons):
+            for k in range(len(poly)):
+                if self.neighbours[index][k] >= 0:
+                    continue
+                a, b = (tuple(np.round(self.vertices[v], 3)) for v in (poly[k], poly[(k + 1) % len(poly)]))
+                key = (min(a, b), max(a, b))
+                if key in edges:
+                    other, side = edges.pop(key)
+                    self.neighbours[index][k] = other
+                    self.neighbours[other][side] = index
+                else:
+                    edges[key] = (index, k)
+
+    def _label_islands(self) -> np.ndarray:
+        islands = np.full(len(self.polygons), -1, dtype=np.int64)
+        for seed in range(len(self.polygons)):
+            if islands[seed] >= 0:
+                continue
+            label = islands.max() + 1
+            stack = [seed]
+            islands[seed] = label
+            while stack:
+                index = stack.pop()
+                for other in self.neighbours[index]:
+                    if other >= 0 and islands[other] < 0:
+                        islands[other] = label
+                        stack.append(other)
+        return islands
+
+    @property
+    def largest_island(self) -> int:
+        areas = np.bincount(self.islands[self.triangle_polygons], weights=self.triangle_areas)
+        return int(areas.argmax())
+
+    def locate(self, points: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Closest navigable point and its polygon for each of (N, 3) points.
+        """
+        points = np.atleast_2d(np.asarray(points, dtype=np.float64))
+        corners = self.vertices[self.triangles]                          # (T, 3, 3)
+        p = points[:, None, :2]                                           # (N, 1, 2)
+        a, b, c = corners[None, :, 0, :2], corners[None, :, 1, :2], corners[None, :, 2, :2]
+
+        # Closest point on each triangle in the plane
+        closest = []
+        for start, end in ((a, b), (b, c), (c, a)):
+            edge = end - start
+            t = np.clip(np.sum((p - start) * edge, -1) / np.maximum(np.sum(edge * edge, -1), 1e-12), 0, 1)
+            closest.append(start + t[..., None] * edge)
+        closest = np.stack(closest, -2)                                   # (N, T, 3, 2)
+        distances = np.linalg.norm(closest - p[..., None, :], axis=-1)
+        nearest_edge = distances.argmin(-1)
+        planar = np.take_along_axis(closest, nearest_edge[..., None, None], -2)[..., 0, :]
+        d0, d1, d2 = _cross(b - a, p - a), _cross(c - b, p - b), _cross(a - c, p - c)
+        inside = ((d0 >= 0) & (d1 >= 0) & (d2 >= 0)) | ((d0 <= 0) & (d1 <= 0) & (d2 <= 0))
+        planar = np.where(inside[..., None], np.broadcast_to(p, planar.shape), planar)
+
+        # Height from barycentric coordinates of the planar point
+        v0, v1 = b - a, c - a
+        v2 = planar - a
+        denominator = _cross(v0, v1)
+        denominator = np.where(np.abs(denominator) < 1e-12, 1e-12, denominator)
+        w1 = _cross(v2, v1) / denominator
+        w2 = _cross(v0, v2) / denominator
+        z = corners[None, :, 0, 2] * (1 - w1 - w2) + corners[None, :, 1, 2] * w1 + \
+            corners[None, :, 2, 2] * w2
+
+        error = np.sum((planar - p) ** 2, -1) + (z - points[:, None, 2]) ** 2
+        best = error.argmin(1)
+        rows = np.arange(len(points))
+        located = np.concatenate([planar[rows, best], z[rows, best][:, None]], axis=1)
+        return located, self.triangle_polygons[best]
+
+    def is_navigable(self, points: np.ndarray, tolerance: float = 0.05,
+                     max_height: float = 0.5) -> np.ndarray:
+        points = np.atleast_2d(np.asarray(points, dtype=np.float64))
+        located, _ = self.locate(points)
+        return (np.linalg.norm(located[:, :2] - points[:, :2], axis=1) <= tolerance) & \
+            (np.abs(located[:, 2] - points[:, 2]) <= max_height)
+
+    def _portal(self, index: int, other: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Shared edge from polygon index to other as (left, right) seen from index.
+        """
+        poly = self.polygons[index]
+        k = int(np.flatnonzero(self.neighbours[index] == other)[0])
+        a, b = self.vertices[poly[k]], self.vertices[poly[(k + 1) % len(poly)]]
+        direction = self.centroids[other] - self.centroids[index]
+        if _cross(direction[:2], (a - self.centroids[index])[:2]) > 0:
+            return a, b
+        return b, a
+
+    def _search(self, start: int, goal: int, start_point: np.ndarray,
+                goal_point: np.ndarray) -> Optional[List[int]]:
+        if self.islands[start] != self.islands[goal]:
+            return None
+        positions = {start: start_point}
+        cost = {start: 0.0}
+        parent = {start: -1}
+        queue = [(np.linalg.norm(goal_point - start_point), start)]
+        closed = set()
+        while queue:
+            _, index = heapq.heappop(queue)
+            if index == goal:
+                break
+            if index in closed:
+                continue
+            closed.add(index)
+            for other in self.neighbours[index]:
+                if other < 0 or other in closed:
+                    continue
+                left, right = self._portal(index, other)
+                position = (left + right) / 2 if other != goal else goal_point
+                new_cost = cost[index] + np.linalg.norm(position - positions[index])
+                if new_cost < cost.get(other, np.inf):
+                    cost[other] = new_cost
+                    positions[other] = position
+                    parent[other] = index
+                    heapq.heappush(queue, (new_cost + np.linalg.norm(goal_point - position), other))
+        if goal not in parent:
+            return None
+        corridor = [goal]
+        while parent[corridor[-1]] >= 0:
+            corridor.append(parent[corridor[-1]])
+        return corridor[::-1]
+
+    def _funnel(self, corridor: List[int], start: np.ndarray, goal: np.ndarray) -> np.ndarray:
+        """
+        Shortest path through the portals of a polygon corridor (simple
+        stupid funnel algorithm). The funnel runs in the ground plane, so
+        each straight run is then split where it crosses a portal, with the
+        height taken from the portal edge there; the path then follows the
+        polygons over stairs and slopes instead of cutting through them.
+        """
+        portals = [(start, start)]
+        portals += [self._portal(a, b) for a, b in zip(corridor[:-1], corridor[1:])]
+        portals.append((goal, goal))
+
+        path = [(start, 0)]
+        apex, left, right = start, start, start
+        apex_index = left_index = right_index = 0
+        i = 1
+        while i < len(portals):
+            new_left, new_right = portals[i]
+            # Tighten the right side of the funnel
+            if _cross((right - apex)[:2], (new_right - apex)[:2]) >= 0:
+                if np.array_equal(apex, right) or _cross((left - apex)[:2], (new_right - apex)[:2]) < 0:
+                    right, right_index = new_right, i
+                else:
+                    path.append((left, left_index))
+                    apex, apex_index = left, left_index
+                    left = right = apex
+                    left_index = right_index = apex_index
+                    i = apex_index + 1
+                    continue
+            # Tighten the left side of the funnel
+            if _cross((left - apex)[:2], (new_left - apex)[:2]) <= 0:
+                if np.array_equal(apex, left) or _cross((right - apex)[:2], (new_left - apex)[:2]) > 0:
+                    left, left_index = new_left, i
+                else:
+                    path.append((right, right_index))
+                    apex, apex_index = right, right_index
+                    left = right = apex
+                    left_index = right_index = apex_index
+                    i = apex_index + 1
+                    continue
+            i += 1
+        if not np.array_equal(path[-1][0], goal):
+            path.append((goal, len(portals) - 1))
+
+        points = [start]
+        for (a, a_index), (b, b_index) in zip(path[:-1], path[1:]):
+            direction = (b - a)[:2]
+            for left, right in portals[a_index + 1:b_index]:
+                edge = (right - left)[:2]
+                denominator = _cross(edge, direction)
+                t = _cross((a - left)[:2], direction) / denominator if abs(denominator) > 1e-12 else 0.5
+                point = left + np.clip(t, 0, 1) * (right - left)
+                if not np.allclose(point, points[-1]):
+                    points.append(point)
+            if not np.allclose(b, points[-1]):
+                points.append(b)
+        return np.array(points)
+
+    def _cache_key(self, start: np.ndarray, goal: np.ndarray) -> tuple:
+        return tuple(np.round(np.concatenate([start, goal]) / self.cache_resolution).astype(int))
+
+    def find_path(self, start: np.ndarray, goal: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Shortest navigable path from start to goal as (K, 3) waypoints, or None
+        if they are on different islands. Both ends are first moved onto the
+        navmesh. Results are cached per start and goal rounded to
+        cache_resolution.
+        """
+        key = self._cache_key(np.asarray(start, dtype=np.float64), np.asarray(goal, dtype=np.float64))
+        with self._lock:
+            if key in self._paths:
+                self._paths.move_to_end(key)
+                self.hits += 1
+                return self._paths[key]
+            self.misses += 1
+
+        located, polygons = self.locate(np.stack([start, goal]))
+        corridor = self._search(polygons[0], polygons[1], located[0], located[1])
+        path = None if corridor is None else self._funnel(corridor, located[0], located[1])
+
+        with self._lock:
+            self._paths[key] = path
+            while len(self._paths) > self.cache_size:
+                self._paths.popitem(last=False)
+        return path
+
+    def geodesic_distance(self, start: np.ndarray, goal: np.ndarray) -> float:
+        path = self.find_path(start, goal)
+        if path is None:
+            return np.inf
+        return float(np.linalg.norm(np.diff(path, axis=0), axis=1).sum())
+
+    def sample_points(self, count: int, rng: Optional[np.random.Generator] = None,
+                      island: Optional[int] = None) -> np.ndarray:
+        """
+        (count, 3) points drawn uniformly by area from the navmesh, or from one
+        island of it, e.g. largest_island.
+        """
+        rng = rng if rng is not None else np.random.default_rng()
+        weights = self.triangle_areas
+        if island is not None:
+            weights = weights * (self.islands[self.triangle_polygons] == island)
+        triangles = rng.choice(len(weights), size=count, p=weights / weights.sum())
+        u, v = rng.random(count), rng.random(count)
+        flip = u + v > 1
+        u, v = np.where(flip, 1 - u, u), np.where(flip, 1 - v, v)
+        corners = self.vertices[self.triangles[triangles]]
+        return corners[:, 0] + u[:, None] * (corners[:, 1] - corners[:, 0]) + \
+            v[:, None] * (corners[:, 2] - corners[:, 0])
+
+    def sample_base_poses(self, count: int, rng: Optional[np.random.Generator] = None,
+                          island: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Positions and (w, x, y, z) quaternions with uniformly random yaw, e.g.
+        for placing the mobile robot base.
+        """
+        rng = rng if rng is not None else np.random.default_rng()
+        positions = self.sample_points(count, rng, island)
+        yaw = rng.uniform(-np.pi, np.pi, count)
+        quaternions = np.stack([np.cos(yaw / 2), np.zeros(count), np.zeros(count), np.sin(yaw / 2)], -1)
+        return positions, quaternions
+
+    def stats(self) -> Dict[str, int]:
+        return {"paths": len(self._paths), "hits": self.hits, "misses": self.misses}
+
+
+if __name__ == '__main__':
+    # Usage: python navmesh.py [scene name]
+    import time
+
+    navmesh = NavMesh.for_scene(sys.argv[1] if len(sys.argv) > 1 else 'apt_0')
+    print("{} polygons, {} islands, {:.1f} m2 navigable".format(
+        len(navmesh.polygons), navmesh.islands.max() + 1, navmesh.triangle_areas.sum()))
+
+    rng = np.random.default_rng(0)
+    start = time.perf_counter()
+    points = navmesh.sample_points(100000, rng, navmesh.largest_island)
+    print("sampled {} points in {:.1f} ms".format(len(points), (time.perf_counter() - start) * 1e3))
+
+    pairs = navmesh.sample_points(200, rng, navmesh.largest_island).reshape(100, 2, 3)
+    for label in ("planned", "cached"):
+        start = time.perf_counter()
+        for a, b in pairs:
+            navmesh.find_path(a, b)
+        print("{} 100 paths in {:.1f} ms".format(label, (time.perf_counter() - start) * 1e3))
+    print(navmesh.stats())
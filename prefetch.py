@@ -0,0 +1,216 @@
+import os
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from collision_cache import convex_collision, get_collision_cache, nonconvex_collision
+from mesh_cache import MeshData, get_mesh_cache, resolve
+from mesh_io import load_mesh_parts
+from scene_wrapper import ActorBuilderWrapper, SceneWrapper, URDFLoaderWrapper, file_argument
+
+_DECODABLE = ('.glb', '.stl')
+# How the files of each ActorBuilder call are consumed, as in layout_assets
+_ASSET_KINDS = {
+    'add_visual_from_file': "visual",
+    'add_collision_from_file': "convex",
+    'add_multiple_collisions_from_file': "convex",
+    'add_nonconvex_collision_from_file': "nonconvex",
+}
+
+
+@dataclass
+class PrefetchStats:
+    files: int = 0
+    bytes_read: int = 0
+    decoded: int = 0
+    seconds: float = 0.0
+    workers: int = 0
+
+
+def urdf_mesh_files(urdf: str, visual: bool = True) -> List[str]:
+    """
+    Mesh files referenced by the collision elements of a URDF, and by its
+    visual elements unless visual is False.
+    """
+    root = ET.parse(urdf).getroot()
+    base = os.path.dirname(urdf)
+    tags = ("visual", "collision") if visual else ("collision",)
+    files = []
+    for element in root.iter():
+        if element.tag not in tags:
+            continue
+        for mesh in element.iter("mesh"):
+            filename = mesh.get("filename", '')
+            if filename.startswith("package://"):
+                filename = filename[len("package://"):]
+            files.append(resolve(os.path.join(base, filename)))
+    return files
+
+
+def layout_assets(layout: 'SceneLayout', visual: bool = True) -> Dict[str, List[str]]:
+    """
+    Every file a layout build will open, grouped by how it is consumed.
+    Without visual, only collision data is listed.
+    """
+    assets = {"visual": [], "bounds": [], "convex": [], "nonconvex": [], "urdf": []}
+    if visual:
+        assets["visual"].append(layout.stage.render_asset)
+    assets["nonconvex"].append(layout.stage.collision_asset)
+    for obj in layout.objects:
+        if obj.use_bounding_box:
+            # The box collision is fitted to the render mesh, which is read anyway
+            assets["bounds"].append(obj.render_asset)
+            continue
+        if visual:
+            assets["visual"].append(obj.render_asset)
+        assets["nonconvex" if obj.static else "convex"].append(obj.collision_asset)
+    for art in layout.articulations:
+        assets["urdf"].append(art.urdf)
+        assets["urdf"].extend(urdf_mesh_files(art.urdf, visual))
+    return {kind: list(dict.fromkeys(paths)) for kind, paths in assets.items()}
+
+
+class _Placeholder:
+    """
+    Stands in for the engine, scene and everything built while recording
+    assets; any call is accepted and returns the placeholder.
+    """
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+
+class _AssetActorBuilder(ActorBuilderWrapper):
+    def add(self, method: str, args: tuple, kwargs: dict):
+        kind = _ASSET_KINDS.get(method)
+        if kind is not None:
+            self._owner[kind].append(resolve(file_argument(args, kwargs)))
+
+
+class _AssetURDFLoader(URDFLoaderWrapper):
+    def load_articulation(self, filename: str, args: tuple, kwargs: dict):
+        self._owner["urdf"].append(resolve(filename))
+        return self._loader
+
+
+class _AssetScene(SceneWrapper):
+    actor_builder_class = _AssetActorBuilder
+    urdf_loader_class = _AssetURDFLoader
+
+
+def record_assets(build: Callable, visual: bool = True) -> Dict[str, List[str]]:
+    """
+    Every file a scene builder opens, grouped like layout_assets, found by
+    running build(engine, scene=...) once against a scene that only records
+    the files. For hand-written builders such as frl_apt_0.build_scene,
+    which have no layout to list them from. The collision cache is bypassed
+    while recording, so sources are listed and nothing is cooked.
+    """
+    assets = {"visual": [], "bounds": [], "convex": [], "nonconvex": [], "urdf": []}
+    cache = get_collision_cache()
+    enabled, cache.enabled = cache.enabled, False
+    try:
+        build(_Placeholder(), scene=_AssetScene(_Placeholder(), assets))
+    finally:
+        cache.enabled = enabled
+    if not visual:
+        assets["visual"] = []
+    for urdf in list(assets["urdf"]):
+        assets["urdf"].extend(urdf_mesh_files(urdf, visual))
+    return {kind: list(dict.fromkeys(paths)) for kind, paths in assets.items()}
+
+
+def _read(path: str) -> int:
+    size = 0
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            size += len(block)
+    return size
+
+
+def _prefetch(kind: str, path: str) -> int:
+    """
+    Read a file once so later engine-side loads hit the page cache, then
+    do the Python-side work its builder would otherwise do serially.
+    """
+    size = _read(path)
+    if kind == "convex":
+        convex_collision(path)
+    elif kind == "nonconvex":
+        nonconvex_collision(path)
+    elif kind == "bounds":
+        get_mesh_cache().bounds(path)
+    return size
+
+
+def _prefetch_into_cache(kind: str, path: str, decode: bool) -> Tuple[int, None]:
+    size = _prefetch(kind, path)
+    if decode:
+        get_mesh_cache().get(path)
+    return size, None
+
+
+def _prefetch_and_decode(kind: str, path: str, decode: bool) -> Tuple[int, Optional[MeshData]]:
+    size = _prefetch(kind, path)
+    if decode:
+        return size, MeshData.from_parts(path, load_mesh_parts(path))
+    return size, None
+
+
+def prefetch_layout(layout: 'SceneLayout', workers: Optional[int] = None,
+                    processes: bool = False, decode: bool = False,
+                    visual: bool = True) -> PrefetchStats:
+    """
+    Read every asset of a layout in parallel before the scene is built, so
+    SAPIEN's own loads hit the page cache, and do the Python-side work the
+    builders need: collision meshes are cooked into the collision cache and
+    the bounds of bounding-box colliders computed. Builders still pass file
+    paths to SAPIEN, which decodes them itself.
+
+    decode additionally fills the process-wide mesh cache, for callers that
+    read the geometry from Python afterwards. With processes, cooking and
+    decoding run in worker processes and decoded buffers are sent back;
+    bounds are always computed in this process, where they are used.
+    """
+    return prefetch_assets(layout_assets(layout, visual), workers, processes, decode)
+
+
+def prefetch_assets(assets: Dict[str, List[str]], workers: Optional[int] = None,
+                    processes: bool = False, decode: bool = False) -> PrefetchStats:
+    """
+    prefetch_layout for files grouped as by layout_assets or record_assets.
+    """
+    start = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    tasks = []
+    cache = get_mesh_cache()
+    for kind, paths in assets.items():
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            decodable = path.lower().endswith(_DECODABLE) and path not in cache
+            tasks.append((kind, path, decode and decodable))
+    # Largest files first keeps the pool busy until the end
+    tasks.sort(key=lambda task: os.path.getsize(task[1]), reverse=True)
+
+    stats = PrefetchStats(files=len(tasks), workers=workers)
+    if processes:
+        local = [task for task in tasks if task[0] == "bounds"]
+        tasks = [task for task in tasks if task[0] != "bounds"]
+        with ProcessPoolExecutor(workers) as pool, ThreadPoolExecutor(1) as thread:
+            local_results = thread.map(_prefetch_into_cache, *zip(*local)) if local else []
+            results = list(pool.map(_prefetch_and_decode, *zip(*tasks))) if tasks else []
+            results += list(local_results)
+        for (_, path, _), (_, mesh) in zip(tasks, results):
+            if mesh is not None:
+                cache.put(path, mesh)
+        tasks += local
+    else:
+        with ThreadPoolExecutor(workers) as pool:
+            results = list(pool.map(_prefetch_into_cache, *zip(*tasks))) if tasks else []
+    stats.bytes_read = sum(size for size, _ in results)
+    stats.decoded = sum(decode for _, _, decode in tasks)
+    stats.seconds = time.perf_counter() - start
+    return stats
@@ -0,0 +1,260 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from multiprocessing import parent_process
+from multiprocessing.util import Finalize
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from scene_wrapper import ActorBuilderWrapper, SceneWrapper, URDFLoaderWrapper, name_argument
+
+# Set to a file name, e.g. trace.json, to profile every process that imports
+# this module. Worker processes write to trace.<pid>.json next to it.
+PROFILE_ENV = "REPLICA_CAD_PROFILE"
+
+
+class _NullScope:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SCOPE = _NullScope()
+
+
+class _Scope:
+    __slots__ = ('profiler', 'name', 'args', 'start')
+
+    def __init__(self, profiler: 'Profiler', name: str, args: Optional[dict]):
+        self.profiler = profiler
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, self.start, time.perf_counter_ns() - self.start, self.args)
+        return False
+
+
+class Profiler:
+    """
+    Timed scopes of one process, kept as (name, start, duration, thread,
+    args) tuples in nanoseconds. Appending to a list is atomic, so scopes
+    from several threads need no lock.
+    """
+
+    def __init__(self):
+        self.events: List[Tuple[str, int, int, int, Optional[dict]]] = []
+        self.origin = time.perf_counter_ns()
+
+    def add(self, name: str, start: int, duration: int, args: Optional[dict] = None):
+        self.events.append((name, start, duration, threading.get_ident(), args))
+
+    def clear(self):
+        self.events = []
+
+    def histograms(self) -> Dict[str, Dict[str, float]]:
+        """
+        Count, total, mean, p50, p99 and max latency of each scope in ms.
+        """
+        durations = defaultdict(list)
+        for name, _, duration, _, _ in self.events:
+            durations[name].append(duration)
+        stats = {}
+        for name, values in sorted(durations.items()):
+            ms = np.array(values, dtype=np.float64) / 1e6
+            p50, p99 = np.percentile(ms, [50, 99])
+            stats[name] = {'count': len(ms), 'total': ms.sum(), 'mean': ms.mean(),
+                           'p50': p50, 'p99': p99, 'max': ms.max()}
+        return stats
+
+    def report(self) -> str:
+        lines = ["{:<36} {:>8} {:>10} {:>9} {:>9} {:>9}".format(
+            'scope', 'count', 'total ms', 'p50 ms', 'p99 ms', 'max ms')]
+        for name, s in self.histograms().items():
+            lines.append("{:<36} {:>8} {:>10.1f} {:>9.3f} {:>9.3f} {:>9.3f}".format(
+                name, s['count'], s['total'], s['p50'], s['p99'], s['max']))
+        return "\n".join(lines)
+
+    def trace(self) -> dict:
+        """
+        Chrome trace event JSON, which chrome://tracing and Perfetto open.
+        """
+        pid = os.getpid()
+        threads = {}
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': pid,
+                   'args': {'name': "{} ({})".format(os.path.basename(sys.argv[0]) or 'python', pid)}}]
+        for name, start, duration, thread, args in self.events:
+            tid = threads.setdefault(thread, len(threads))
+            event = {'name': name, 'cat': name.split('/')[0], 'ph': 'X', 'pid': pid, 'tid': tid,
+                     'ts': (start - self.origin) / 1e3, 'dur': duration / 1e3}
+            if args:
+                event['args'] = args
+            events.append(event)
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write_trace(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(self.trace(), f)
+
+
+_profiler: Optional[Profiler] = None
+
+
+def enable() -> Profiler:
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler()
+    return _profiler
+
+
+def disable():
+    global _profiler
+    _profiler = None
+
+
+def get_profiler() -> Optional[Profiler]:
+    return _profiler
+
+
+def scope(name: str, args: Optional[dict] = None):
+    """
+    Time a block: with scope('runner/step'): scene.step(). While profiling
+    is disabled this returns a shared no-op context manager.
+    """
+    profiler = _profiler
+    if profiler is None:
+        return _NULL_SCOPE
+    return _Scope(profiler, name, args)
+
+
+def profiled(name: str) -> Callable:
+    """
+    Decorator form of scope().
+    """
+    def decorator(function: Callable) -> Callable:
+        def wrapper(*args, **kwargs):
+            if _profiler is None:
+                return function(*args, **kwargs)
+            with _Scope(_profiler, name, None):
+                return function(*args, **kwargs)
+        wrapper.__name__ = function.__name__
+        wrapper.__doc__ = function.__doc__
+        return wrapper
+    return decorator
+
+
+class _ProfiledActorBuilder(ActorBuilderWrapper):
+    """
+    Times a builder from its creation to its build call, so file loading and
+    collision cooking triggered along the way count for its actor.
+    """
+    kinds = {'build': 'dynamic', 'build_kinematic': 'kinematic', 'build_static': 'static'}
+
+    def __init__(self, builder, scene: '_ProfiledScene'):
+        super().__init__(builder, scene)
+        self._start = time.perf_counter_ns()
+
+    def build_actor(self, method: str, args: tuple, kwargs: dict):
+        actor = super().build_actor(method, args, kwargs)
+        self._owner.profiler.add("{}/{}".format(self._owner.prefix, self.kinds[method]), self._start,
+                                 time.perf_counter_ns() - self._start, {'name': name_argument(args, kwargs)})
+        return actor
+
+
+class _ProfiledURDFLoader(URDFLoaderWrapper):
+    def load_articulation(self, filename: str, args: tuple, kwargs: dict):
+        with _Scope(self._owner.profiler, "{}/urdf".format(self._owner.prefix),
+                    {'file': os.path.basename(filename)}):
+            return super().load_articulation(filename, args, kwargs)
+
+
+class _ProfiledScene(SceneWrapper):
+    actor_builder_class = _ProfiledActorBuilder
+    urdf_loader_class = _ProfiledURDFLoader
+
+    def __init__(self, scene, profiler: Profiler, prefix: str):
+        super().__init__(scene, self)
+        self.profiler = profiler
+        self.prefix = prefix
+
+
+def profiled_scene(scene, prefix: str):
+    """
+    The scene itself while profiling is disabled, otherwise a wrapper that
+    times every actor and URDF built through it as <prefix>/static,
+    <prefix>/dynamic, <prefix>/kinematic and <prefix>/urdf. Use
+    unwrap_scene() to get the scene back.
+    """
+    if _profiler is None:
+        return scene
+    return _ProfiledScene(scene, _profiler, prefix)
+
+
+def unwrap_scene(scene):
+    return scene._scene if isinstance(scene, _ProfiledScene) else scene
+
+
+def _trace_path(path: str) -> str:
+    if parent_process() is None:
+        return path
+    root, ext = os.path.splitext(path)
+    return "{}.{}{}".format(root, os.getpid(), ext or '.json')
+
+
+def _dump(path: str):
+    profiler = _profiler
+    if profiler is None or not profiler.events:
+        return
+    path = _trace_path(path)
+    profiler.write_trace(path)
+    sys.stderr.write("Profile of process {} written to {}\n{}\n".format(
+        os.getpid(), path, profiler.report()))
+
+
+if os.environ.get(PROFILE_ENV):
+    enable()
+    # multiprocessing runs these finalizers on exit in the main process and,
+    # unlike atexit handlers, in its worker processes too
+    Finalize(None, _dump, args=(os.environ[PROFILE_ENV],), exitpriority=0)
+
+
+if __name__ == '__main__':
+    # Usage: python profiling.py [trace.json] [seconds]
+    # Profiles building FRL apartment 0 and running it headless with the
+    # mobile panda, then writes the trace and prints the latency table.
+    import sapien.core as sapien
+
+    from benchmark import load_robot
+    from frl_apt_0 import build_scene
+    from runner import SimulationRunner
+
+    path = sys.argv[1] if len(sys.argv) > 1 else 'trace.json'
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+    profiler = enable()
+
+    engine = sapien.Engine()
+    with scope('build_scene'):
+        scene = build_scene(engine)
+    robot = load_robot(scene)
+
+    def apply_passive_force(runner: SimulationRunner):
+        with scope('demo/compute_passive_force'):
+            qf = robot.compute_passive_force(gravity=True, coriolis_and_centrifugal=True)
+        robot.set_qf(qf)
+
+    SimulationRunner(scene, render_interval=0, on_substep=apply_passive_force).run(duration)
+    profiler.write_trace(path)
+    print(profiler.report())
+    print("Trace written to {}".format(path))
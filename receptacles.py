@@ -0,0 +1,320 @@
+import glob
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+import sapien.core as sapien
+from sapien.utils import Viewer
+
+import numpy as np
+
+from frl_apt_0 import build_scene
+from scene_loader import DATASET_DIR, object_config_of
+from scene_wrapper import ActorBuilderWrapper, SceneWrapper, URDFLoaderWrapper, file_argument
+from spatial_index import quat_to_matrices
+
+_PREFIX = "receptacle_aabb"
+
+
+@dataclass
+class ReceptacleSpec:
+    """
+    An axis-aligned receptacle box in the frame of its parent object or
+    link, in ReplicaCAD's original units. up is the local direction objects
+    rest against, so the support surface is the box face opposite to it.
+    """
+    name: str
+    parent: str
+    link: str
+    center: np.ndarray
+    half_size: np.ndarray
+    up: np.ndarray
+
+
+def read_receptacles(config_path: str) -> List[ReceptacleSpec]:
+    """
+    receptacle_aabb_* entries of an object or ao_config.json file.
+    """
+    with open(config_path) as f:
+        user_defined = json.load(f).get("user_defined", {})
+    specs = []
+    for key, entry in user_defined.items():
+        if not key.startswith(_PREFIX):
+            continue
+        specs.append(ReceptacleSpec(
+            name=entry.get("name", key),
+            parent=entry.get("parent_object", ''),
+            link=entry.get("parent_link", ''),
+            center=np.array(entry["position"], dtype=float),
+            # A few boxes are authored with negative scales
+            half_size=np.abs(np.array(entry["scale"], dtype=float)),
+            up=np.array(entry.get("up", [0, 1, 0]), dtype=float),
+        ))
+    return specs
+
+
+@lru_cache(maxsize=None)
+def dataset_receptacles(dataset_dir: str = DATASET_DIR) -> Tuple[Dict[str, List[ReceptacleSpec]],
+                                                                 Dict[str, List[ReceptacleSpec]]]:
+    """
+    Receptacles of the dataset, as two lookups:
+        objects: keyed by object config path
+        urdfs: keyed by URDF file name, e.g. fridge_dynamic.urdf
+    """
+    objects = {}
+    for config_path in glob.glob(os.path.join(dataset_dir, "configs", "objects", "*.json")):
+        specs = read_receptacles(config_path)
+        if specs:
+            objects[config_path] = specs
+
+    urdfs = {}
+    for urdf in glob.glob(os.path.join(dataset_dir, "urdf", "*", "*.urdf")):
+        stem = os.path.splitext(os.path.basename(urdf))[0]
+        for name in (stem, stem[:-len("_dynamic")] if stem.endswith("_dynamic") else None):
+            config_path = os.path.join(os.path.dirname(urdf), "{}.ao_config.json".format(name))
+            if name and os.path.exists(config_path):
+                urdfs[os.path.basename(urdf)] = read_receptacles(config_path)
+                break
+    return objects, urdfs
+
+
+def _object_receptacles(filename: str, dataset_dir: str) -> List[ReceptacleSpec]:
+    config_path = object_config_of(filename, dataset_dir)
+    if config_path is None:
+        return []
+    return dataset_receptacles(dataset_dir)[0].get(config_path, [])
+
+
+class ReceptacleIndex:
+    """
+    World-frame receptacle volumes of a scene.
+
+    Each receptacle keeps its box in the frame of its parent actor or link,
+    scaled by the URDF loader scale the parent was loaded with. update()
+    re-reads the parent poses, so receptacles on drawers and doors follow
+    them. Receptacles are addressed by index; names[i] is the receptacle
+    name and parents[i] the actor or link it is attached to.
+    """
+
+    def __init__(self, entries: List[Tuple[sapien.ActorBase, ReceptacleSpec, float]]):
+        self.names = [spec.name for _, spec, _ in entries]
+        self.parents = [parent for parent, _, _ in entries]
+        self.local_center = np.array([spec.center * scale for _, spec, scale in entries]).reshape(-1, 3)
+        self.half_size = np.array([spec.half_size * scale for _, spec, scale in entries]).reshape(-1, 3)
+
+        up = np.array([spec.up for _, spec, _ in entries]).reshape(-1, 3)
+        self.up_axis = np.argmax(np.abs(up), axis=1)
+        self.up_sign = np.sign(up[np.arange(len(up)), self.up_axis])
+        self.local_up = np.zeros_like(up)
+        self.local_up[np.arange(len(up)), self.up_axis] = self.up_sign
+
+        # Parents are posed once per update however many receptacles they carry
+        self._parents: List[sapien.ActorBase] = []
+        unique: Dict[int, int] = {}
+        for parent in self.parents:
+            if id(parent) not in unique:
+                unique[id(parent)] = len(self._parents)
+                self._parents.append(parent)
+        self._parent_index = np.array([unique[id(parent)] for parent in self.parents], dtype=np.int64)
+
+        self.rotation = np.zeros((len(entries), 3, 3))
+        self.translation = np.zeros((len(entries), 3))
+        self.update()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def update(self):
+        """
+        Refresh the world frames from the current parent poses.
+        """
+        if not self._parents:
+            return
+        poses = [parent.get_pose() for parent in self._parents]
+        positions = np.array([pose.p for pose in poses], dtype=np.float64).reshape(-1, 3)
+        quaternions = np.array([pose.q for pose in poses], dtype=np.float64).reshape(-1, 4)
+        rotations = quat_to_matrices(quaternions / np.linalg.norm(quaternions, axis=1, keepdims=True))
+        self.rotation = rotations[self._parent_index]
+        self.translation = positions[self._parent_index]
+
+    @property
+    def centers(self) -> np.ndarray:
+        return np.einsum('nij,nj->ni', self.rotation, self.local_center) + self.translation
+
+    @property
+    def up(self) -> np.ndarray:
+        return np.einsum('nij,nj->ni', self.rotation, self.local_up)
+
+    def bounds(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        World-space AABBs of the receptacle boxes.
+        """
+        extent = np.einsum('nij,nj->ni', np.abs(self.rotation), self.half_size)
+        centers = self.centers
+        return centers - extent, centers + extent
+
+    def support_area(self, margin: float = 0.0) -> np.ndarray:
+        """
+        Area of each support surface once shrunk by margin on every side.
+        """
+        sides = 2 * np.maximum(self.half_size - margin, 0.0)
+        sides[np.arange(len(self)), self.up_axis] = 1.0
+        return np.prod(sides, axis=1)
+
+    def sample(self, count: int, rng: Optional[np.random.Generator] = None,
+               receptacles: Optional[np.ndarray] = None, margin: float = 0.0,
+               lift: float = 0.0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Draw count placement poses on the support surfaces of receptacles
+        (all by default), with receptacles picked in proportion to their area.
+        margin keeps points away from the box sides, e.g. an object's
+        footprint radius, and lift raises them along the receptacle's up.
+        Returns (count, 3) positions, (count, 4) quaternions with a random
+        yaw about the world z axis, and the receptacle index of each pose.
+        """
+        rng = np.random.default_rng() if rng is None else rng
+        candidates = np.arange(len(self)) if receptacles is None else np.asarray(receptacles)
+        area = self.support_area(margin)[candidates]
+        if len(candidates) == 0 or area.sum() <= 0:
+            raise ValueError("No receptacle has a support surface larger than margin {}".format(margin))
+        chosen = candidates[rng.choice(len(candidates), size=count, p=area / area.sum())]
+
+        half = self.half_size[chosen]
+        offsets = rng.uniform(-1.0, 1.0, (count, 3)) * np.maximum(half - margin, 0.0)
+        rows, axes = np.arange(count), self.up_axis[chosen]
+        offsets[rows, axes] = -self.up_sign[chosen] * half[rows, axes]
+        local = self.local_center[chosen] + offsets + lift * self.local_up[chosen]
+        positions = np.einsum('nij,nj->ni', self.rotation[chosen], local) + self.translation[chosen]
+
+        yaw = rng.uniform(-np.pi, np.pi, count)
+        quaternions = np.zeros((count, 4))
+        quaternions[:, 0] = np.cos(yaw / 2)
+        quaternions[:, 3] = np.sin(yaw / 2)
+        return positions, quaternions, chosen
+
+    def locate(self, points: np.ndarray, tolerance: float = 0.0) -> np.ndarray:
+        """
+        Index of a receptacle box containing each of (N, 3) points, -1 for
+        points in none, e.g. to check where placed objects came to rest.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        local = np.einsum('nji,mnj->mni', self.rotation, points[:, None] - self.translation)
+        inside = np.all(np.abs(local - self.local_center) <= self.half_size + tolerance, axis=2)
+        return np.where(inside.any(1), np.argmax(inside, axis=1), -1)
+
+
+class _ReceptacleActorBuilder(ActorBuilderWrapper):
+    def __init__(self, builder: sapien.ActorBuilder, recorder: 'ReceptacleRecorder'):
+        super().__init__(builder, recorder)
+        self._files: List[str] = []
+
+    def add(self, method: str, args: tuple, kwargs: dict):
+        if method.endswith('_from_file'):
+            self._files.append(file_argument(args, kwargs))
+        super().add(method, args, kwargs)
+
+    def build_actor(self, method: str, args: tuple, kwargs: dict) -> sapien.ActorBase:
+        actor = super().build_actor(method, args, kwargs)
+        for filename in self._files:
+            specs = _object_receptacles(filename, self._owner.dataset_dir)
+            if specs:
+                self._owner.entries += [(actor, spec, 1.0) for spec in specs]
+                break
+        return actor
+
+
+class _ReceptacleURDFLoader(URDFLoaderWrapper):
+    def load_articulation(self, filename: str, args: tuple, kwargs: dict) -> sapien.Articulation:
+        articulation = super().load_articulation(filename, args, kwargs)
+        specs = dataset_receptacles(self._owner.dataset_dir)[1].get(os.path.basename(filename), [])
+        if specs:
+            links = {link.get_name(): link for link in articulation.get_links()}
+            root = articulation.get_links()[0]
+            for spec in specs:
+                # A receptacle without parent_link belongs to the root link
+                link = links.get(spec.link) if spec.link else root
+                if link is None:
+                    print("Skipping receptacle {} of {}: no link named {}".format(
+                        spec.name, os.path.basename(filename), spec.link), file=sys.stderr)
+                    continue
+                self._owner.entries.append((link, spec, self._loader.scale))
+        return articulation
+
+
+class _ReceptacleScene(SceneWrapper):
+    actor_builder_class = _ReceptacleActorBuilder
+    urdf_loader_class = _ReceptacleURDFLoader
+
+
+class ReceptacleRecorder:
+    """
+    Matches the actors and articulations a scene builder creates against the
+    receptacles of the dataset. The builder is given the scene from wrap(),
+    and finish() returns the index of everything it built.
+    """
+
+    def __init__(self, scene: sapien.Scene, dataset_dir: str = DATASET_DIR):
+        self.scene = scene
+        self.dataset_dir = dataset_dir
+        self.entries: List[Tuple[sapien.ActorBase, ReceptacleSpec, float]] = []
+
+    def wrap(self) -> _ReceptacleScene:
+        return _ReceptacleScene(self.scene, self)
+
+    def finish(self) -> ReceptacleIndex:
+        index = ReceptacleIndex(self.entries)
+        self.entries = []
+        return index
+
+
+def build_with_receptacles(engine: sapien.Engine,
+                           build: Callable[..., sapien.Scene] = build_scene
+                           ) -> Tuple[sapien.Scene, ReceptacleIndex]:
+    """
+    Build a scene together with its receptacle index. build is called as
+    build(engine, scene=...), like build_scene and build_layout.
+    """
+    scene = engine.create_scene()
+    scene.set_timestep(1 / 100.0)
+    recorder = ReceptacleRecorder(scene)
+    build(engine, scene=recorder.wrap())
+    return scene, recorder.finish()
+
+
+if __name__ == '__main__':
+    # Usage: python receptacles.py [count]
+    # Samples placement poses over every receptacle of FRL apartment 0 and
+    # marks a few hundred of them with small spheres.
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    # Set up engine and renderer
+    engine = sapien.Engine()
+    renderer = sapien.SapienRenderer()
+    engine.set_renderer(renderer)
+
+    scene, receptacles = build_with_receptacles(engine)
+    start = time.perf_counter()
+    positions, quaternions, chosen = receptacles.sample(count, margin=0.05)
+    print("{} receptacles, {} poses in {:.1f} ms".format(
+        len(receptacles), count, (time.perf_counter() - start) * 1000))
+    for index, samples in zip(*np.unique(chosen, return_counts=True)):
+        print("{}: {}".format(receptacles.names[index], samples))
+
+    builder = scene.create_actor_builder()
+    for position in positions[:500]:
+        builder.add_sphere_visual(pose=sapien.Pose(position), radius=0.01, color=[1, 0, 0])
+    builder.build_static(name='placements')
+
+    # Viewer
+    viewer = Viewer(renderer, resolutions=(1920, 1080))
+    viewer.set_scene(scene)
+    viewer.set_camera_xyz(x=-2.0, y=0, z=1.5)
+
+    while not viewer.closed:
+        scene.step()
+        scene.update_render()
+        viewer.render()
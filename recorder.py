@@ -0,0 +1,313 @@
+import json
+import mmap
+import struct
+import sys
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Deque, Dict, List, Optional, Tuple
+
+import sapien.core as sapien
+from sapien.utils import Viewer
+
+import numpy as np
+
+_MAGIC = b'SAPTRJ01'
+# Offsets of the metadata and the chunk index, chunk count, magic
+_TRAILER = struct.Struct('<QQQ8s')
+
+
+def _dynamic_actors(scene: sapien.Scene) -> List[sapien.Actor]:
+    return [actor for actor in scene.get_all_actors() if not isinstance(actor, sapien.ActorStatic)]
+
+
+def _encode(block: np.ndarray, level: int) -> bytes:
+    """
+    Compress a (rows, width) float32 block. Each row is XORed with the one
+    before and the bytes are split into planes, so the many values that
+    barely change between steps compress to almost nothing. Lossless, so
+    decoded values are bit-exact.
+    """
+    if level == 0:
+        return block.tobytes()
+    bits = block.view(np.uint32)
+    delta = bits.copy()
+    delta[1:] ^= bits[:-1]
+    planes = delta.view(np.uint8).reshape(block.shape + (4,)).transpose(2, 0, 1)
+    return zlib.compress(np.ascontiguousarray(planes).tobytes(), level)
+
+
+def _decode(data, rows: int, width: int, level: int) -> np.ndarray:
+    if level == 0:
+        return np.frombuffer(data, dtype=np.float32).reshape(rows, width)
+    planes = np.frombuffer(zlib.decompress(data), dtype=np.uint8).reshape(4, rows, width)
+    delta = np.ascontiguousarray(planes.transpose(1, 2, 0)).view(np.uint32).reshape(rows, width)
+    return np.bitwise_xor.accumulate(delta, axis=0).view(np.float32)
+
+
+class TrajectoryRecorder:
+    """
+    Writes the state of a scene at every physics step to a chunked columnar
+    file. Columns:
+        robot_qpos, robot_qvel, robot_drive_target, robot_qf: of the robot,
+            if given; qf is the joint force applied at that step, e.g. the
+            passive force
+        articulation_state: Articulation.pack() of every articulation
+        actor_state: Actor.pack() of every dynamic actor, pose and velocity
+
+    Steps are buffered in chunks of chunk_size rows. Full chunks are
+    compressed on a background thread, so record() only copies the state
+    into preallocated arrays. Pass record as SimulationRunner's on_substep,
+    or call it before every scene.step().
+    """
+
+    def __init__(self, path: str, scene: sapien.Scene, robot: Optional[sapien.Articulation] = None,
+                 chunk_size: int = 256, level: int = 1):
+        self.path = path
+        self.robot = robot
+        self.chunk_size = chunk_size
+        self.level = level
+        self.articulations = scene.get_all_articulations()
+        self.actors = _dynamic_actors(scene)
+
+        articulation_sizes = [len(entity.pack()) for entity in self.articulations]
+        actor_sizes = [len(entity.pack()) for entity in self.actors]
+        self.columns: List[Tuple[str, int]] = []
+        if robot is not None:
+            self.columns += [('robot_qpos', robot.dof), ('robot_qvel', robot.dof),
+                             ('robot_drive_target', robot.dof), ('robot_qf', robot.dof)]
+        self.columns += [('articulation_state', sum(articulation_sizes)),
+                         ('actor_state', sum(actor_sizes))]
+        self.meta = {
+            'columns': self.columns,
+            'chunk_size': chunk_size,
+            'level': level,
+            'timestep': scene.get_timestep(),
+            'articulations': [entity.get_name() for entity in self.articulations],
+            'articulation_sizes': articulation_sizes,
+            'actors': [entity.get_name() for entity in self.actors],
+            'actor_sizes': actor_sizes,
+        }
+        if robot is not None:
+            self.meta['robot'] = {
+                'name': robot.get_name(),
+                'dof': robot.dof,
+                'joints': [joint.get_name() for joint in robot.get_active_joints()],
+            }
+
+        self.steps = 0
+        self._file = open(path, 'wb')
+        self._file.write(_MAGIC)
+        self._index: List[List[int]] = []
+        self._pool = ThreadPoolExecutor(1)
+        self._pending: Deque[Tuple[int, Future]] = deque()
+        self._new_chunk()
+
+    def _new_chunk(self):
+        self._buffers = [np.empty((self.chunk_size, width), dtype=np.float32) for _, width in self.columns]
+        self._rows = 0
+
+    def record(self, runner=None):
+        """
+        Append the current state as the next step.
+        """
+        row = self._rows
+        buffers = iter(self._buffers)
+        if self.robot is not None:
+            next(buffers)[row] = self.robot.get_qpos()
+            next(buffers)[row] = self.robot.get_qvel()
+            next(buffers)[row] = self.robot.get_drive_target()
+            next(buffers)[row] = self.robot.get_qf()
+        # pack() returns lists, and one flat list converts much faster than many arrays
+        for entities in (self.articulations, self.actors):
+            values = []
+            for entity in entities:
+                values += entity.pack()
+            next(buffers)[row] = values
+        self._rows += 1
+        self.steps += 1
+        if self._rows == self.chunk_size:
+            self._flush()
+
+    def _flush(self):
+        if self._rows == 0:
+            return
+        blocks = [buffer[:self._rows] for buffer in self._buffers]
+        future = self._pool.submit(lambda: [_encode(block, self.level) for block in blocks])
+        self._pending.append((self._rows, future))
+        self._new_chunk()
+        # Write finished chunks in order without waiting on the one just queued
+        while self._pending and (self._pending[0][1].done() or len(self._pending) > 2):
+            self._write(*self._pending.popleft())
+
+    def _write(self, rows: int, future: Future):
+        blobs = future.result()
+        self._index.append([self._file.tell(), rows] + [len(blob) for blob in blobs])
+        for blob in blobs:
+            self._file.write(blob)
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._flush()
+        while self._pending:
+            self._write(*self._pending.popleft())
+        self._pool.shutdown()
+        self.meta['steps'] = self.steps
+        meta_offset = self._file.tell()
+        self._file.write(json.dumps(self.meta).encode())
+        index_offset = self._file.tell()
+        self._file.write(np.array(self._index, dtype=np.uint64).reshape(-1, 2 + len(self.columns)).tobytes())
+        self._file.write(_TRAILER.pack(meta_offset, index_offset, len(self._index), _MAGIC))
+        self._file.close()
+
+    def __enter__(self) -> 'TrajectoryRecorder':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class TrajectoryReader:
+    """
+    Memory-mapped view of a recorded trajectory. Any step is found in O(1)
+    from the chunk index; only its chunk is decompressed, and the last
+    decoded chunk is kept so sequential reads decode each chunk once.
+    Uncompressed files (level=0) are read without any copy.
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        meta_offset, index_offset, chunks, magic = _TRAILER.unpack_from(
+            self._map, len(self._map) - _TRAILER.size)
+        if magic != _MAGIC or self._map[:len(_MAGIC)] != _MAGIC:
+            raise ValueError("{} is not a trajectory file".format(path))
+        self.meta = json.loads(self._map[meta_offset:index_offset].decode())
+        self.columns = [(name, width) for name, width in self.meta['columns']]
+        self.chunk_size = self.meta['chunk_size']
+        self.index = np.frombuffer(self._map, dtype=np.uint64, count=chunks * (2 + len(self.columns)),
+                                   offset=index_offset).reshape(chunks, -1).astype(np.int64)
+        self._cached: Tuple[int, Optional[Dict[str, np.ndarray]]] = (-1, None)
+
+    def __len__(self) -> int:
+        return self.meta['steps']
+
+    def chunk(self, index: int) -> Dict[str, np.ndarray]:
+        """
+        All columns of one chunk, as (rows, width) arrays.
+        """
+        if self._cached[0] == index:
+            return self._cached[1]
+        offset, rows = self.index[index, :2]
+        data = {}
+        for (name, width), size in zip(self.columns, self.index[index, 2:]):
+            data[name] = _decode(memoryview(self._map)[offset:offset + size], rows, width, self.meta['level'])
+            offset += size
+        self._cached = (index, data)
+        return data
+
+    def __getitem__(self, step: int) -> Dict[str, np.ndarray]:
+        if step < 0:
+            step += len(self)
+        if not 0 <= step < len(self):
+            raise IndexError("step {} out of range for {} steps".format(step, len(self)))
+        chunk = self.chunk(step // self.chunk_size)
+        row = step % self.chunk_size
+        return {name: values[row] for name, values in chunk.items()}
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        One column over the whole trajectory, e.g. robot_qpos for training.
+        """
+        return np.concatenate([self.chunk(i)[name] for i in range(len(self.index))])
+
+    def close(self):
+        self._cached = (-1, None)
+        self.index = None
+        self._map.close()
+        self._file.close()
+
+
+class TrajectoryPlayer:
+    """
+    Restores recorded steps into a scene built the same way as the recorded
+    one. States go back through Articulation.unpack and Actor.unpack, which
+    take exactly the values pack() produced, so a restored step matches the
+    recording bit for bit.
+
+    pack() holds no drive targets, so the recorded robot's drive targets and
+    joint forces are restored as well; stepping on from a restored step then
+    follows the recording. The robot is found by its recorded name unless
+    given.
+    """
+
+    def __init__(self, reader: TrajectoryReader, scene: sapien.Scene,
+                 robot: Optional[sapien.Articulation] = None):
+        self.reader = reader
+        self.articulations = scene.get_all_articulations()
+        self.actors = _dynamic_actors(scene)
+        names = ([entity.get_name() for entity in self.articulations],
+                 [entity.get_name() for entity in self.actors])
+        if names != (reader.meta['articulations'], reader.meta['actors']):
+            raise ValueError("The scene does not match the recorded one")
+        self._articulation_offsets = np.cumsum([0] + reader.meta['articulation_sizes'])
+        self._actor_offsets = np.cumsum([0] + reader.meta['actor_sizes'])
+
+        self.robot = robot
+        meta = reader.meta.get('robot')
+        if meta is not None:
+            if robot is None:
+                robots = [entity for entity in self.articulations if entity.get_name() == meta['name']]
+                if not robots:
+                    raise ValueError("The scene has no robot named {}".format(meta['name']))
+                self.robot = robots[0]
+            if [joint.get_name() for joint in self.robot.get_active_joints()] != meta['joints']:
+                raise ValueError("The robot does not match the recorded one")
+        elif robot is not None:
+            raise ValueError("The trajectory was recorded without a robot")
+
+    def restore(self, step: int):
+        state = self.reader[step]
+        for entities, offsets, values in (
+                (self.articulations, self._articulation_offsets, state['articulation_state']),
+                (self.actors, self._actor_offsets, state['actor_state'])):
+            for entity, start, end in zip(entities, offsets[:-1], offsets[1:]):
+                entity.unpack(values[start:end])
+        if self.robot is not None:
+            self.robot.set_drive_target(state['robot_drive_target'])
+            self.robot.set_qf(state['robot_qf'])
+
+
+if __name__ == '__main__':
+    # Usage: python recorder.py trajectory.bin [start_step]
+    # Plays back a trajectory recorded with python demo.py --record trajectory.bin
+    from benchmark import ROBOT_POSE, ROBOT_URDF
+    from frl_apt_0 import build_scene
+
+    reader = TrajectoryReader(sys.argv[1])
+    start = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+
+    # Set up engine and renderer
+    engine = sapien.Engine()
+    renderer = sapien.SapienRenderer()
+    engine.set_renderer(renderer)
+
+    scene = build_scene(engine)
+    loader = scene.create_urdf_loader()
+    loader.fix_root_link = True
+    robot = loader.load(ROBOT_URDF)
+    robot.set_root_pose(ROBOT_POSE)
+    player = TrajectoryPlayer(reader, scene, robot)
+
+    # Viewer
+    viewer = Viewer(renderer, resolutions=(1920, 1080))
+    viewer.set_scene(scene)
+    viewer.set_camera_xyz(x=-2.0, y=0, z=1.5)
+
+    step = start
+    while not viewer.closed:
+        player.restore(step)
+        step = (step + 1) % len(reader)
+        scene.update_render()
+        viewer.render()
@@ -0,0 +1,296 @@
+import copy
+import glob
+import hashlib
+import os
+import sys
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cv2
+import sapien.core as sapien
+
+import numpy as np
+
+from frl_apt_0 import build_scene
+from mesh_cache import CACHE_DIR, file_digest, resolve
+from mesh_io import ARRAY_BUFFER, ELEMENT_ARRAY_BUFFER, GlbWriter, read_accessor, read_glb, write_glb
+from scene_wrapper import ActorBuilderWrapper, SceneWrapper, URDFLoaderWrapper
+
+LOD_DIR = os.path.join(CACHE_DIR, "render_lod")
+MAX_LEVEL = 3
+# Their meshes are not in accessors, so there is nothing to decimate
+_COMPRESSION_EXTENSIONS = {"KHR_draco_mesh_compression", "EXT_meshopt_compression"}
+
+
+def grid_resolution(level: int) -> int:
+    """
+    Cells along the bounding box diagonal of a primitive at a LOD level.
+    """
+    return 1 << (8 - level)
+
+
+def cluster_vertices(positions: np.ndarray, normals: Optional[np.ndarray],
+                     triangles: np.ndarray, cell: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Vertex clustering decimation. Vertices in the same grid cell that face the
+    same dominant direction are merged into their mean position, and triangles
+    that collapse are dropped.
+
+    Returns the merged positions, the index of an original vertex whose other
+    attributes each merged vertex takes, and the new triangles.
+    """
+    keys = np.floor((positions - positions.min(0)) / cell).astype(np.int64)
+    if normals is not None:
+        axis = np.abs(normals).argmax(1)
+        side = normals[np.arange(len(normals)), axis] > 0
+        keys = np.concatenate([keys, (axis * 2 + side)[:, None]], axis=1)
+    _, first, cluster = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    cluster = cluster.reshape(-1)
+
+    triangles = cluster[triangles]
+    a, b, c = triangles.T
+    triangles = triangles[(a != b) & (b != c) & (a != c)]
+    # Drop clusters no triangle uses any more
+    used, triangles = np.unique(triangles, return_inverse=True)
+    triangles = triangles.reshape(-1, 3)
+
+    sums = np.zeros((len(first), 3))
+    np.add.at(sums, cluster, positions)
+    means = sums / np.bincount(cluster, minlength=len(first))[:, None]
+    return means[used].astype(np.float32), first[used], triangles
+
+
+def downscale_image(data: bytes, level: int, min_size: int = 8) -> bytes:
+    """
+    Halve a PNG or JPEG image level times, stopping at min_size pixels.
+    """
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+    if image is None:
+        return data
+    height, width = image.shape[:2]
+    factor = 1 << level
+    size = (max(width // factor, min(width, min_size)), max(height // factor, min(height, min_size)))
+    if size == (width, height):
+        return data
+    image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    ok, encoded = cv2.imencode('.png', image)
+    return encoded.tobytes() if ok else data
+
+
+def simplify_glb(source: str, target: str, level: int):
+    """
+    Write a LOD of a glb file with decimated meshes and downscaled textures.
+    Materials, nodes and everything else are kept as they are: skins,
+    animations and primitives other than triangle lists are copied through,
+    and morph targets are decimated along with the vertex attributes.
+    Raises ValueError for meshes stored with a compression extension.
+    """
+    gltf, binary = read_glb(source)
+    compressed = set(gltf.get("extensionsUsed", [])) & _COMPRESSION_EXTENSIONS
+    if compressed:
+        raise ValueError("{} uses {}".format(source, ", ".join(sorted(compressed))))
+    lod = copy.deepcopy(gltf)
+    writer = GlbWriter(lod)
+    copied: Dict[int, int] = {}
+
+    def copy_accessor(index: int) -> int:
+        if index not in copied:
+            copied[index] = writer.copy_accessor(gltf, binary, index)
+        return copied[index]
+
+    for skin in lod.get("skins", []):
+        if "inverseBindMatrices" in skin:
+            skin["inverseBindMatrices"] = copy_accessor(skin["inverseBindMatrices"])
+    for animation in lod.get("animations", []):
+        for sampler in animation["samplers"]:
+            sampler["input"] = copy_accessor(sampler["input"])
+            sampler["output"] = copy_accessor(sampler["output"])
+
+    for mesh, lod_mesh in zip(gltf.get("meshes", []), lod.get("meshes", [])):
+        for primitive, lod_primitive in zip(mesh["primitives"], lod_mesh["primitives"]):
+            if primitive.get("mode", 4) != 4:
+                lod_primitive["attributes"] = {
+                    name: copy_accessor(index) for name, index in primitive["attributes"].items()}
+                if "indices" in primitive:
+                    lod_primitive["indices"] = copy_accessor(primitive["indices"])
+                lod_primitive["targets"] = [{name: copy_accessor(index) for name, index in target.items()}
+                                            for target in primitive.get("targets", [])]
+                if not lod_primitive["targets"]:
+                    del lod_primitive["targets"]
+                continue
+
+            # Integer attributes such as JOINTS_0 keep their component type
+            attributes = {name: read_accessor(gltf, binary, index)
+                          for name, index in primitive["attributes"].items()}
+            targets = [{name: read_accessor(gltf, binary, index).astype(np.float32)
+                        for name, index in target.items()} for target in primitive.get("targets", [])]
+            positions = attributes["POSITION"].astype(np.float32)
+            if "indices" in primitive:
+                triangles = read_accessor(gltf, binary, primitive["indices"]).reshape(-1, 3)
+            else:
+                triangles = np.arange(len(positions)).reshape(-1, 3)
+
+            if level > 0 and len(positions) > 0:
+                diagonal = np.linalg.norm(positions.max(0) - positions.min(0))
+                cell = max(diagonal / grid_resolution(level), 1e-6)
+                normals = attributes["NORMAL"].astype(np.float32) if "NORMAL" in attributes else None
+                positions, source_index, triangles = cluster_vertices(
+                    positions, normals, triangles.astype(np.int64), cell)
+                attributes = {name: values[source_index] for name, values in attributes.items()}
+                targets = [{name: values[source_index] for name, values in target.items()}
+                           for target in targets]
+            attributes["POSITION"] = positions
+
+            lod_primitive["attributes"] = {
+                name: writer.accessor(values, ARRAY_BUFFER, bounds=name == "POSITION")
+                for name, values in attributes.items()
+            }
+            if targets:
+                lod_primitive["targets"] = [{
+                    name: writer.accessor(values, ARRAY_BUFFER, bounds=name == "POSITION")
+                    for name, values in target.items()} for target in targets]
+            index_type = np.uint16 if len(positions) < (1 << 16) else np.uint32
+            lod_primitive["indices"] = writer.accessor(
+                triangles.reshape(-1).astype(index_type), ELEMENT_ARRAY_BUFFER)
+
+    for image in lod.get("images", []):
+        if "bufferView" not in image:
+            continue
+        view = gltf["bufferViews"][image["bufferView"]]
+        offset = view.get("byteOffset", 0)
+        data = downscale_image(binary[offset:offset + view["byteLength"]], level)
+        if data[:4] == b'\x89PNG':
+            image["mimeType"] = "image/png"
+        image["bufferView"] = writer.view(data)
+
+    data = writer.binary()
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    write_glb(target, lod, data)
+
+
+def lod_path(filename: str, level: int, cache_dir: str = LOD_DIR) -> str:
+    """
+    Path of a visual mesh at a LOD level, created on first use. Level 0,
+    files that are not glb and glb files simplify_glb cannot rewrite are
+    returned unchanged.
+    """
+    if level <= 0 or not filename.lower().endswith('.glb') or not os.path.exists(filename):
+        return filename
+    level = min(level, MAX_LEVEL)
+    target = os.path.join(cache_dir, "{}.l{}.glb".format(file_digest(filename), level))
+    if not os.path.exists(target):
+        try:
+            simplify_glb(resolve(filename), target, level)
+        except (ValueError, NotImplementedError):
+            return filename
+    return target
+
+
+def lod_urdf(urdf: str, level: int, cache_dir: str = LOD_DIR) -> str:
+    """
+    Copy of a URDF whose visual meshes point at their LODs. Collision meshes
+    point at the original files, which often are the same glbs.
+    """
+    if level <= 0:
+        return urdf
+    level = min(level, MAX_LEVEL)
+    urdf = resolve(urdf)
+    base = os.path.dirname(urdf)
+    tree = ET.parse(urdf)
+    for element in tree.getroot().iter():
+        if element.tag not in ("visual", "collision"):
+            continue
+        for mesh in element.iter("mesh"):
+            filename = mesh.get("filename", '')
+            if filename.startswith("package://"):
+                filename = filename[len("package://"):]
+            filename = resolve(os.path.join(base, filename))
+            mesh.set("filename", lod_path(filename, level, cache_dir)
+                     if element.tag == "visual" else filename)
+
+    key = hashlib.sha1((file_digest(urdf) + urdf).encode()).hexdigest()
+    target = os.path.join(cache_dir, "urdf", "{}.l{}".format(key, level), os.path.basename(urdf))
+    if not os.path.exists(target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = "{}.tmp{}".format(target, os.getpid())
+        tree.write(tmp)
+        os.replace(tmp, target)
+    return target
+
+
+class _RenderLODActorBuilder(ActorBuilderWrapper):
+    def add(self, method: str, args: tuple, kwargs: dict):
+        if method == 'add_visual_from_file':
+            if args:
+                args = (lod_path(args[0], self._owner),) + args[1:]
+            else:
+                kwargs = dict(kwargs, filename=lod_path(kwargs['filename'], self._owner))
+        super().add(method, args, kwargs)
+
+
+class _RenderLODURDFLoader(URDFLoaderWrapper):
+    def load_articulation(self, filename: str, args: tuple, kwargs: dict) -> sapien.Articulation:
+        return super().load_articulation(lod_urdf(filename, self._owner), args, kwargs)
+
+
+class _RenderLODScene(SceneWrapper):
+    """
+    Scene wrapper whose owner is the LOD level.
+    """
+    actor_builder_class = _RenderLODActorBuilder
+    urdf_loader_class = _RenderLODURDFLoader
+
+
+def build_with_render_lod(engine: sapien.Engine,
+                          build: Callable[..., sapien.Scene] = build_scene,
+                          level: int = 1) -> sapien.Scene:
+    """
+    Build a scene with every visual mesh, including those of URDF
+    articulations, replaced by its LOD. build is called as
+    build(engine, scene=...), like build_scene and build_layout.
+    """
+    scene = engine.create_scene()
+    scene.set_timestep(1 / 100.0)
+    build(engine, scene=_RenderLODScene(scene, level))
+    return scene
+
+
+def dataset_visuals(dataset_dir: str) -> List[str]:
+    """
+    Every visual glb of replica_cad/objects and replica_cad/urdf.
+    """
+    files = glob.glob(os.path.join(dataset_dir, "objects", "*.glb"))
+    for urdf in glob.glob(os.path.join(dataset_dir, "urdf", "*", "*.urdf")):
+        for visual in ET.parse(urdf).getroot().iter("visual"):
+            for mesh in visual.iter("mesh"):
+                files.append(os.path.join(os.path.dirname(urdf), mesh.get("filename", '')))
+    return sorted({resolve(f) for f in files if os.path.exists(f)})
+
+
+def _build_lod(filename: str, level: int) -> Tuple[int, int]:
+    return os.path.getsize(filename), os.path.getsize(lod_path(filename, level))
+
+
+def build_lod_cache(dataset_dir: str, levels: List[int],
+                    workers: Optional[int] = None) -> Dict[int, Tuple[int, int]]:
+    """
+    Create the LODs of every visual of the dataset in parallel. Returns the
+    total source and LOD size in bytes per level.
+    """
+    files = dataset_visuals(dataset_dir)
+    sizes = {}
+    with ProcessPoolExecutor(workers) as pool:
+        for level in levels:
+            results = list(pool.map(_build_lod, files, [level] * len(files)))
+            sizes[level] = (sum(s for s, _ in results), sum(l for _, l in results))
+    return sizes
+
+
+if __name__ == '__main__':
+    # Usage: python render_lod.py [level ...]
+    # Creates the LOD cache of every object and URDF visual.
+    dataset_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "replica_cad")
+    levels = [int(level) for level in sys.argv[1:]] or list(range(1, MAX_LEVEL + 1))
+    for level, (source, lod) in build_lod_cache(dataset_dir, levels).items():
+        print("level {}: {:.1f} MB -> {:.1f} MB".format(level, source / 2 ** 20, lod / 2 ** 20))
@@ -0,0 +1,295 @@
+import argparse
+import multiprocessing as mp
+import os
+import time
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import sapien.core as sapien
+
+import numpy as np
+
+from benchmark import load_robot
+from frl_apt_0 import build_scene
+from profiling import scope
+
+# Command codes, sent as single bytes so the pipes never pickle anything
+_STEP = b's'
+_RESET = b'r'
+_CLOSE = b'c'
+_DONE = b'd'
+
+CAMERA_POSE = sapien.Pose([-2.0, 0, 1.5])
+
+
+def _entities(scene: sapien.Scene) -> List:
+    return scene.get_all_actors() + scene.get_all_articulations()
+
+
+class _Env:
+    """
+    One apartment inside a worker process, with its flat state layout.
+    """
+
+    def __init__(self, engine: sapien.Engine, build: Callable[..., sapien.Scene], robot: bool,
+                 camera: Optional[Tuple[int, int]]):
+        self.scene = build(engine)
+        self.robot = load_robot(self.scene) if robot else None
+        self.camera = None
+        if camera is not None:
+            self.camera = self.scene.add_camera('camera', width=camera[0], height=camera[1],
+                                                fovy=1.0, near=0.05, far=100)
+            self.camera.set_pose(CAMERA_POSE)
+        self.entities = _entities(self.scene)
+        self.initial = self.pack()
+        if self.robot is not None:
+            # pack() holds no drive targets or joint forces
+            self.initial_drive_target = self.robot.get_drive_target()
+            self.initial_qf = self.robot.get_qf()
+        sizes = [len(entity.pack()) for entity in self.entities]
+        self.offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(int)
+
+    @property
+    def action_dim(self) -> int:
+        return 0 if self.robot is None else self.robot.dof
+
+    def pack(self) -> np.ndarray:
+        return np.concatenate([entity.pack() for entity in self.entities]).astype(np.float32)
+
+    def unpack(self, state: np.ndarray):
+        for entity, start, end in zip(self.entities, self.offsets[:-1], self.offsets[1:]):
+            entity.unpack(state[start:end])
+
+    def reset(self):
+        self.unpack(self.initial)
+        if self.robot is not None:
+            self.robot.set_drive_target(self.initial_drive_target)
+            self.robot.set_qf(self.initial_qf)
+
+    def step(self, action: np.ndarray, substeps: int):
+        if self.robot is not None:
+            self.robot.set_drive_target(action)
+        with scope('rollout/step'):
+            for _ in range(substeps):
+                # Hold the arm against gravity, as demo.py and benchmark do
+                if self.robot is not None:
+                    self.robot.set_qf(self.robot.compute_passive_force(
+                        gravity=True, coriolis_and_centrifugal=True))
+                self.scene.step()
+
+    def render(self, image: np.ndarray):
+        with scope('rollout/render'):
+            self.scene.update_render()
+            self.camera.take_picture()
+            color = self.camera.get_float_texture('Color')
+            np.multiply(np.clip(color, 0, 1), 255, out=image, casting='unsafe')
+
+
+def _attach(names: Dict[str, Tuple[str, tuple, str]]) -> Tuple[List[SharedMemory], Dict[str, np.ndarray]]:
+    memories, arrays = [], {}
+    for key, (name, shape, dtype) in names.items():
+        memory = SharedMemory(name=name)
+        memories.append(memory)
+        arrays[key] = np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+    return memories, arrays
+
+
+def _worker(conn, first: int, count: int, build: Callable[..., sapien.Scene], robot: bool,
+            substeps: int, camera: Optional[Tuple[int, int]]):
+    engine = sapien.Engine()
+    if camera is not None:
+        engine.set_renderer(sapien.SapienRenderer(offscreen_only=True))
+    envs = [_Env(engine, build, robot, camera) for _ in range(count)]
+
+    # One-off handshake: report the layout, then map the buffers the server allocated
+    conn.send((envs[0].initial.size, envs[0].action_dim))
+    memories, arrays = _attach(conn.recv())
+    rows = slice(first, first + count)
+    actions, states, resets = arrays['actions'][rows], arrays['states'][rows], arrays['resets'][rows]
+    images = arrays['images'][rows] if 'images' in arrays else None
+    for i, env in enumerate(envs):
+        states[i] = env.initial
+        if env.robot is not None:
+            actions[i] = env.robot.get_drive_target()
+    conn.send_bytes(_DONE)
+
+    try:
+        while True:
+            command = conn.recv_bytes()
+            if command == _CLOSE:
+                break
+            for i, env in enumerate(envs):
+                if command == _STEP:
+                    env.step(actions[i], substeps)
+                elif resets[i]:
+                    env.reset()
+                    if env.robot is not None:
+                        actions[i] = env.initial_drive_target
+                else:
+                    continue
+                states[i] = env.pack()
+                if images is not None:
+                    env.render(images[i])
+            conn.send_bytes(_DONE)
+    finally:
+        del actions, states, resets, images, arrays
+        for memory in memories:
+            memory.close()
+
+
+class RolloutServer:
+    """
+    Apartment environments stepped in parallel by a pool of worker processes.
+
+    Each worker builds envs_per_worker scenes once with build(engine) and
+    then serves step and reset commands. Actions, states and camera images
+    are exchanged through shared-memory arrays allocated by the server, and
+    commands are single bytes over a pipe, so nothing is pickled per step.
+
+    Write actions into server.actions, one row per environment, then call
+    step(). server.states holds the packed state of every actor and
+    articulation of each environment, and server.images its RGBA camera
+    image if camera=(width, height) is given. Actions are drive targets of
+    the mobile Panda loaded by benchmark.load_robot, whose passive forces
+    are applied before every substep as in demo.py; with robot=False there
+    are none. Workers are started with "spawn", so build must be picklable.
+    """
+
+    def __init__(self, num_workers: int, envs_per_worker: int = 1,
+                 build: Callable[..., sapien.Scene] = build_scene, robot: bool = True,
+                 substeps: int = 1, camera: Optional[Tuple[int, int]] = None):
+        self.num_envs = num_workers * envs_per_worker
+        context = mp.get_context('spawn')
+        self._conns = []
+        self._processes = []
+        for i in range(num_workers):
+            parent, child = context.Pipe()
+            process = context.Process(
+                target=_worker, daemon=True,
+                args=(child, i * envs_per_worker, envs_per_worker, build, robot, substeps, camera))
+            process.start()
+            child.close()
+            self._conns.append(parent)
+            self._processes.append(process)
+
+        layouts = {conn.recv() for conn in self._conns}
+        if len(layouts) != 1:
+            self.close()
+            raise RuntimeError("Workers built scenes with different state layouts: {}".format(layouts))
+        state_dim, action_dim = layouts.pop()
+
+        shapes = {
+            'actions': ((self.num_envs, action_dim), np.float32),
+            'states': ((self.num_envs, state_dim), np.float32),
+            'resets': ((self.num_envs,), np.uint8),
+        }
+        if camera is not None:
+            shapes['images'] = ((self.num_envs, camera[1], camera[0], 4), np.uint8)
+        self._memories: List[SharedMemory] = []
+        names = {}
+        for key, (shape, dtype) in shapes.items():
+            size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+            memory = SharedMemory(create=True, size=size)
+            self._memories.append(memory)
+            names[key] = (memory.name, shape, np.dtype(dtype).str)
+            setattr(self, key, np.ndarray(shape, dtype=dtype, buffer=memory.buf))
+        if camera is None:
+            self.images = None
+        self.resets[:] = 0
+        for conn in self._conns:
+            conn.send(names)
+        self._wait()
+
+    def _send(self, command: bytes):
+        for conn in self._conns:
+            conn.send_bytes(command)
+
+    def _wait(self):
+        for conn in self._conns:
+            try:
+                conn.recv_bytes()
+            except EOFError:
+                raise RuntimeError("A rollout worker exited unexpectedly") from None
+
+    def step_async(self, actions: Optional[np.ndarray] = None):
+        """
+        Start a step of every environment and return immediately.
+        """
+        if actions is not None:
+            self.actions[:] = actions
+        self._send(_STEP)
+
+    def step_wait(self) -> np.ndarray:
+        self._wait()
+        return self.states
+
+    def step(self, actions: Optional[np.ndarray] = None) -> np.ndarray:
+        self.step_async(actions)
+        return self.step_wait()
+
+    def reset(self, indices: Optional[Sequence[int]] = None) -> np.ndarray:
+        """
+        Restore environments (all by default) to their state after building,
+        including the robot's drive targets, which are also written back to
+        their rows of actions.
+        """
+        self.resets[:] = 0 if indices is not None else 1
+        if indices is not None:
+            self.resets[np.asarray(indices)] = 1
+        self._send(_RESET)
+        self._wait()
+        return self.states
+
+    def close(self):
+        for conn in self._conns:
+            try:
+                conn.send_bytes(_CLOSE)
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self._processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        for key in ('actions', 'states', 'resets', 'images'):
+            self.__dict__.pop(key, None)
+        for memory in getattr(self, '_memories', []):
+            try:
+                memory.close()
+            except BufferError:
+                # The caller still holds views of the buffer
+                pass
+            memory.unlink()
+        self._memories = []
+        self._conns, self._processes = [], []
+
+    def __enter__(self) -> 'RolloutServer':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+if __name__ == '__main__':
+    # Usage: python rollout_server.py [--workers 1 2 4] [--envs 1] [--steps 500]
+    # Measures total steps per second for each worker count, physics only by
+    # default.
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, nargs='+', default=None)
+    parser.add_argument('--envs', type=int, default=1, help="environments per worker")
+    parser.add_argument('--steps', type=int, default=500)
+    parser.add_argument('--camera', type=int, nargs=2, default=None, metavar=('WIDTH', 'HEIGHT'))
+    args = parser.parse_args()
+
+    workers = args.workers or sorted({1, 2, 4, os.cpu_count() or 1})
+    base = None
+    for count in workers:
+        with RolloutServer(count, args.envs, camera=args.camera) as server:
+            actions = server.actions.copy()
+            server.reset()
+            start = time.perf_counter()
+            for _ in range(args.steps):
+                server.step(actions)
+            rate = server.num_envs * args.steps / (time.perf_counter() - start)
+        base = base or rate / count
+        print("{} workers x {} envs: {:.0f} steps/s ({:.0%} of linear)".format(
+            count, args.envs, rate, rate / (base * count)))
@@ -0,0 +1,146 @@
+import sys
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import sapien.core as sapien
+from sapien.utils import Viewer
+
+from profiling import scope
+
+
+@dataclass
+class RunStats:
+    physics_steps: int = 0
+    control_steps: int = 0
+    frames: int = 0
+    sim_time: float = 0.0
+    wall_time: float = 0.0
+
+    @property
+    def real_time_factor(self) -> float:
+        return self.sim_time / self.wall_time if self.wall_time > 0 else 0.0
+
+    def __str__(self) -> str:
+        return "{:.1f} s simulated in {:.1f} s ({:.2f}x real time), {} physics steps, " \
+            "{} control steps, {} frames".format(
+                self.sim_time, self.wall_time, self.real_time_factor,
+                self.physics_steps, self.control_steps, self.frames)
+
+
+class SimulationRunner:
+    """
+    Simulation loop with physics, control and rendering at separate rates.
+
+    Every control step runs substeps physics steps, and every render_interval
+    control steps one frame is rendered. update_render is only called for
+    frames that are shown in the viewer or captured by on_render, so without
+    either the loop is bound by physics alone. render_interval=0 never renders.
+
+    Callbacks:
+        on_substep(runner): before every physics step, e.g. passive forces
+        on_control(runner): before every control step, e.g. policy actions
+        on_render(runner): after update_render, e.g. camera captures
+    """
+
+    def __init__(self, scene: sapien.Scene, substeps: int = 1, render_interval: int = 1,
+                 viewer: Optional[Viewer] = None,
+                 on_substep: Optional[Callable[['SimulationRunner'], None]] = None,
+                 on_control: Optional[Callable[['SimulationRunner'], None]] = None,
+                 on_render: Optional[Callable[['SimulationRunner'], None]] = None):
+        self.scene = scene
+        self.substeps = substeps
+        self.render_interval = render_interval
+        self.viewer = viewer
+        self.on_substep = on_substep
+        self.on_control = on_control
+        self.on_render = on_render
+        self.stats = RunStats()
+
+    @property
+    def timestep(self) -> float:
+        return self.scene.get_timestep()
+
+    @property
+    def control_frequency(self) -> float:
+        return 1.0 / (self.timestep * self.substeps)
+
+    @property
+    def render_frequency(self) -> float:
+        if self.render_interval <= 0:
+            return 0.0
+        return self.control_frequency / self.render_interval
+
+    @property
+    def renders(self) -> bool:
+        return self.render_interval > 0 and (
+            self.viewer is not None or self.on_render is not None)
+
+    @property
+    def closed(self) -> bool:
+        return self.viewer is not None and self.viewer.closed
+
+    def control_step(self):
+        if self.on_control is not None:
+            with scope('runner/on_control'):
+                self.on_control(self)
+        for _ in range(self.substeps):
+            if self.on_substep is not None:
+                with scope('runner/on_substep'):
+                    self.on_substep(self)
+            with scope('runner/scene_step'):
+                self.scene.step()
+        self.stats.physics_steps += self.substeps
+        self.stats.sim_time += self.timestep * self.substeps
+
+        if self.renders and self.stats.control_steps % self.render_interval == 0:
+            with scope('runner/update_render'):
+                self.scene.update_render()
+            if self.on_render is not None:
+                with scope('runner/on_render'):
+                    self.on_render(self)
+            if self.viewer is not None:
+                with scope('runner/viewer_render'):
+                    self.viewer.render()
+            self.stats.frames += 1
+        self.stats.control_steps += 1
+
+    def run(self, duration: Optional[float] = None, report_interval: float = 0.0) -> RunStats:
+        """
+        Run until duration seconds have been simulated or the viewer is closed.
+        With report_interval, print the stats every report_interval wall seconds.
+        """
+        start = time.perf_counter() - self.stats.wall_time
+        last_report = time.perf_counter()
+        end_time = None if duration is None else self.stats.sim_time + duration
+        while not self.closed and (end_time is None or self.stats.sim_time < end_time):
+            self.control_step()
+            now = time.perf_counter()
+            self.stats.wall_time = now - start
+            if report_interval > 0 and now - last_report >= report_interval:
+                print(self.stats)
+                last_report = now
+        return self.stats
+
+
+if __name__ == '__main__':
+    # Usage: python runner.py [substeps] [duration]
+    # Runs FRL apartment 0 with the mobile panda headless and reports the
+    # real-time factor.
+    from benchmark import load_robot
+    from frl_apt_0 import build_scene
+
+    substeps = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 10.0
+
+    engine = sapien.Engine()
+    scene = build_scene(engine)
+    robot = load_robot(scene)
+
+    def apply_passive_force(runner: SimulationRunner):
+        robot.set_qf(robot.compute_passive_force(
+            gravity=True, coriolis_and_centrifugal=True))
+
+    runner = SimulationRunner(scene, substeps=substeps, render_interval=0,
+                              on_substep=apply_passive_force)
+    print(runner.run(duration))
@@ -0,0 +1,470 @@
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import time
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import sapien.core as sapien
+from sapien.utils import Viewer
+
+import numpy as np
+
+from frl_apt_0 import build_scene
+from mesh_cache import CACHE_DIR, file_digest, resolve
+from scene_wrapper import ActorBuilderWrapper, SceneWrapper, URDFLoaderWrapper
+
+_MAGIC = b'SAPBDL01'
+_VERSION = 1
+# Offset and size of the JSON header, magic
+_TRAILER = struct.Struct('<QQ8s')
+_ALIGN = 64
+_DIGEST_NAME = re.compile(r'^[0-9a-f]{40}\.')
+# Scene calls replayed in order with the actors, lights only with a renderer
+_SCENE_CALLS = ('set_ambient_light', 'add_point_light', 'add_directional_light', 'add_spot_light')
+
+
+@dataclass
+class BundleStats:
+    actors: int = 0
+    articulations: int = 0
+    files: int = 0
+    blobs: int = 0
+    bytes: int = 0
+    deduplicated_bytes: int = 0
+
+
+def _blob_name(path: str) -> str:
+    """
+    Name of a file inside a bundle. Files of the collision and LOD caches
+    are already named after the SHA-1 of their source and keep that name,
+    so the semantic and receptacle lookups still recognise them.
+    """
+    path = resolve(path)
+    name = os.path.basename(path)
+    if _DIGEST_NAME.match(name):
+        return name
+    return file_digest(path) + os.path.splitext(path)[1]
+
+
+class _Encoder:
+    """
+    Turns builder call arguments into JSON. Files become blob names, poses
+    7-vectors and physical materials indices into the material table.
+    """
+
+    def __init__(self, recorder: 'BundleRecorder'):
+        self.recorder = recorder
+
+    def value(self, value):
+        if isinstance(value, sapien.Pose):
+            return {'pose': np.concatenate([value.p, value.q]).tolist()}
+        if isinstance(value, sapien.PhysicalMaterial):
+            return {'material': self.recorder.materials[id(value)][0]}
+        if isinstance(value, np.ndarray):
+            return value.tolist()
+        if isinstance(value, np.generic):
+            return value.item()
+        if isinstance(value, (list, tuple)):
+            return [self.value(item) for item in value]
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return value
+        raise TypeError("Cannot store {} in a scene bundle".format(type(value).__name__))
+
+    def call(self, method: str, args: tuple, kwargs: dict) -> list:
+        args = [self.value(arg) for arg in args]
+        kwargs = {key: self.value(value) for key, value in kwargs.items()}
+        if method.endswith('_from_file'):
+            # The file is the first argument, positional or not
+            if args:
+                args[0] = {'file': self.recorder.add_file(args[0])}
+            else:
+                kwargs['filename'] = {'file': self.recorder.add_file(kwargs['filename'])}
+        return [method, args, kwargs]
+
+
+def _decode(value, files: Dict[str, str], materials: List[sapien.PhysicalMaterial]):
+    if isinstance(value, list):
+        return [_decode(item, files, materials) for item in value]
+    if isinstance(value, dict):
+        if 'pose' in value:
+            return sapien.Pose(value['pose'][:3], value['pose'][3:])
+        if 'material' in value:
+            return materials[value['material']]
+        if 'file' in value:
+            return files[value['file']]
+    return value
+
+
+class _BundleActorBuilder(ActorBuilderWrapper):
+    def __init__(self, builder: sapien.ActorBuilder, recorder: 'BundleRecorder'):
+        super().__init__(builder, recorder)
+        self._calls = []
+
+    def add(self, method: str, args: tuple, kwargs: dict):
+        self._calls.append(self._owner.encoder.call(method, args, kwargs))
+        super().add(method, args, kwargs)
+
+    def build_actor(self, method: str, args: tuple, kwargs: dict) -> sapien.ActorBase:
+        actor = super().build_actor(method, args, kwargs)
+        self._owner.ops.append({'type': 'actor', 'kind': method, 'calls': self._calls})
+        self._owner.entities.append(actor)
+        return actor
+
+
+class _BundleURDFLoader(URDFLoaderWrapper):
+    def __init__(self, loader: sapien.URDFLoader, recorder: 'BundleRecorder'):
+        super().__init__(loader, recorder)
+        object.__setattr__(self, '_settings', {})
+
+    def __setattr__(self, name, value):
+        self._settings[name] = self._owner.encoder.value(value)
+        super().__setattr__(name, value)
+
+    def load_articulation(self, filename: str, args: tuple, kwargs: dict) -> sapien.Articulation:
+        articulation = super().load_articulation(filename, args, kwargs)
+        self._owner.ops.append({
+            'type': 'articulation', 'urdf': self._owner.add_urdf(filename),
+            'settings': dict(self._settings), 'kwargs': {
+                key: self._owner.encoder.value(value) for key, value in kwargs.items()}})
+        self._owner.entities.append(articulation)
+        return articulation
+
+
+class _BundleScene(SceneWrapper):
+    actor_builder_class = _BundleActorBuilder
+    urdf_loader_class = _BundleURDFLoader
+
+    def __getattr__(self, name):
+        attr = super().__getattr__(name)
+        if name not in _SCENE_CALLS:
+            return attr
+
+        def call(*args, **kwargs):
+            self._owner.ops.append({'type': 'scene', 'call': self._owner.encoder.call(name, args, kwargs)})
+            return attr(*args, **kwargs)
+        return call
+
+    def create_physical_material(self, *args) -> sapien.PhysicalMaterial:
+        material = self._scene.create_physical_material(*args)
+        materials = self._owner.materials
+        # Keep the material alive so its id stays unique
+        materials[id(material)] = (len(materials), [float(arg) for arg in args], material)
+        return material
+
+
+class BundleRecorder:
+    """
+    Records every actor, articulation, material and light a scene builder
+    creates, together with the files they load. The builder is given the
+    scene from wrap(), and write() stores the result as a bundle with the
+    poses each entity ended up at.
+    """
+
+    def __init__(self, scene: sapien.Scene):
+        self.scene = scene
+        self.encoder = _Encoder(self)
+        self.ops: List[dict] = []
+        self.entities: List = []
+        self.materials: Dict[int, Tuple[int, List[float], sapien.PhysicalMaterial]] = {}
+        self.files: Dict[str, str] = {}
+        self.urdfs: Dict[str, bytes] = {}
+
+    def wrap(self) -> _BundleScene:
+        return _BundleScene(self.scene, self)
+
+    def add_file(self, filename: str) -> str:
+        name = _blob_name(filename)
+        self.files[name] = resolve(filename)
+        return name
+
+    def add_urdf(self, filename: str) -> str:
+        """
+        Store a URDF with its mesh references pointing at the blob names of
+        the meshes, which are extracted into the same directory.
+        """
+        path = resolve(filename)
+        tree = ET.parse(path)
+        for mesh in tree.getroot().iter('mesh'):
+            mesh_file = mesh.get('filename', '')
+            if mesh_file.startswith('package://'):
+                mesh_file = mesh_file[len('package://'):]
+            mesh_path = os.path.join(os.path.dirname(path), mesh_file)
+            if os.path.exists(mesh_path):
+                mesh.set('filename', self.add_file(mesh_path))
+        data = ET.tostring(tree.getroot())
+        name = hashlib.sha1(data).hexdigest() + '.urdf'
+        self.urdfs[name] = data
+        return name
+
+    def write(self, path: str) -> BundleStats:
+        # Collision hulls SAPIEN computed during the build are packed too,
+        # so loading the bundle never recomputes them
+        for name, source in list(self.files.items()):
+            if os.path.exists(source + '.convex.stl'):
+                self.files[name + '.convex.stl'] = source + '.convex.stl'
+
+        poses, qpos = [], []
+        for op, entity in zip([op for op in self.ops if op['type'] != 'scene'], self.entities):
+            op['name'] = entity.get_name()
+            if op['type'] == 'actor':
+                pose = entity.get_pose()
+            else:
+                pose = entity.get_root_pose()
+                op['qpos'] = [len(qpos), entity.dof]
+                qpos.extend(entity.get_qpos())
+            poses.append(np.concatenate([pose.p, pose.q]))
+        tables = {
+            'poses': np.array(poses, dtype=np.float64).reshape(-1, 7),
+            'qpos': np.array(qpos, dtype=np.float64),
+        }
+
+        stats = BundleStats(
+            actors=sum(op['type'] == 'actor' for op in self.ops),
+            articulations=sum(op['type'] == 'articulation' for op in self.ops),
+            files=len(self.files) + len(self.urdfs))
+        blobs, stored = {}, {}
+        tmp = "{}.tmp{}".format(path, os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write(_MAGIC)
+
+            def align():
+                f.write(b'\0' * (-f.tell() % _ALIGN))
+
+            sources = [(name, source, None) for name, source in sorted(self.files.items())]
+            sources += [(name, None, data) for name, data in sorted(self.urdfs.items())]
+            for name, source, data in sources:
+                if data is None:
+                    with open(source, 'rb') as source_file:
+                        data = source_file.read()
+                digest = hashlib.sha1(data).digest()
+                stats.bytes += len(data)
+                if digest not in stored:
+                    align()
+                    stored[digest] = [f.tell(), len(data)]
+                    f.write(data)
+                    stats.deduplicated_bytes += len(data)
+                blobs[name] = stored[digest]
+            stats.blobs = len(stored)
+
+            table_index = {}
+            for name, table in tables.items():
+                align()
+                table_index[name] = [f.tell(), table.dtype.str, list(table.shape)]
+                f.write(table.tobytes())
+
+            header = json.dumps({
+                'version': _VERSION,
+                'timestep': self.scene.get_timestep(),
+                'materials': [args for _, args, _ in sorted(self.materials.values(), key=lambda m: m[0])],
+                'ops': self.ops,
+                'blobs': blobs,
+                'tables': table_index,
+            }).encode()
+            header_offset = f.tell()
+            f.write(header)
+            f.write(_TRAILER.pack(header_offset, len(header), _MAGIC))
+        os.replace(tmp, path)
+        return stats
+
+
+def compile_bundle(engine: sapien.Engine, path: str,
+                   build: Callable[..., sapien.Scene] = build_scene) -> BundleStats:
+    """
+    Build a scene once and write it as a bundle. build is called as
+    build(engine, scene=...), like build_scene and build_layout. The engine
+    needs a renderer for the bundle to contain visuals if build skips them
+    without one, as build_layout does.
+
+    Assets are packed as the files the build opened, not as decoded
+    buffers. Collision shapes and URDFs can only be loaded from files.
+    Visuals could be given as RenderMesh through add_visual_from_mesh, but
+    that needs the renderer at load time and loses the glb's materials and
+    textures, so visuals are files too.
+    """
+    scene = engine.create_scene()
+    scene.set_timestep(1 / 100.0)
+    recorder = BundleRecorder(scene)
+    build(engine, scene=recorder.wrap())
+    return recorder.write(path)
+
+
+class SceneBundle:
+    """
+    Memory-mapped scene bundle. The header and the pose tables are read in
+    place; files are copied out to a local directory by extract().
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        header_offset, header_size, magic = _TRAILER.unpack_from(self._map, len(self._map) - _TRAILER.size)
+        if magic != _MAGIC or self._map[:len(_MAGIC)] != _MAGIC:
+            raise ValueError("{} is not a scene bundle".format(path))
+        header = self._map[header_offset:header_offset + header_size]
+        self.header = json.loads(header.decode())
+        # Blob offsets are in the header, so its digest identifies the contents
+        self.digest = hashlib.sha1(header).hexdigest()
+        if self.header['version'] != _VERSION:
+            raise ValueError("{} is a version {} bundle, expected {}".format(
+                path, self.header['version'], _VERSION))
+
+    def table(self, name: str) -> np.ndarray:
+        offset, dtype, shape = self.header['tables'][name]
+        count = int(np.prod(shape))
+        return np.frombuffer(self._map, dtype=dtype, count=count, offset=offset).reshape(shape)
+
+    def extract(self, directory: str = os.path.join(CACHE_DIR, "bundle")) -> Dict[str, str]:
+        """
+        Write the files of the bundle into directory, skipping those already
+        there, and return the path of each. Names are content hashes, so
+        bundles share one directory. Missing files are read in one
+        sequential pass over the bundle.
+
+        Once a bundle is extracted a marker named after its digest is left
+        in directory. Later loads then only list the directory once to see
+        that every file is still there, instead of checking each one; if any
+        was removed, e.g. by a cache cleanup, the bundle is extracted again.
+        """
+        paths = {name: os.path.join(directory, name) for name in self.header['blobs']}
+        marker = os.path.join(directory, self.digest + '.extracted')
+        if os.path.exists(marker):
+            if set(self.header['blobs']).issubset(os.listdir(directory)):
+                return paths
+            os.remove(marker)
+        os.makedirs(directory, exist_ok=True)
+        missing = sorted((offset, size, name) for name, (offset, size) in self.header['blobs'].items()
+                         if not os.path.exists(paths[name]) or os.path.getsize(paths[name]) != size)
+        if missing and hasattr(self._map, 'madvise'):
+            self._map.madvise(mmap.MADV_SEQUENTIAL)
+        view = memoryview(self._map)
+        for offset, size, name in missing:
+            tmp = "{}.tmp{}".format(paths[name], os.getpid())
+            with open(tmp, 'wb') as f:
+                f.write(view[offset:offset + size])
+            os.replace(tmp, paths[name])
+        view.release()
+        open(marker, 'wb').close()
+        return paths
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+def build_bundle(engine: sapien.Engine, path: str, scene: sapien.Scene = None,
+                 directory: Optional[str] = None) -> sapien.Scene:
+    """
+    Build the scene stored in a bundle. Pass scene to add it to an existing
+    scene instead of creating a new one. Without a renderer, visuals and
+    lights are skipped.
+    """
+    bundle = SceneBundle(path)
+    files = bundle.extract() if directory is None else bundle.extract(directory)
+    header = bundle.header
+    if scene is None:
+        scene = engine.create_scene()
+        scene.set_timestep(header['timestep'])
+    visual = engine.get_renderer() is not None
+    materials = [scene.create_physical_material(*args) for args in header['materials']]
+    poses = bundle.table('poses').copy()
+    qpos = bundle.table('qpos').copy()
+    bundle.close()
+
+    def call(target, method: str, args: list, kwargs: dict):
+        getattr(target, method)(*_decode(args, files, materials), **{
+            key: _decode(value, files, materials) for key, value in kwargs.items()})
+
+    row = 0
+    for op in header['ops']:
+        if op['type'] == 'scene':
+            method = op['call'][0]
+            if visual or not method.endswith('_light'):
+                call(scene, *op['call'])
+            continue
+        pose = sapien.Pose(poses[row, :3], poses[row, 3:])
+        row += 1
+        if op['type'] == 'actor':
+            builder = scene.create_actor_builder()
+            for method, args, kwargs in op['calls']:
+                if visual or 'visual' not in method:
+                    call(builder, method, args, kwargs)
+            actor = getattr(builder, op['kind'])(name=op['name'])
+            actor.set_pose(pose)
+        else:
+            loader = scene.create_urdf_loader()
+            for name, value in op['settings'].items():
+                setattr(loader, name, _decode(value, files, materials))
+            articulation = loader.load(files[op['urdf']], **{
+                key: _decode(value, files, materials) for key, value in op['kwargs'].items()})
+            articulation.set_name(op['name'])
+            articulation.set_root_pose(pose)
+            start, dof = op['qpos']
+            articulation.set_qpos(qpos[start:start + dof])
+    return scene
+
+
+if __name__ == '__main__':
+    # Usage: python scene_bundle.py [frl_apt_0 | <layout name>] [out.bundle]
+    #        python scene_bundle.py scene.bundle
+    # Compiles FRL apartment 0 or a scene layout into a bundle, or opens a
+    # bundle in the viewer.
+    target = sys.argv[1] if len(sys.argv) > 1 else 'frl_apt_0'
+
+    # Set up engine and renderer
+    engine = sapien.Engine()
+    renderer = sapien.SapienRenderer()
+    engine.set_renderer(renderer)
+
+    baseline = None
+    if not target.endswith('.bundle'):
+        path = sys.argv[2] if len(sys.argv) > 2 else target + '.bundle'
+        build = build_scene
+        if target != 'frl_apt_0':
+            from scene_loader import build_layout, load_layout
+            layout = load_layout(target)
+            build = lambda engine, scene: build_layout(engine, layout, scene=scene)
+        stats = compile_bundle(engine, path, build)
+        print("{}: {} actors, {} articulations, {} files in {} blobs, {:.1f} MB ({:.1f} MB before deduplication)".format(
+            path, stats.actors, stats.articulations, stats.files, stats.blobs,
+            stats.deduplicated_bytes / 1e6, stats.bytes / 1e6))
+        target = path
+
+        # The compile above warmed the page cache and the collision cache,
+        # so this is the warm startup the bundle is compared against
+        start = time.perf_counter()
+        baseline_scene = engine.create_scene()
+        baseline_scene.set_timestep(1 / 100.0)
+        build(engine, scene=baseline_scene)
+        baseline = time.perf_counter() - start
+        del baseline_scene
+
+        # Extract once so the timing below is a warm start too
+        start = time.perf_counter()
+        bundle = SceneBundle(target)
+        bundle.extract()
+        bundle.close()
+        print("Extracted {} in {:.3f} s".format(target, time.perf_counter() - start))
+
+    start = time.perf_counter()
+    scene = build_bundle(engine, target)
+    elapsed = time.perf_counter() - start
+    print("Built {} in {:.3f} s".format(target, elapsed))
+    if baseline is not None:
+        print("Building from the dataset took {:.3f} s, {:.1f}x the bundle".format(baseline, baseline / elapsed))
+
+    # Viewer
+    viewer = Viewer(renderer, resolutions=(1920, 1080))
+    viewer.set_scene(scene)
+    viewer.set_camera_xyz(x=-2.0, y=0, z=1.5)
+
+    while not viewer.closed:
+        scene.step()
+        scene.update_render()
+        viewer.render()
@@ -0,0 +1,548 @@
+import glob
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+import sapien.core as sapien
+from sapien.utils import Viewer
+
+import numpy as np
+
+from collision_cache import convex_collision, nonconvex_collision
+from frl_apt_0 import r2s, r2s_batch
+from mesh_cache import file_digest, get_mesh_cache, resolve
+from prefetch import prefetch_layout
+from profiling import profiled_scene, scope
+from settle import SettleRecorder
+
+DATASET_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "replica_cad")
+
+
+@dataclass
+class StageSpec:
+    template: str
+    render_asset: str
+    collision_asset: str
+    translation: np.ndarray
+    rotation: np.ndarray
+    friction: float = 0.8
+    restitution: float = 0.0
+
+
+@dataclass
+class ObjectSpec:
+    name: str
+    template: str
+    render_asset: str
+    collision_asset: str
+    static: bool
+    translation: np.ndarray
+    rotation: np.ndarray
+    mass: float = 0.0
+    semantic_id: int = 0
+    use_bounding_box: bool = False
+
+
+@dataclass
+class ArticulationSpec:
+    name: str
+    template: str
+    urdf: str
+    translation: np.ndarray
+    rotation: np.ndarray
+    scale: float = 1.0
+    fixed_base: bool = True
+
+
+@dataclass
+class LightSpec:
+    position: np.ndarray
+    color: np.ndarray
+
+
+@dataclass
+class SceneLayout:
+    """
+    Fully resolved description of a ReplicaCAD scene instance.
+
+    Poses are kept in ReplicaCAD's original (Y-up) frame and all asset paths
+    are absolute, so building the layout only needs engine-side work.
+    """
+    name: str
+    stage: StageSpec
+    objects: List[ObjectSpec] = field(default_factory=list)
+    articulations: List[ArticulationSpec] = field(default_factory=list)
+    lights: List[LightSpec] = field(default_factory=list)
+    navmesh: str = ''
+
+
+@lru_cache(maxsize=None)
+def _read_json(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+@lru_cache(maxsize=None)
+def _urdf_index(dataset_dir: str) -> Dict[str, str]:
+    """
+    Map articulated object template names to URDF files. The "_dynamic"
+    variant is preferred when a template ships both, as in build_scene.
+    """
+    index = {}
+    for path in sorted(glob.glob(os.path.join(dataset_dir, "urdf", "*", "*.urdf"))):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        if stem.endswith("_dynamic"):
+            index[stem[:-len("_dynamic")]] = path
+        else:
+            index.setdefault(stem, path)
+    return index
+
+
+_CONFIG_DIRS = {"stage": "stages", "object": "objects", "lighting": "lighting"}
+
+
+def _config_path(dataset_dir: str, kind: str, template: str) -> str:
+    stem = template.split('/')[-1]
+    return os.path.join(dataset_dir, "configs", _CONFIG_DIRS[kind],
+                        "{}.{}_config.json".format(stem, kind))
+
+
+def _asset_path(config_path: str, asset: str) -> str:
+    return resolve(os.path.join(os.path.dirname(config_path), asset))
+
+
+@lru_cache(maxsize=None)
+def _asset_index(dataset_dir: str) -> Dict[str, str]:
+    index = {}
+    for config_path in sorted(glob.glob(os.path.join(dataset_dir, "configs", "objects", "*.json"))):
+        config = _read_json(config_path)
+        for key in ("render_asset", "collision_asset"):
+            if key not in config:
+                continue
+            asset = _asset_path(config_path, config[key])
+            if os.path.exists(asset):
+                index.setdefault(asset, config_path)
+                index.setdefault(file_digest(asset), config_path)
+    return index
+
+
+def object_config_of(filename: str, dataset_dir: str = DATASET_DIR) -> Optional[str]:
+    """
+    Object config whose render or collision asset a mesh file is. Copies
+    made by the collision and LOD caches are named after the SHA-1 of their
+    source, so they are found by that digest.
+    """
+    index = _asset_index(dataset_dir)
+    for key in (resolve(filename), os.path.basename(filename).split('.')[0]):
+        if key in index:
+            return index[key]
+    return None
+
+
+def list_layouts(dataset_dir: str = DATASET_DIR) -> List[str]:
+    paths = glob.glob(os.path.join(
+        dataset_dir, "configs", "scenes", "*.scene_instance.json"))
+    return sorted(os.path.basename(p).split('.')[0] for p in paths)
+
+
+def load_layout(name: str, dataset_dir: str = DATASET_DIR) -> SceneLayout:
+    """
+    Resolve and parse a scene_instance.json together with every stage, object,
+    lighting and URDF reference it makes. Each config file is read at most once
+    per process, no matter how many instances or layouts share it.
+    """
+    scene_path = os.path.join(
+        dataset_dir, "configs", "scenes", name + ".scene_instance.json")
+    instance = _read_json(scene_path)
+
+    stage_instance = instance["stage_instance"]
+    stage_path = _config_path(dataset_dir, "stage", stage_instance["template_name"])
+    stage_config = _read_json(stage_path)
+    stage_asset = _asset_path(stage_path, stage_config["render_asset"])
+    stage = StageSpec(
+        template=stage_instance["template_name"].split('/')[-1],
+        render_asset=stage_asset,
+        collision_asset=_asset_path(
+            stage_path, stage_config.get("collision_asset", stage_config["render_asset"])),
+        translation=np.array(stage_instance.get("translation", [0, 0, 0]), dtype=float),
+        rotation=np.array(stage_instance.get("rotation", [1, 0, 0, 0]), dtype=float),
+        friction=stage_config.get("friction_coefficient", 0.8),
+        restitution=stage_config.get("restitution_coefficient", 0.0),
+    )
+
+    objects = []
+    for obj in instance.get("object_instances", []):
+        template = obj["template_name"].split('/')[-1]
+        config_path = _config_path(dataset_dir, "object", template)
+        config = _read_json(config_path)
+        # Objects without a collision asset (books, pictures, rugs, ...) collide
+        # with their render mesh, the same as in build_scene.
+        collision_asset = config.get("collision_asset", config["render_asset"])
+        objects.append(ObjectSpec(
+            name=template,
+            template=template,
+            render_asset=_asset_path(config_path, config["render_asset"]),
+            collision_asset=_asset_path(config_path, collision_asset),
+            static=obj.get("motion_type", "DYNAMIC") == "STATIC",
+            translation=np.array(obj["translation"], dtype=float),
+            rotation=np.array(obj["rotation"], dtype=float),
+            mass=config.get("mass", 0.0),
+            semantic_id=config.get("semantic_id", 0),
+            use_bounding_box=config.get("use_bounding_box_for_collision", False),
+        ))
+
+    urdfs = _urdf_index(dataset_dir)
+    articulations = []
+    for art in instance.get("articulated_object_instances", []):
+        template = art["template_name"]
+        if template not in urdfs:
+            raise KeyError("No URDF found for articulated object '{}'".format(template))
+        articulations.append(ArticulationSpec(
+            name=template,
+            template=template,
+            urdf=urdfs[template],
+            translation=np.array(art["translation"], dtype=float),
+            rotation=np.array(art["rotation"], dtype=float),
+            scale=art.get("uniform_scale", 1.0),
+            fixed_base=art.get("fixed_base", True),
+        ))
+
+    lights = []
+    lighting = instance.get("default_lighting", '')
+    if lighting:
+        lighting_path = _config_path(dataset_dir, "lighting", lighting)
+        dataset_config = _read_json(
+            os.path.join(dataset_dir, "replicaCAD.scene_dataset_config.json"))
+        intensity_scale = dataset_config["light_setups"]["default_attributes"][
+            "positive_intensity_scale"]
+        for light in _read_json(lighting_path)["lights"].values():
+            # SAPIEN has no negative lights, which ReplicaCAD uses to darken corners
+            if light.get("type", "point") != "point" or light["intensity"] <= 0:
+                continue
+            lights.append(LightSpec(
+                position=np.array(light["position"], dtype=float),
+                color=np.array(light["color"], dtype=float) * light["intensity"] * intensity_scale,
+            ))
+
+    return SceneLayout(
+        name=name,
+        stage=stage,
+        objects=objects,
+        articulations=articulations,
+        lights=lights,
+        navmesh=instance.get("navmesh_instance", ''),
+    )
+
+
+def _lod_path(filename: str, level: int) -> str:
+    if level <= 0:
+        return filename
+    # Imported here since render_lod needs OpenCV, which only LODs use
+    from render_lod import lod_path
+    return lod_path(filename, level)
+
+
+def _lod_urdf(urdf: str, level: int) -> str:
+    if level <= 0:
+        return urdf
+    from render_lod import lod_urdf
+    return lod_urdf(urdf, level)
+
+
+def _build_stage(scene: sapien.Scene, stage: StageSpec, render_lod: int = 0,
+                 visual: bool = True) -> sapien.ActorStatic:
+    material = scene.create_physical_material(
+        stage.friction, stage.friction, stage.restitution)
+    builder = scene.create_actor_builder()
+    if visual:
+        builder.add_visual_from_file(filename=_lod_path(stage.render_asset, render_lod))
+    builder.add_nonconvex_collision_from_file(
+        filename=nonconvex_collision(stage.collision_asset), material=material)
+    actor = builder.build_static(name='stage')
+    actor.set_pose(r2s(sapien.Pose(stage.translation, stage.rotation)))
+    return actor
+
+
+def _sapien_poses(specs: List) -> List[sapien.Pose]:
+    """
+    Poses of object or articulation specs in SAPIEN's frame, converted in one batch.
+    """
+    if not specs:
+        return []
+    positions, quaternions = r2s_batch(np.stack([spec.translation for spec in specs]),
+                                       np.stack([spec.rotation for spec in specs]))
+    return [sapien.Pose(p, q) for p, q in zip(positions, quaternions)]
+
+
+def _build_object(scene: sapien.Scene, obj: ObjectSpec, pose: sapien.Pose,
+                  render_lod: int = 0, visual: bool = True) -> sapien.ActorBase:
+    builder = scene.create_actor_builder()
+    if visual:
+        builder.add_visual_from_file(filename=_lod_path(obj.render_asset, render_lod))
+    if obj.use_bounding_box:
+        # Box around the render mesh; only its bounds are kept
+        lower, upper = get_mesh_cache().bounds(obj.render_asset)
+        builder.add_box_collision(
+            pose=sapien.Pose((lower + upper) / 2), half_size=(upper - lower) / 2)
+    elif obj.static:
+        builder.add_nonconvex_collision_from_file(
+            filename=nonconvex_collision(obj.collision_asset))
+    else:
+        builder.add_collision_from_file(filename=convex_collision(obj.collision_asset))
+    if obj.static:
+        actor = builder.build_static(name=obj.name)
+    else:
+        actor = builder.build(name=obj.name)
+    actor.set_pose(pose)
+    return actor
+
+
+def _build_articulation(scene: sapien.Scene, art: ArticulationSpec,
+                        pose: sapien.Pose, render_lod: int = 0) -> sapien.Articulation:
+    loader = scene.create_urdf_loader()
+    loader.fix_root_link = art.fixed_base
+    loader.scale = art.scale
+    articulation = loader.load(_lod_urdf(art.urdf, render_lod))
+    articulation.set_name(art.name)
+    articulation.set_root_pose(pose)
+    return articulation
+
+
+def _add_lights(scene: sapien.Scene, lights: List[LightSpec]) -> List[sapien.PointLightEntity]:
+    if not lights:
+        return []
+    positions = r2s_batch(np.stack([light.position for light in lights]))
+    return [scene.add_point_light(position, light.color) for position, light in zip(positions, lights)]
+
+
+def build_layout(engine: sapien.Engine, layout: SceneLayout, lighting: bool = True,
+                 prefetch_workers: Optional[int] = None,
+                 scene: Optional[sapien.Scene] = None, render_lod: int = 0,
+                 settled: bool = False) -> sapien.Scene:
+    """
+    Build a SAPIEN scene from a layout returned by load_layout, or add the
+    layout to scene if one is given. render_lod picks the level of detail of
+    visual meshes and textures, 0 being the original assets.
+
+    Without a renderer attached to the engine, the build is physics-only:
+    visual assets are neither prefetched nor decoded, and no lights are added.
+
+    All assets are first prefetched in parallel with prefetch_workers threads
+    (one per core by default, 0 to skip), leaving only engine-side work for
+    the serial build below.
+
+    With settled, dynamic objects start at the rest poses stored by settle.py,
+    which are computed and cached on first use.
+    """
+    visual = engine.get_renderer() is not None
+    if prefetch_workers != 0:
+        with scope('build_layout/prefetch'):
+            prefetch_layout(layout, workers=prefetch_workers, visual=visual)
+
+    if scene is None:
+        scene = engine.create_scene()
+        scene.set_timestep(1 / 100.0)
+    recorder = SettleRecorder(scene) if settled else None
+    target = profiled_scene(recorder.wrap() if settled else scene, 'build_layout')
+
+    _build_stage(target, layout.stage, render_lod, visual)
+
+    target.set_ambient_light([0.5, 0.5, 0.5])
+    if lighting and visual:
+        _add_lights(target, layout.lights)
+
+    for obj, pose in zip(layout.objects, _sapien_poses(layout.objects)):
+        _build_object(target, obj, pose, render_lod, visual)
+
+    for art, pose in zip(layout.articulations, _sapien_poses(layout.articulations)):
+        # The URDF loader only loads visuals when the engine has a renderer
+        _build_articulation(target, art, pose, render_lod if visual else 0)
+
+    if settled:
+        with scope('build_layout/settle'):
+            recorder.finish()
+    return scene
+
+
+def build_scene_instance(engine: sapien.Engine, name: str, **kwargs) -> sapien.Scene:
+    return build_layout(engine, load_layout(name), **kwargs)
+
+
+@dataclass
+class SwitchStats:
+    reused: int = 0
+    added: int = 0
+    removed: int = 0
+    stage_rebuilt: bool = False
+    seconds: float = 0.0
+
+
+def _same_asset(a: str, b: str) -> bool:
+    if a == b:
+        return True
+    return os.path.exists(a) and os.path.exists(b) and file_digest(a) == file_digest(b)
+
+
+def _same_stage(a: StageSpec, b: StageSpec) -> bool:
+    return (_same_asset(a.render_asset, b.render_asset) and _same_asset(a.collision_asset, b.collision_asset)
+            and a.friction == b.friction and a.restitution == b.restitution)
+
+
+def _object_key(obj: ObjectSpec) -> tuple:
+    return obj.template, obj.static
+
+
+def _articulation_key(art: ArticulationSpec) -> tuple:
+    return art.template, art.urdf, art.scale, art.fixed_base
+
+
+def _light_table(lights: List[LightSpec]) -> np.ndarray:
+    return np.array([np.concatenate([light.position, light.color]) for light in lights]).reshape(-1, 6)
+
+
+class SceneSwitcher:
+    """
+    One scene that moves between layouts by building only what differs.
+
+    switch() keeps the stage if the new layout uses the same assets, and
+    keeps every object or articulation whose template, motion type, scale
+    and base also appear in the new layout, moving it to its new pose with
+    zero velocity. Poses are converted in one batch. Only the rest is
+    removed or built.
+
+    Reused entities keep their ids, so actor ids and build order differ
+    from a fresh build_layout of the same layout.
+    """
+
+    def __init__(self, engine: sapien.Engine, scene: sapien.Scene = None,
+                 lighting: bool = True, render_lod: int = 0):
+        if scene is None:
+            scene = engine.create_scene()
+            scene.set_timestep(1 / 100.0)
+        self.scene = scene
+        self.lighting = lighting
+        self.render_lod = render_lod
+        self.visual = engine.get_renderer() is not None
+        self.layout: Optional[SceneLayout] = None
+        self.stage: Optional[sapien.ActorStatic] = None
+        self.objects: List[Tuple[tuple, sapien.ActorBase]] = []
+        self.articulations: List[Tuple[tuple, sapien.Articulation]] = []
+        self.lights: List[sapien.PointLightEntity] = []
+
+    def _switch_entities(self, current: List[Tuple[tuple, object]], specs: List,
+                         key: Callable[[object], tuple], build: Callable, remove: Callable,
+                         repose: Callable, stats: SwitchStats) -> List[Tuple[tuple, object]]:
+        unused = defaultdict(list)
+        for k, entity in current:
+            unused[k].append(entity)
+        matched = []
+        for spec in specs:
+            k = key(spec)
+            matched.append(unused[k].pop(0) if unused[k] else None)
+        # Remove first so nothing new is built overlapping an old entity
+        for entities in unused.values():
+            for entity in entities:
+                remove(entity)
+                stats.removed += 1
+
+        entries = []
+        for spec, pose, entity in zip(specs, _sapien_poses(specs), matched):
+            if entity is None:
+                entity = build(spec, pose)
+                stats.added += 1
+            else:
+                repose(entity, pose)
+                stats.reused += 1
+            entries.append((key(spec), entity))
+        return entries
+
+    @staticmethod
+    def _repose_actor(actor: sapien.ActorBase, pose: sapien.Pose):
+        actor.set_pose(pose)
+        if isinstance(actor, sapien.Actor):
+            actor.set_velocity(np.zeros(3))
+            actor.set_angular_velocity(np.zeros(3))
+
+    @staticmethod
+    def _repose_articulation(articulation: sapien.Articulation, pose: sapien.Pose):
+        articulation.set_root_pose(pose)
+        articulation.set_qpos(np.zeros(articulation.dof))
+        articulation.set_qvel(np.zeros(articulation.dof))
+
+    def switch(self, layout: SceneLayout, prefetch_workers: Optional[int] = None) -> SwitchStats:
+        """
+        Turn the scene into layout. Assets are prefetched, as in
+        build_layout, only for the first layout.
+        """
+        start = time.perf_counter()
+        stats = SwitchStats()
+        scene = self.scene
+        with scope('scene_switch'):
+            if self.layout is None:
+                if prefetch_workers != 0:
+                    with scope('scene_switch/prefetch'):
+                        prefetch_layout(layout, workers=prefetch_workers, visual=self.visual)
+                scene.set_ambient_light([0.5, 0.5, 0.5])
+
+            if self.stage is not None and _same_stage(self.layout.stage, layout.stage):
+                self.stage.set_pose(r2s(sapien.Pose(layout.stage.translation, layout.stage.rotation)))
+            else:
+                if self.stage is not None:
+                    scene.remove_actor(self.stage)
+                self.stage = _build_stage(scene, layout.stage, self.render_lod, self.visual)
+                stats.stage_rebuilt = True
+
+            self.objects = self._switch_entities(
+                self.objects, layout.objects, _object_key,
+                lambda obj, pose: _build_object(scene, obj, pose, self.render_lod, self.visual),
+                scene.remove_actor, self._repose_actor, stats)
+            # The URDF loader only loads visuals when the engine has a renderer
+            self.articulations = self._switch_entities(
+                self.articulations, layout.articulations, _articulation_key,
+                lambda art, pose: _build_articulation(scene, art, pose, self.render_lod if self.visual else 0),
+                scene.remove_articulation, self._repose_articulation, stats)
+
+            if self.lighting and self.visual and (self.layout is None or not np.array_equal(
+                    _light_table(self.layout.lights), _light_table(layout.lights))):
+                for light in self.lights:
+                    scene.remove_light(light)
+                self.lights = _add_lights(scene, layout.lights)
+
+        self.layout = layout
+        stats.seconds = time.perf_counter() - start
+        return stats
+
+
+if __name__ == '__main__':
+    # Usage: python scene_loader.py [layout ...]
+    # Press "n" to switch to the next layout, building only what differs.
+    layout_names = sys.argv[1:] or ['apt_0']
+
+    # Set up engine and renderer
+    engine = sapien.Engine()
+    renderer = sapien.SapienRenderer()
+    engine.set_renderer(renderer)
+
+    switcher = SceneSwitcher(engine)
+    switcher.switch(load_layout(layout_names[0]))
+    scene = switcher.scene
+    current = 0
+
+    # Viewer
+    viewer = Viewer(renderer, resolutions=(1920, 1080))
+    viewer.set_scene(scene)
+    viewer.set_camera_xyz(x=-2.0, y=0, z=1.5)
+
+    while not viewer.closed:
+        if len(layout_names) > 1 and viewer.window.key_press('n'):
+            current = (current + 1) % len(layout_names)
+            print(layout_names[current], switcher.switch(load_layout(layout_names[current])))
+        scene.step()
+        scene.update_render()
+        viewer.render()
@@ -0,0 +1,102 @@
+def file_argument(args: tuple, kwargs: dict) -> str:
+    """
+    The file of an ActorBuilder.add_*_from_file call, positional or not.
+    """
+    return kwargs.get('filename', args[0] if args else '')
+
+
+def name_argument(args: tuple, kwargs: dict) -> str:
+    """
+    The name of an ActorBuilder.build* call, positional or not.
+    """
+    return kwargs.get('name', args[0] if args else '')
+
+
+class ActorBuilderWrapper:
+    """
+    Stands in for the ActorBuilder of a SceneWrapper. Every add_* call goes
+    through add() and every build* call through build_actor(), which
+    subclasses override; add_* calls return the wrapper so they chain like
+    the real builder's. owner is whatever the scene wrapper was given, e.g.
+    a recorder.
+    """
+
+    def __init__(self, builder, owner=None):
+        self._builder = builder
+        self._owner = owner
+
+    def __getattr__(self, name):
+        if name.startswith('add_'):
+            def add(*args, **kwargs):
+                self.add(name, args, kwargs)
+                return self
+            return add
+        return getattr(self._builder, name)
+
+    def add(self, method: str, args: tuple, kwargs: dict):
+        getattr(self._builder, method)(*args, **kwargs)
+
+    def build_actor(self, method: str, args: tuple, kwargs: dict):
+        return getattr(self._builder, method)(*args, **kwargs)
+
+    def build(self, *args, **kwargs):
+        return self.build_actor('build', args, kwargs)
+
+    def build_kinematic(self, *args, **kwargs):
+        return self.build_actor('build_kinematic', args, kwargs)
+
+    def build_static(self, *args, **kwargs):
+        return self.build_actor('build_static', args, kwargs)
+
+
+class URDFLoaderWrapper:
+    """
+    Stands in for the URDFLoader of a SceneWrapper. Attributes such as
+    fix_root_link and scale are set on the real loader, and load() goes
+    through load_articulation(), which subclasses override. Subclasses set
+    their own attributes with object.__setattr__.
+    """
+
+    def __init__(self, loader, owner=None):
+        object.__setattr__(self, '_loader', loader)
+        object.__setattr__(self, '_owner', owner)
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._loader, name, value)
+
+    def load_articulation(self, filename: str, args: tuple, kwargs: dict):
+        return self._loader.load(filename, *args, **kwargs)
+
+    def load(self, filename: str, *args, **kwargs):
+        return self.load_articulation(filename, args, kwargs)
+
+
+class SceneWrapper:
+    """
+    Scene handed to a scene builder in place of the real one, so a module
+    can see or change what the builder creates. Everything else is
+    forwarded to the scene. Subclasses pick their builder and loader
+    wrappers with actor_builder_class and urdf_loader_class; both are given
+    owner.
+
+    This module does not import sapien so that profiling, which worker
+    processes import, can use it.
+    """
+    actor_builder_class = ActorBuilderWrapper
+    urdf_loader_class = URDFLoaderWrapper
+
+    def __init__(self, scene, owner=None):
+        self._scene = scene
+        self._owner = owner
+
+    def __getattr__(self, name):
+        return getattr(self._scene, name)
+
+    def create_actor_builder(self) -> ActorBuilderWrapper:
+        return self.actor_builder_class(self._scene.create_actor_builder(), self._owner)
+
+    def create_urdf_loader(self) -> URDFLoaderWrapper:
+        return self.urdf_loader_class(self._scene.create_urdf_loader(), self._owner)
@@ -0,0 +1,232 @@
+import json
+import os
+import sys
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+import sapien.core as sapien
+from sapien.utils import Viewer
+
+import numpy as np
+
+from frl_apt_0 import build_scene
+from scene_loader import DATASET_DIR, object_config_of
+from scene_wrapper import ActorBuilderWrapper, SceneWrapper, URDFLoaderWrapper, file_argument
+
+LEXICON = os.path.join(DATASET_DIR, "configs", "ssd", "replicaCAD_semantic_lexicon.json")
+
+# Articulated objects carry no semantic_id, so they are labelled by URDF name
+ARTICULATION_CLASSES = {
+    'fridge': 'refrigerator',
+    'kitchen_counter': 'countertop',
+    'kitchencupboard': 'wall_cabinet',
+    'chestofdrawers': 'base_cabinet',
+    'cabinet': 'cabinet',
+    'door': 'door',
+}
+
+
+@lru_cache(maxsize=None)
+def class_names(lexicon: str = LEXICON) -> Tuple[str, ...]:
+    """
+    Class names indexed by semantic id. Id 0, which the lexicon leaves out,
+    is the unlabelled class of the stage and of actors without a config.
+    """
+    with open(lexicon) as f:
+        classes = json.load(f)["classes"]
+    names = [''] * (max(c["id"] for c in classes) + 1)
+    for c in classes:
+        names[c["id"]] = c["name"]
+    return tuple(names)
+
+
+@lru_cache(maxsize=None)
+def _config_semantic_id(config_path: str) -> int:
+    with open(config_path) as f:
+        return json.load(f).get("semantic_id", 0)
+
+
+def object_semantic_id(filename: str, dataset_dir: str = DATASET_DIR) -> int:
+    """
+    semantic_id of the object config a render or collision mesh belongs to.
+    """
+    config_path = object_config_of(filename, dataset_dir)
+    return 0 if config_path is None else _config_semantic_id(config_path)
+
+
+def named_semantic_id(name: str, dataset_dir: str = DATASET_DIR) -> int:
+    """
+    semantic_id of the object config an actor is named after, as build_layout
+    names them. Covers bounding box objects built without a renderer, which
+    load no mesh file at all.
+    """
+    config_path = os.path.join(dataset_dir, "configs", "objects", "{}.object_config.json".format(name))
+    return _config_semantic_id(config_path) if os.path.exists(config_path) else 0
+
+
+def urdf_semantic_id(filename: str, lexicon: str = LEXICON) -> int:
+    stem = os.path.splitext(os.path.basename(filename))[0].lower()
+    for key, name in ARTICULATION_CLASSES.items():
+        if key in stem:
+            return class_names(lexicon).index(name)
+    return 0
+
+
+class SemanticMap:
+    """
+    Semantic class of every actor and link of a scene, with a dense lookup
+    table from SAPIEN actor id to class id. Actor ids are the second channel
+    of a camera's "Segmentation" texture, so labels() converts a whole
+    segmentation image with a single indexing operation.
+    """
+
+    def __init__(self, actor_classes: Dict[int, int], names: Tuple[str, ...]):
+        self.actor_classes = actor_classes
+        self.class_names = names
+        # One spare entry, left unlabelled, for ids of actors added later
+        size = max(actor_classes, default=0) + 2
+        self.lut = np.zeros(size, dtype=np.uint16)
+        if actor_classes:
+            self.lut[np.fromiter(actor_classes.keys(), dtype=np.int64)] = \
+                np.fromiter(actor_classes.values(), dtype=np.int64)
+
+    def class_of(self, actor: sapien.ActorBase) -> int:
+        return self.actor_classes.get(actor.get_id(), 0)
+
+    def labels(self, segmentation: np.ndarray) -> np.ndarray:
+        """
+        Class ids of an (H, W, 4) segmentation texture, or of an array of
+        actor ids.
+        """
+        ids = segmentation[..., 1] if segmentation.ndim == 3 else segmentation
+        return self.lut[np.minimum(ids, len(self.lut) - 1)]
+
+    def mask(self, segmentation: np.ndarray, name: str) -> np.ndarray:
+        """
+        Pixels of a segmentation texture showing the named class.
+        """
+        return self.labels(segmentation) == self.class_names.index(name)
+
+
+class _SemanticActorBuilder(ActorBuilderWrapper):
+    def __init__(self, builder: sapien.ActorBuilder, recorder: 'SemanticRecorder'):
+        super().__init__(builder, recorder)
+        self._files: List[str] = []
+
+    def add(self, method: str, args: tuple, kwargs: dict):
+        if method.endswith('_from_file'):
+            self._files.append(file_argument(args, kwargs))
+        super().add(method, args, kwargs)
+
+    def build_actor(self, method: str, args: tuple, kwargs: dict) -> sapien.ActorBase:
+        actor = super().build_actor(method, args, kwargs)
+        semantic_id = 0
+        for filename in self._files:
+            semantic_id = object_semantic_id(filename, self._owner.dataset_dir)
+            if semantic_id:
+                break
+        if not semantic_id:
+            semantic_id = named_semantic_id(actor.get_name(), self._owner.dataset_dir)
+        self._owner.record(actor, semantic_id)
+        return actor
+
+
+class _SemanticURDFLoader(URDFLoaderWrapper):
+    def load_articulation(self, filename: str, args: tuple, kwargs: dict) -> sapien.Articulation:
+        articulation = super().load_articulation(filename, args, kwargs)
+        semantic_id = urdf_semantic_id(filename, self._owner.lexicon)
+        for link in articulation.get_links():
+            self._owner.record(link, semantic_id)
+        return articulation
+
+
+class _SemanticScene(SceneWrapper):
+    actor_builder_class = _SemanticActorBuilder
+    urdf_loader_class = _SemanticURDFLoader
+
+
+class SemanticRecorder:
+    """
+    Assigns a semantic id to every actor and link a scene builder creates:
+    objects get the semantic_id of their object config, articulations the
+    class of their URDF, and everything else 0. The builder is given the
+    scene from wrap(), and finish() returns the resulting SemanticMap.
+
+    With visual_ids, the visual id of each render body is set to its class
+    as well, so the first channel of the segmentation texture already holds
+    class ids. Visual ids then no longer identify individual bodies.
+    """
+
+    def __init__(self, scene: sapien.Scene, visual_ids: bool = False,
+                 dataset_dir: str = DATASET_DIR, lexicon: str = LEXICON):
+        self.scene = scene
+        self.visual_ids = visual_ids
+        self.dataset_dir = dataset_dir
+        self.lexicon = lexicon
+        self.actor_classes: Dict[int, int] = {}
+
+    def wrap(self) -> _SemanticScene:
+        return _SemanticScene(self.scene, self)
+
+    def record(self, actor: sapien.ActorBase, semantic_id: int):
+        self.actor_classes[actor.get_id()] = semantic_id
+        if self.visual_ids:
+            for body in actor.get_visual_bodies():
+                body.set_visual_id(semantic_id)
+
+    def finish(self) -> SemanticMap:
+        semantics = SemanticMap(self.actor_classes, class_names(self.lexicon))
+        self.actor_classes = {}
+        return semantics
+
+
+def build_with_semantics(engine: sapien.Engine,
+                         build: Callable[..., sapien.Scene] = build_scene,
+                         visual_ids: bool = False) -> Tuple[sapien.Scene, SemanticMap]:
+    """
+    Build a scene together with the semantic classes of its actors. build is
+    called as build(engine, scene=...), like build_scene and build_layout.
+    """
+    scene = engine.create_scene()
+    scene.set_timestep(1 / 100.0)
+    recorder = SemanticRecorder(scene, visual_ids)
+    build(engine, scene=recorder.wrap())
+    return scene, recorder.finish()
+
+
+if __name__ == '__main__':
+    # Usage: python semantics.py [class_name]
+    # Renders FRL apartment 0 and prints the classes in view, or the share of
+    # pixels showing class_name.
+    name: Optional[str] = sys.argv[1] if len(sys.argv) > 1 else None
+
+    # Set up engine and renderer
+    engine = sapien.Engine()
+    renderer = sapien.SapienRenderer()
+    engine.set_renderer(renderer)
+
+    scene, semantics = build_with_semantics(engine)
+    camera = scene.add_camera('camera', width=640, height=480, fovy=1.0, near=0.05, far=100)
+    camera.set_pose(sapien.Pose([-2.0, 0, 1.5]))
+    scene.step()
+    scene.update_render()
+    camera.take_picture()
+
+    segmentation = camera.get_uint32_texture('Segmentation')
+    labels = semantics.labels(segmentation)
+    if name is None:
+        ids, counts = np.unique(labels, return_counts=True)
+        for class_id, count in zip(ids, counts):
+            print("{}: {} px".format(semantics.class_names[class_id] or 'unlabelled', count))
+    else:
+        print("{}: {:.1%} of pixels".format(name, semantics.mask(segmentation, name).mean()))
+
+    # Viewer
+    viewer = Viewer(renderer, resolutions=(1920, 1080))
+    viewer.set_scene(scene)
+    viewer.set_camera_xyz(x=-2.0, y=0, z=1.5)
+
+    while not viewer.closed:
+        scene.step()
+        scene.update_render()
+        viewer.render()
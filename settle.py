@@ -0,0 +1,247 @@
+import hashlib
+import json
+import os
+import sys
+from dataclasses import asdict, dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+import sapien.core as sapien
+
+import numpy as np
+
+from frl_apt_0 import build_scene
+from mesh_cache import CACHE_DIR, file_digest
+from scene_wrapper import ActorBuilderWrapper, SceneWrapper, URDFLoaderWrapper, file_argument
+
+_VERSION = 1
+
+
+@dataclass
+class SettleResult:
+    """
+    Rest poses of the dynamic actors of a scene, in build order, and the
+    contacts that were deeper than the penetration tolerance at the first
+    step and once settled, as (name, name, depth). Actors that fell out of
+    the scene keep their original pose and are listed in lost.
+    """
+    names: List[str]
+    poses: List[List[float]]
+    steps: int = 0
+    initial_penetrations: List[Tuple[str, str, float]] = field(default_factory=list)
+    penetrations: List[Tuple[str, str, float]] = field(default_factory=list)
+    lost: List[str] = field(default_factory=list)
+
+
+def _pose_array(actors: List[sapien.ActorBase]) -> np.ndarray:
+    poses = [actor.get_pose() for actor in actors]
+    return np.array([np.concatenate([pose.p, pose.q]) for pose in poses], dtype=np.float64).reshape(-1, 7)
+
+
+def _penetrations(scene: sapien.Scene, tolerance: float) -> List[Tuple[str, str, float]]:
+    found = []
+    for contact in scene.get_contacts():
+        if not contact.points:
+            continue
+        depth = -min(point.separation for point in contact.points)
+        if depth > tolerance:
+            found.append((contact.actor0.get_name(), contact.actor1.get_name(), float(depth)))
+    return found
+
+
+def _at_rest(actors: List[sapien.Actor], linear_tolerance: float, angular_tolerance: float) -> bool:
+    linear = np.array([actor.get_velocity() for actor in actors]).reshape(-1, 3)
+    angular = np.array([actor.get_angular_velocity() for actor in actors]).reshape(-1, 3)
+    return bool(np.all(np.linalg.norm(linear, axis=1) <= linear_tolerance)
+                and np.all(np.linalg.norm(angular, axis=1) <= angular_tolerance))
+
+
+def settle(scene: sapien.Scene, actors: List[sapien.Actor], max_steps: int = 3000,
+           check_interval: int = 50, linear_tolerance: float = 1e-3,
+           angular_tolerance: float = 1e-2, penetration_tolerance: float = 5e-3,
+           floor: float = -1.0) -> SettleResult:
+    """
+    Step scene until actors come to rest, or for max_steps, and return their
+    rest poses. The scene itself is left as it was.
+    """
+    state = scene.pack()
+    initial = _pose_array(actors)
+
+    scene.step()
+    steps = 1
+    initial_penetrations = _penetrations(scene, penetration_tolerance)
+    while steps < max_steps:
+        for _ in range(min(check_interval, max_steps - steps)):
+            scene.step()
+        steps = min(steps + check_interval, max_steps)
+        if _at_rest(actors, linear_tolerance, angular_tolerance):
+            break
+    penetrations = _penetrations(scene, penetration_tolerance)
+
+    poses = _pose_array(actors)
+    lost = poses[:, 2] < floor
+    poses[lost] = initial[lost]
+    scene.unpack(state)
+    return SettleResult(
+        names=[actor.get_name() for actor in actors],
+        poses=poses.tolist(),
+        steps=steps,
+        initial_penetrations=initial_penetrations,
+        penetrations=penetrations,
+        lost=[actor.get_name() for actor, fell in zip(actors, lost) if fell],
+    )
+
+
+def settle_key(files: List[str], actors: List[sapien.ActorBase], timestep: float) -> str:
+    """
+    Cache key of a scene: the contents of its collision assets and URDFs, and
+    the initial poses of its actors, so editing a pose or an asset re-settles.
+    """
+    sha1 = hashlib.sha1()
+    for digest in sorted({file_digest(f) for f in files if os.path.exists(f)}):
+        sha1.update(digest.encode())
+    sha1.update(json.dumps([actor.get_name() for actor in actors]).encode())
+    sha1.update(np.round(_pose_array(actors), 6).tobytes())
+    sha1.update(repr(round(timestep, 9)).encode())
+    return sha1.hexdigest()
+
+
+class SettleCache:
+    """
+    Settled poses stored on disk under the key of the scene they belong to.
+    """
+
+    def __init__(self, cache_dir: str = os.path.join(CACHE_DIR, "settle")):
+        self.cache_dir = cache_dir
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, "{}.v{}.json".format(key, _VERSION))
+
+    def get(self, key: str) -> Optional[SettleResult]:
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            data = json.load(f)
+        for name in ('initial_penetrations', 'penetrations'):
+            data[name] = [tuple(item) for item in data[name]]
+        return SettleResult(**data)
+
+    def put(self, key: str, result: SettleResult):
+        path = self._path(key)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = "{}.tmp{}".format(path, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(asdict(result), f)
+        os.replace(tmp, path)
+
+
+_settle_cache = SettleCache()
+
+
+def get_settle_cache() -> SettleCache:
+    return _settle_cache
+
+
+def apply_settled(scene: sapien.Scene, actors: List[sapien.Actor], files: List[str],
+                  cache: Optional[SettleCache] = None, **kwargs) -> SettleResult:
+    """
+    Move actors to their cached rest poses, settling the scene first if the
+    cache has no entry for it. kwargs are passed on to settle().
+    """
+    cache = get_settle_cache() if cache is None else cache
+    key = settle_key(files, actors, scene.get_timestep())
+    result = cache.get(key)
+    if result is None:
+        result = settle(scene, actors, **kwargs)
+        cache.put(key, result)
+    zero = np.zeros(3)
+    for actor, pose in zip(actors, result.poses):
+        actor.set_pose(sapien.Pose(pose[:3], pose[3:]))
+        actor.set_velocity(zero)
+        actor.set_angular_velocity(zero)
+    return result
+
+
+class _SettleActorBuilder(ActorBuilderWrapper):
+    def add(self, method: str, args: tuple, kwargs: dict):
+        # Only collision files count, so builds with and without a renderer share entries
+        if method.endswith('collision_from_file') or method == 'add_multiple_collisions_from_file':
+            self._owner.files.append(file_argument(args, kwargs))
+        super().add(method, args, kwargs)
+
+    def build(self, *args, **kwargs) -> sapien.Actor:
+        actor = super().build(*args, **kwargs)
+        self._owner.actors.append(actor)
+        return actor
+
+
+class _SettleURDFLoader(URDFLoaderWrapper):
+    def load_articulation(self, filename: str, args: tuple, kwargs: dict) -> sapien.Articulation:
+        self._owner.files.append(filename)
+        return super().load_articulation(filename, args, kwargs)
+
+
+class _SettleScene(SceneWrapper):
+    actor_builder_class = _SettleActorBuilder
+    urdf_loader_class = _SettleURDFLoader
+
+
+class SettleRecorder:
+    """
+    Collects the asset files and dynamic actors a scene builder creates. The
+    builder is given the scene from wrap(), and finish() moves the dynamic
+    actors to their settled poses.
+    """
+
+    def __init__(self, scene: sapien.Scene, cache: Optional[SettleCache] = None):
+        self.scene = scene
+        self.cache = cache
+        self.files: List[str] = []
+        self.actors: List[sapien.Actor] = []
+
+    def wrap(self) -> _SettleScene:
+        return _SettleScene(self.scene, self)
+
+    def finish(self, **kwargs) -> SettleResult:
+        result = apply_settled(self.scene, self.actors, self.files, self.cache, **kwargs)
+        self.files, self.actors = [], []
+        return result
+
+
+def build_settled(engine: sapien.Engine, build: Callable[..., sapien.Scene] = build_scene,
+                  cache: Optional[SettleCache] = None, **kwargs) -> Tuple[sapien.Scene, SettleResult]:
+    """
+    Build a scene with its dynamic actors at rest. build is called as
+    build(engine, scene=...), like build_scene and build_layout.
+    """
+    scene = engine.create_scene()
+    scene.set_timestep(1 / 100.0)
+    recorder = SettleRecorder(scene, cache)
+    build(engine, scene=recorder.wrap())
+    return scene, recorder.finish(**kwargs)
+
+
+def _report(name: str, result: SettleResult):
+    print("{}: {} actors, {} steps".format(name, len(result.names), result.steps))
+    for label, contacts in (("initial", result.initial_penetrations), ("settled", result.penetrations)):
+        for a, b, depth in contacts:
+            print("  {} penetration {} / {}: {:.1f} mm".format(label, a, b, depth * 1000))
+    for lost in result.lost:
+        print("  lost {}".format(lost))
+
+
+if __name__ == '__main__':
+    # Usage: python settle.py [layout ...]
+    # Settles FRL apartment 0, or the given scene layouts, and fills the
+    # cache the loaders read. Physics only, no renderer is needed.
+    from scene_loader import build_layout, load_layout
+
+    engine = sapien.Engine()
+    if len(sys.argv) > 1:
+        for name in sys.argv[1:]:
+            _, result = build_settled(
+                engine, lambda engine, scene: build_layout(engine, load_layout(name), scene=scene))
+            _report(name, result)
+    else:
+        _, result = build_settled(engine)
+        _report("build_scene", result)
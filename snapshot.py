@@ -0,0 +1,47 @@
+from typing import Dict, List
+
+import sapien.core as sapien
+
+import numpy as np
+
+
+class SceneSnapshot:
+    """
+    Physical state of a scene: pose and velocity of every actor, and root pose,
+    joint positions, joint velocities and drive targets of every articulation.
+
+    Capture it right after building a scene, then call restore() to reset an
+    episode instead of building the scene again. Both directions go through a
+    single Scene.pack/Scene.unpack call.
+    """
+
+    def __init__(self, scene: sapien.Scene):
+        self.scene = scene
+        self.data: Dict[str, Dict[int, List[float]]] = scene.pack()
+
+    def restore(self):
+        self.scene.unpack(self.data)
+
+    def update(self):
+        """
+        Replace the stored state with the scene's current state.
+        """
+        self.data = self.scene.pack()
+
+
+class EntitySnapshot:
+    """
+    Physical state of a subset of the actors and articulations of a scene, for
+    resetting one of several worlds that share a scene.
+    """
+
+    def __init__(self, entities: List):
+        self.entities = list(entities)
+        self.update()
+
+    def restore(self):
+        for entity, data in zip(self.entities, self.data):
+            entity.unpack(data)
+
+    def update(self):
+        self.data = [np.array(entity.pack(), dtype=np.float32) for entity in self.entities]
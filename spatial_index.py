@@ -0,0 +1,334 @@
+from typing import Dict, List, Optional, Tuple
+
+import sapien.core as sapien
+
+import numpy as np
+
+
+def quat_to_matrices(q: np.ndarray) -> np.ndarray:
+    """
+    Rotation matrices of (N, 4) quaternions in (w, x, y, z) order.
+    """
+    w, x, y, z = np.moveaxis(np.asarray(q, dtype=np.float64), -1, 0)
+    return np.stack([
+        np.stack([1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)], -1),
+        np.stack([2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)], -1),
+        np.stack([2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)], -1),
+    ], -2)
+
+
+def _transform_bounds(lower: np.ndarray, upper: np.ndarray, rotation: np.ndarray,
+                      translation: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Axis-aligned bounds of boxes after rotation and translation, batched over
+    leading dimensions.
+    """
+    center = np.einsum('...ij,...j->...i', rotation, (lower + upper) / 2) + translation
+    extent = np.einsum('...ij,...j->...i', np.abs(rotation), (upper - lower) / 2)
+    return center - extent, center + extent
+
+
+def _geometry_bounds(geometry: sapien.CollisionGeometry) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Bounds of a collision geometry in its shape frame, None for planes.
+    """
+    if isinstance(geometry, sapien.BoxGeometry):
+        half = np.asarray(geometry.half_lengths, dtype=np.float64)
+        return -half, half
+    if isinstance(geometry, sapien.CapsuleGeometry):
+        # Capsules are along the x axis
+        half = np.array([geometry.half_length + geometry.radius, geometry.radius, geometry.radius])
+        return -half, half
+    if isinstance(geometry, sapien.SphereGeometry):
+        half = np.full(3, geometry.radius, dtype=np.float64)
+        return -half, half
+    if isinstance(geometry, (sapien.ConvexMeshGeometry, sapien.NonconvexMeshGeometry)):
+        vertices = np.asarray(geometry.vertices, dtype=np.float64).reshape(-1, 3)
+        vertices = vertices * np.asarray(geometry.scale, dtype=np.float64)
+        return vertices.min(0), vertices.max(0)
+    return None
+
+
+def _in_polygon(points: np.ndarray, polygon: np.ndarray) -> np.ndarray:
+    """
+    Whether (N, 2) points lie inside a (M, 2) polygon, by the even-odd rule.
+    """
+    x, y = points[:, None, 0], points[:, None, 1]
+    a, b = polygon, np.roll(polygon, -1, axis=0)
+    crosses = (a[:, 1] > y) != (b[:, 1] > y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        at = a[:, 0] + (y - a[:, 1]) * (b[:, 0] - a[:, 0]) / (b[:, 1] - a[:, 1])
+    return np.count_nonzero(crosses & (x < at), axis=1) % 2 == 1
+
+
+def local_bounds(actor: sapien.ActorBase) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Bounds of all collision shapes of an actor or link in its own frame.
+    """
+    lowers, uppers = [], []
+    for shape in actor.get_collision_shapes():
+        bounds = _geometry_bounds(shape.geometry)
+        if bounds is None:
+            continue
+        pose = shape.get_local_pose()
+        lower, upper = _transform_bounds(
+            bounds[0], bounds[1], quat_to_matrices(pose.q), np.asarray(pose.p, dtype=np.float64))
+        lowers.append(lower)
+        uppers.append(upper)
+    if not lowers:
+        return None
+    return np.min(lowers, axis=0), np.max(uppers, axis=0)
+
+
+class SpatialIndex:
+    """
+    World-space AABBs of the actors and articulation links of a scene.
+
+    Static actors are bounded once and bucketed into a uniform grid of
+    cell_size cells on the floor plane. Dynamic actors and links are kept in
+    flat arrays that update() refreshes after scene.step(), recomputing only
+    the entries whose pose changed. Queries are vectorized over the grid
+    candidates and the dynamic arrays, and return entry indices; use
+    entities[i] or names[i] to look them up.
+
+    ReplicaCAD has no room annotations, so rooms are given as regions: named
+    polygons on the floor plane, e.g. traced from the navmesh or the stage.
+    """
+
+    def __init__(self, scene: sapien.Scene, cell_size: float = 1.0, tolerance: float = 1e-6,
+                 regions: Optional[Dict[str, np.ndarray]] = None):
+        self.scene = scene
+        self.cell_size = cell_size
+        self.tolerance = tolerance
+        self.regions: Dict[str, np.ndarray] = {}
+        for name, polygon in (regions or {}).items():
+            self.add_region(name, polygon)
+        self.entities: List[sapien.ActorBase] = []
+        local_lower, local_upper, static = [], [], []
+
+        # Links are tagged with the index of their articulation, actors with -1
+        actors = [(actor, -1) for actor in scene.get_all_actors()]
+        self.articulations = scene.get_all_articulations()
+        for i, articulation in enumerate(self.articulations):
+            actors.extend((link, i) for link in articulation.get_links())
+        owners = []
+        for actor, owner in actors:
+            bounds = local_bounds(actor)
+            if bounds is None:
+                continue
+            self.entities.append(actor)
+            owners.append(owner)
+            local_lower.append(bounds[0])
+            local_upper.append(bounds[1])
+            static.append(isinstance(actor, sapien.ActorStatic))
+
+        self.names = [actor.get_name() for actor in self.entities]
+        self.local_lower = np.array(local_lower).reshape(-1, 3)
+        self.local_upper = np.array(local_upper).reshape(-1, 3)
+        self.static = np.array(static, dtype=bool)
+        self.dynamic_indices = np.flatnonzero(~self.static)
+        self.static_indices = np.flatnonzero(self.static)
+        owners = np.array(owners, dtype=np.int64)
+        self._actor_indices = np.flatnonzero(~self.static & (owners < 0))
+        self._actor_ids = [self.entities[i].get_id() for i in self._actor_indices]
+        self._link_indices = [np.flatnonzero(owners == i) for i in range(len(self.articulations))]
+        self._articulation_states = [None] * len(self.articulations)
+
+        self.lower = np.zeros_like(self.local_lower)
+        self.upper = np.zeros_like(self.local_upper)
+        self.positions = np.full((len(self.entities), 3), np.nan)
+        self.quaternions = np.full((len(self.entities), 4), np.nan)
+        self._update(np.arange(len(self.entities)))
+        self._build_grid()
+
+    def __len__(self) -> int:
+        return len(self.entities)
+
+    def _poses(self, indices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        poses = [self.entities[i].get_pose() for i in indices]
+        return (np.array([pose.p for pose in poses], dtype=np.float64).reshape(-1, 3),
+                np.array([pose.q for pose in poses], dtype=np.float64).reshape(-1, 4))
+
+    def _update(self, indices: np.ndarray, positions: Optional[np.ndarray] = None,
+                quaternions: Optional[np.ndarray] = None) -> np.ndarray:
+        if positions is None:
+            positions, quaternions = self._poses(indices)
+        # Written as "not within tolerance" so never-seen (NaN) poses count as moved
+        moved = ~(np.all(np.abs(positions - self.positions[indices]) <= self.tolerance, axis=1)
+                  & np.all(np.abs(quaternions - self.quaternions[indices]) <= self.tolerance, axis=1))
+        changed = indices[moved]
+        self.positions[changed] = positions[moved]
+        self.quaternions[changed] = quaternions[moved]
+        self.lower[changed], self.upper[changed] = _transform_bounds(
+            self.local_lower[changed], self.local_upper[changed],
+            quat_to_matrices(quaternions[moved]), positions[moved])
+        return changed
+
+    def update(self) -> np.ndarray:
+        """
+        Refresh the bounds of dynamic entries that moved. Returns their indices.
+
+        Actor poses come from a single Scene.pack() call, whose entries start
+        with the pose. Links are only read for articulations whose root pose
+        or joint positions changed, so resting furniture costs two calls.
+        """
+        changed = []
+        if len(self._actor_indices):
+            data = self.scene.pack()['actor']
+            poses = np.array([data[i][:7] for i in self._actor_ids], dtype=np.float64)
+            changed.append(self._update(self._actor_indices, poses[:, :3], poses[:, 3:]))
+        for i, articulation in enumerate(self.articulations):
+            pose = articulation.get_root_pose()
+            state = np.concatenate([pose.p, pose.q, articulation.get_qpos()])
+            previous = self._articulation_states[i]
+            if (previous is not None and previous.shape == state.shape
+                    and np.all(np.abs(state - previous) <= self.tolerance)):
+                continue
+            self._articulation_states[i] = state
+            changed.append(self._update(self._link_indices[i]))
+        return np.concatenate(changed) if changed else np.zeros(0, dtype=np.int64)
+
+    def _cells(self, lower: np.ndarray, upper: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return (np.floor(lower[..., :2] / self.cell_size).astype(np.int64),
+                np.floor(upper[..., :2] / self.cell_size).astype(np.int64))
+
+    def _build_grid(self):
+        # Every static entry is listed in each cell its bounds overlap,
+        # stored as a sorted array of cell keys with the matching entries
+        keys, members = [], []
+        if len(self.static_indices):
+            first, last = self._cells(self.lower[self.static_indices],
+                                      self.upper[self.static_indices])
+            self._grid_origin = first.min(0)
+            self._grid_shape = last.max(0) - self._grid_origin + 1
+            for index, lo, hi in zip(self.static_indices, first, last):
+                xs, ys = np.meshgrid(np.arange(lo[0], hi[0] + 1), np.arange(lo[1], hi[1] + 1))
+                keys.append(self._cell_keys(np.stack([xs.ravel(), ys.ravel()], -1)))
+                members.append(np.full(xs.size, index))
+        else:
+            self._grid_origin = np.zeros(2, dtype=np.int64)
+            self._grid_shape = np.ones(2, dtype=np.int64)
+        keys = np.concatenate(keys) if keys else np.zeros(0, dtype=np.int64)
+        members = np.concatenate(members) if members else np.zeros(0, dtype=np.int64)
+        order = np.argsort(keys, kind='stable')
+        self._grid_keys = keys[order]
+        self._grid_members = members[order]
+
+    def _cell_keys(self, cells: np.ndarray) -> np.ndarray:
+        cells = np.clip(cells - self._grid_origin, 0, self._grid_shape - 1)
+        return cells[..., 0] * self._grid_shape[1] + cells[..., 1]
+
+    def _static_candidates(self, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+        first, last = self._cells(lower, upper)
+        first = np.maximum(first, self._grid_origin)
+        last = np.minimum(last, self._grid_origin + self._grid_shape - 1)
+        if np.any(last < first):
+            return np.zeros(0, dtype=np.int64)
+        xs, ys = np.meshgrid(np.arange(first[0], last[0] + 1), np.arange(first[1], last[1] + 1))
+        keys = self._cell_keys(np.stack([xs.ravel(), ys.ravel()], -1))
+        start = np.searchsorted(self._grid_keys, keys, 'left')
+        end = np.searchsorted(self._grid_keys, keys, 'right')
+        if not np.any(end > start):
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate(
+            [self._grid_members[s:e] for s, e in zip(start, end) if e > s]))
+
+    def _candidates(self, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+        return np.concatenate([self._static_candidates(lower, upper), self.dynamic_indices])
+
+    def query_box(self, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+        """
+        Entries whose bounds overlap the box [lower, upper].
+        """
+        lower, upper = np.asarray(lower, dtype=np.float64), np.asarray(upper, dtype=np.float64)
+        candidates = self._candidates(lower, upper)
+        overlap = np.all((self.lower[candidates] <= upper) & (self.upper[candidates] >= lower), axis=1)
+        return candidates[overlap]
+
+    def query_radius(self, center: np.ndarray, radius: float) -> np.ndarray:
+        """
+        Entries whose bounds are within radius of center, nearest first.
+        """
+        center = np.asarray(center, dtype=np.float64)
+        candidates = self._candidates(center - radius, center + radius)
+        nearest = np.clip(center, self.lower[candidates], self.upper[candidates])
+        distances = np.linalg.norm(nearest - center, axis=1)
+        inside = distances <= radius
+        order = np.argsort(distances[inside], kind='stable')
+        return candidates[inside][order]
+
+    def query_ray(self, origin: np.ndarray, direction: np.ndarray,
+                  max_distance: float = np.inf) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Entries whose bounds a ray enters within max_distance, and the
+        distances at which it enters them, nearest first.
+        """
+        origin = np.asarray(origin, dtype=np.float64)
+        direction = np.asarray(direction, dtype=np.float64)
+        direction = direction / np.linalg.norm(direction)
+        if np.isfinite(max_distance):
+            end = origin + direction * max_distance
+            candidates = self._candidates(np.minimum(origin, end), np.maximum(origin, end))
+        else:
+            candidates = np.arange(len(self.entities))
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            inverse = 1.0 / direction
+            t0 = (self.lower[candidates] - origin) * inverse
+            t1 = (self.upper[candidates] - origin) * inverse
+        # Axes the ray is parallel to only pass if the origin lies in the slab
+        parallel = direction == 0
+        inside_slab = (origin >= self.lower[candidates]) & (origin <= self.upper[candidates])
+        t0 = np.where(parallel, np.where(inside_slab, -np.inf, np.inf), t0)
+        t1 = np.where(parallel, np.where(inside_slab, np.inf, -np.inf), t1)
+        near = np.maximum(np.minimum(t0, t1).max(1), 0.0)
+        far = np.maximum(t0, t1).min(1)
+        hit = (near <= far) & (near <= max_distance)
+        order = np.argsort(near[hit], kind='stable')
+        return candidates[hit][order], near[hit][order]
+
+    def add_region(self, name: str, polygon: np.ndarray):
+        """
+        Add a region, e.g. a room, as a (M, 2) polygon on the floor plane.
+        """
+        polygon = np.asarray(polygon, dtype=np.float64).reshape(-1, 2)
+        if len(polygon) < 3:
+            raise ValueError("Region {} needs at least 3 corners".format(name))
+        self.regions[name] = polygon
+
+    def query_region(self, name: str, lower_z: float = -np.inf,
+                     upper_z: float = np.inf) -> np.ndarray:
+        """
+        Entries whose bounds are centred inside a region on the floor plane
+        and overlap [lower_z, upper_z] in height.
+        """
+        polygon = self.regions[name]
+        lower = np.append(polygon.min(0), lower_z)
+        upper = np.append(polygon.max(0), upper_z)
+        candidates = self.query_box(lower, upper)
+        centers = (self.lower[candidates, :2] + self.upper[candidates, :2]) / 2
+        return candidates[_in_polygon(centers, polygon)]
+
+    def regions_of(self, indices: np.ndarray) -> List[Optional[str]]:
+        """
+        Name of the region each entry is centred in, None outside all of them.
+        """
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+        centers = (self.lower[indices, :2] + self.upper[indices, :2]) / 2
+        names: List[Optional[str]] = [None] * len(indices)
+        for name, polygon in self.regions.items():
+            for i in np.flatnonzero(_in_polygon(centers, polygon)):
+                if names[i] is None:
+                    names[i] = name
+        return names
+
+    def nearest(self, point: np.ndarray, k: int = 1,
+                max_radius: float = np.inf) -> np.ndarray:
+        """
+        The k entries whose bounds are closest to point.
+        """
+        point = np.asarray(point, dtype=np.float64)
+        if np.isfinite(max_radius):
+            return self.query_radius(point, max_radius)[:k]
+        distances = np.linalg.norm(np.clip(point, self.lower, self.upper) - point, axis=1)
+        return np.argsort(distances, kind='stable')[:k]
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+# sapien.core raises ImportError rather than ModuleNotFoundError without Vulkan
+sapien = pytest.importorskip("sapien.core", exc_type=ImportError)
+
+from frl_apt_0 import r2s, r2s_batch, s2r, s2r_batch
+
+
+def random_poses(count: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    positions = rng.uniform(-5, 5, (count, 3))
+    quaternions = rng.normal(size=(count, 4))
+    quaternions /= np.linalg.norm(quaternions, axis=1, keepdims=True)
+    return positions, quaternions
+
+
+def assert_same_rotation(actual: np.ndarray, expected: np.ndarray):
+    # q and -q are the same rotation
+    signs = np.where(np.sum(actual * expected, axis=-1, keepdims=True) < 0, -1, 1)
+    np.testing.assert_allclose(actual * signs, expected, atol=1e-5)
+
+
+@pytest.mark.parametrize("batch, single", [(r2s_batch, r2s), (s2r_batch, s2r)])
+def test_batch_matches_single_poses(batch, single):
+    positions, quaternions = random_poses(32)
+    batch_positions, batch_quaternions = batch(positions, quaternions)
+    for i in range(len(positions)):
+        pose = single(sapien.Pose(positions[i], quaternions[i]))
+        np.testing.assert_allclose(batch_positions[i], pose.p, atol=1e-5)
+        assert_same_rotation(batch_quaternions[i], pose.q)
+    np.testing.assert_array_equal(batch(positions), batch_positions)
+
+
+def test_batch_round_trip():
+    positions, quaternions = random_poses(32, seed=1)
+    back_positions, back_quaternions = s2r_batch(*r2s_batch(positions, quaternions))
+    np.testing.assert_allclose(back_positions, positions, atol=1e-12)
+    assert_same_rotation(back_quaternions, quaternions)
+    np.testing.assert_allclose(r2s_batch(s2r_batch(positions)), positions, atol=1e-12)
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+# navmesh imports frl_apt_0, and sapien.core raises ImportError without Vulkan
+pytest.importorskip("sapien.core", exc_type=ImportError)
+
+from navmesh import NavMesh
+
+PAIRS = 60
+
+
+@pytest.fixture(scope="module")
+def navmesh():
+    return NavMesh.for_scene('apt_0')
+
+
+def test_paths_stay_on_navmesh(navmesh):
+    rng = np.random.default_rng(0)
+    island = navmesh.largest_island
+    points = navmesh.sample_points(2 * PAIRS, rng, island)
+    for start, goal in zip(points[:PAIRS], points[PAIRS:]):
+        path = navmesh.find_path(start, goal)
+        assert path is not None
+        located, _ = navmesh.locate(np.stack([start, goal]))
+        np.testing.assert_allclose(path[0], located[0], atol=1e-6)
+        np.testing.assert_allclose(path[-1], located[1], atol=1e-6)
+        assert navmesh.geodesic_distance(start, goal) >= np.linalg.norm(located[1] - located[0]) - 1e-6
+
+        # Every point along the path, including over stairs and slopes, is on the mesh
+        t = np.linspace(0, 1, 20)[:, None]
+        dense = np.concatenate([a + (b - a) * t for a, b in zip(path[:-1], path[1:])] + [path[-1:]])
+        on_mesh, _ = navmesh.locate(dense)
+        assert np.linalg.norm(on_mesh - dense, axis=1).max() < 0.02
+
+
+def test_no_path_between_islands(navmesh):
+    if navmesh.islands.max() == 0:
+        pytest.skip("apt_0 has a single island")
+    island = navmesh.largest_island
+    other = next(i for i in range(navmesh.islands.max() + 1) if i != island)
+    rng = np.random.default_rng(1)
+    start = navmesh.sample_points(1, rng, island)[0]
+    goal = navmesh.sample_points(1, rng, other)[0]
+    assert navmesh.find_path(start, goal) is None
+    assert navmesh.geodesic_distance(start, goal) == np.inf
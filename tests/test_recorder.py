@@ -0,0 +1,71 @@
+import os
+
+import numpy as np
+import pytest
+
+# sapien.core raises ImportError rather than ModuleNotFoundError without Vulkan
+sapien = pytest.importorskip("sapien.core", exc_type=ImportError)
+
+from recorder import TrajectoryPlayer, TrajectoryReader, TrajectoryRecorder
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROBOT_URDF = os.path.join(ROOT_DIR, "maniskill_robot", "mobile_panda_single_arm.urdf")
+STEPS = 60
+
+
+def build(engine):
+    scene = engine.create_scene()
+    scene.set_timestep(1 / 100.0)
+    scene.add_ground(0)
+
+    builder = scene.create_actor_builder()
+    builder.add_box_collision(half_size=[0.05, 0.05, 0.05])
+    box = builder.build(name='box')
+    box.set_pose(sapien.Pose([1.0, 0.0, 0.5]))
+
+    loader = scene.create_urdf_loader()
+    loader.fix_root_link = True
+    robot = loader.load(ROBOT_URDF)
+    for joint in robot.get_active_joints():
+        joint.set_drive_property(stiffness=1000, damping=200)
+    return scene, robot
+
+
+def control(robot, step):
+    # Drive targets that change every step, so a stale target shows up at once
+    robot.set_drive_target(0.3 * np.sin(0.1 * step + np.arange(robot.dof)))
+    robot.set_qf(robot.compute_passive_force(gravity=True, coriolis_and_centrifugal=True))
+
+
+def test_restore_then_step_follows_recording(tmp_path):
+    engine = sapien.Engine()
+    scene, robot = build(engine)
+    path = str(tmp_path / "trajectory.bin")
+    with TrajectoryRecorder(path, scene, robot, chunk_size=16) as recorder:
+        for step in range(STEPS):
+            control(robot, step)
+            recorder.record()
+            scene.step()
+
+    reader = TrajectoryReader(path)
+    assert reader.meta['robot']['name'] == robot.get_name()
+    assert reader.meta['robot']['dof'] == robot.dof
+
+    player = TrajectoryPlayer(reader, scene)
+    assert player.robot is robot
+    for step in (0, 17, STEPS - 2):
+        # Leave the controls somewhere else, restore must bring them back
+        robot.set_drive_target(np.zeros(robot.dof))
+        robot.set_qf(np.zeros(robot.dof))
+        player.restore(step)
+        np.testing.assert_array_equal(robot.get_drive_target(), reader[step]['robot_drive_target'])
+        np.testing.assert_array_equal(robot.get_qf(), reader[step]['robot_qf'])
+
+        scene.step()
+        expected = reader[step + 1]
+        np.testing.assert_allclose(robot.get_qpos(), expected['robot_qpos'], atol=1e-5)
+        np.testing.assert_allclose(robot.get_qvel(), expected['robot_qvel'], atol=1e-4)
+        actor_state = np.concatenate([actor.pack() for actor in player.actors])
+        np.testing.assert_allclose(actor_state, expected['actor_state'], atol=1e-5)
+    reader.close()
+
@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+# sapien.core raises ImportError rather than ModuleNotFoundError without Vulkan
+sapien = pytest.importorskip("sapien.core", exc_type=ImportError)
+
+from spatial_index import SpatialIndex
+
+
+def build(engine, seed: int = 0):
+    scene = engine.create_scene()
+    scene.set_timestep(1 / 100.0)
+    scene.add_ground(0)
+    rng = np.random.default_rng(seed)
+    for i in range(60):
+        half = rng.uniform(0.05, 0.6, 3)
+        builder = scene.create_actor_builder()
+        builder.add_box_collision(half_size=half)
+        # Statics spread over several grid cells, dynamics drop onto the floor
+        if i % 3:
+            actor = builder.build_static(name='static_{}'.format(i))
+            actor.set_pose(sapien.Pose(rng.uniform([-6, -6, 0], [6, 6, 2])))
+        else:
+            actor = builder.build(name='dynamic_{}'.format(i))
+            actor.set_pose(sapien.Pose(rng.uniform([-6, -6, 1], [6, 6, 3])))
+    return scene
+
+
+def box_bounds(index: SpatialIndex):
+    # Unrotated boxes, bounded directly from their poses and half sizes
+    lower, upper = [], []
+    for actor in index.entities:
+        p = actor.get_pose().p
+        half = actor.get_collision_shapes()[0].geometry.half_lengths
+        lower.append(p - half)
+        upper.append(p + half)
+    return np.array(lower), np.array(upper)
+
+
+def ray_hits(lower, upper, origin, direction, max_distance):
+    hits = {}
+    for i in range(len(lower)):
+        near, far = 0.0, max_distance
+        for axis in range(3):
+            if direction[axis] == 0:
+                if not lower[i, axis] <= origin[axis] <= upper[i, axis]:
+                    break
+                continue
+            t0 = (lower[i, axis] - origin[axis]) / direction[axis]
+            t1 = (upper[i, axis] - origin[axis]) / direction[axis]
+            near, far = max(near, min(t0, t1)), min(far, max(t0, t1))
+        else:
+            if near <= far:
+                hits[i] = near
+    return hits
+
+
+def check_queries(index: SpatialIndex, rng: np.random.Generator):
+    lower, upper = box_bounds(index)
+    np.testing.assert_allclose(index.lower, lower, atol=1e-4)
+    np.testing.assert_allclose(index.upper, upper, atol=1e-4)
+    # Brute force over the checked bounds, so float32 poses can't flip a boundary case
+    lower, upper = index.lower, index.upper
+    for _ in range(50):
+        center = rng.uniform([-7, -7, -1], [7, 7, 3])
+        half = rng.uniform(0, 3, 3)
+        expected = np.flatnonzero(np.all((lower <= center + half) & (upper >= center - half), axis=1))
+        assert sorted(index.query_box(center - half, center + half)) == list(expected)
+
+        radius = rng.uniform(0, 3)
+        distances = np.linalg.norm(np.clip(center, lower, upper) - center, axis=1)
+        found = index.query_radius(center, radius)
+        assert sorted(found) == list(np.flatnonzero(distances <= radius))
+        assert np.all(np.diff(distances[found]) >= 0)
+
+        direction = rng.normal(size=3)
+        direction /= np.linalg.norm(direction)
+        max_distance = rng.choice([rng.uniform(1, 10), np.inf])
+        found, near = index.query_ray(center, direction, max_distance)
+        expected = ray_hits(lower, upper, center, direction, max_distance)
+        assert sorted(found) == sorted(expected)
+        np.testing.assert_allclose(near, [expected[i] for i in found], atol=1e-6)
+
+
+def test_queries_match_brute_force():
+    engine = sapien.Engine()
+    scene = build(engine)
+    index = SpatialIndex(scene, cell_size=1.0)
+    assert len(index) == 60
+    rng = np.random.default_rng(1)
+    check_queries(index, rng)
+
+    # Dynamic boxes fall and may tip over; straighten them so box_bounds holds
+    for _ in range(100):
+        scene.step()
+    moved = index.update()
+    assert set(moved) <= set(index.dynamic_indices)
+    assert len(moved) > 0
+    for i in index.dynamic_indices:
+        actor = index.entities[i]
+        actor.set_pose(sapien.Pose(actor.get_pose().p))
+    index.update()
+    check_queries(index, rng)
+
+
+def test_region_query():
+    engine = sapien.Engine()
+    index = SpatialIndex(build(engine), regions={'room': [[0, 0], [4, 0], [4, 3], [0, 3]]})
+    centers = (index.lower + index.upper) / 2
+    inside = (centers[:, 0] > 0) & (centers[:, 0] < 4) & (centers[:, 1] > 0) & (centers[:, 1] < 3)
+    assert sorted(index.query_region('room')) == list(np.flatnonzero(inside))
+    assert index.regions_of(np.flatnonzero(inside)) == ['room'] * int(inside.sum())